@@ -5,10 +5,10 @@ import tornado.web
 
 def make_app():
 	# Delay heavy imports so importing `app.*` modules doesn't require all deps.
-	from app.config import COOKIE_SECRET
+	from app.config import COOKIE_SECRET, EXPORT_CACHE_DIR
 	from app.handlers.home import HomeHandler
 	from app.handlers.auth import LoginHandler, LogoutHandler, RegistrationHandler
-	from app.handlers.admin import EventsAdminHandler, APIEventsHandler, APIEventStaffHandler, StaffAdminHandler, APIStaffHandler
+	from app.handlers.admin import EventsAdminHandler, APIEventsHandler, APIEventStaffHandler, StaffAdminHandler, APIStaffHandler, APIStatsHandler
 	from app.handlers.assets import LogoUploadHandler
 	from app.handlers.moderator import (
 		APIChatsHandler,
@@ -17,7 +17,7 @@ def make_app():
 		APIUserStatusHandler,
 		ModeratorHandler,
 	)
-	from app.handlers.reports import ReportsExportHandler, ReportsHandler
+	from app.handlers.reports import ExportFileHandler, ExportJobsHandler, ReportsExportHandler, ReportsHandler
 	from app.handlers.speaker import SpeakerHandler
 	from app.handlers.watch import WatchHandler, APIPingHandler
 	from app.handlers.ws import LiveWebSocket
@@ -37,6 +37,9 @@ def make_app():
 			(r"/speaker", SpeakerHandler),
 			(r"/reports", ReportsHandler),
 			(r"/reports/export", ReportsExportHandler),
+			(r"/reports/export/jobs", ExportJobsHandler),
+			(r"/reports/export/jobs/([^/]+)", ExportJobsHandler),
+			(r"/reports/export/files/([^/]+)", ExportFileHandler, {"path": EXPORT_CACHE_DIR}),
 			(r"/ws", LiveWebSocket),
 			(r"/api/ping", APIPingHandler),
 			(r"/api/questions", APIQuestionsHandler),
@@ -49,6 +52,7 @@ def make_app():
 			(r"/api/admin/events/logo", LogoUploadHandler),
 			(r"/admin/staff", StaffAdminHandler),
 			(r"/api/admin/staff", APIStaffHandler),
+			(r"/api/admin/stats", APIStatsHandler),
 			# Dynamic Event Routes
 			(r"/e/([^/]+)/?", RegistrationHandler),
 			(r"/e/([^/]+)/login", LoginHandler),
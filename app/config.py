@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from dotenv import load_dotenv
 from pymysql.cursors import DictCursor
 
@@ -26,6 +27,22 @@ MYSQL_CONFIG = {
     "cursorclass": DictCursor,
 }
 
+# Threads available to blocking MySQL/Redis calls made from handlers and WS
+# callbacks (see app.db.run_blocking). Bounded so a slow database can't spawn
+# unlimited threads; the IOLoop itself never waits on I/O.
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 16))
+
+# MySQL connection pool (app.db). The max should cover the executor plus the
+# few sync callers (scripts, fallbacks); checkouts wait DB_POOL_TIMEOUT seconds
+# for a free connection before failing. Connections idle longer than
+# DB_POOL_PING_AFTER are pinged before reuse and none lives past
+# DB_POOL_MAX_LIFETIME (keep it below MySQL's wait_timeout).
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", DB_EXECUTOR_WORKERS + 4))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 30))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))
+
 REDIS_CONFIG = {
     "host": os.environ.get("REDIS_HOST", "localhost"),
     # Default local port set to 6380 to match docker-compose mapping
@@ -33,6 +50,139 @@ REDIS_CONFIG = {
     "db": 0,
 }
 
+# Sessions: decoded session dicts are cached in-process for SESSION_L1_TTL
+# seconds (bounds how stale a session seen by this process can be), and the
+# Redis sliding expiry is pushed forward at most once per
+# SESSION_REFRESH_INTERVAL seconds per session.
+SESSION_L1_TTL = float(os.environ.get("SESSION_L1_TTL", 5))
+SESSION_REFRESH_INTERVAL = float(os.environ.get("SESSION_REFRESH_INTERVAL", 60))
+
+# Logouts that happen while Redis is down can't reach the other processes
+# through pub/sub: they leave a tombstone file here instead, which processes
+# on this host check before serving a session from their cache during the
+# outage. The pending deletes are replayed into Redis once it is back.
+SESSION_TOMBSTONE_DIR = os.environ.get("SESSION_TOMBSTONE_DIR") or os.path.join(
+    tempfile.gettempdir(), "transmision-session-tombstones"
+)
+
+# WebSocket tickets/leases. Page handlers embed a signed ticket (user, role,
+# event) in the WS URL valid for WS_TICKET_TTL seconds, so open() can accept
+# the socket without touching Redis/MySQL. Live sockets then hold a lease that
+# a background sweep revalidates every WS_LEASE_CHECK_MS for all sockets of the
+# process at once: session still in Redis, user not banned, event active and
+# staff role still granted. Only then is the ticket renewed.
+WS_TICKET_TTL = int(os.environ.get("WS_TICKET_TTL", 600))
+WS_LEASE_CHECK_MS = int(os.environ.get("WS_LEASE_CHECK_MS", 30000))
+
+# Chat write-behind: messages are broadcast first and written to MySQL by a
+# background flusher every CHAT_FLUSH_INTERVAL_MS or as soon as
+# CHAT_FLUSH_MAX_ROWS are pending, in multi-row INSERTs. New messages are
+# refused (backpressure) while CHAT_QUEUE_MAX rows are waiting to be written.
+CHAT_FLUSH_INTERVAL_MS = int(os.environ.get("CHAT_FLUSH_INTERVAL_MS", 250))
+CHAT_FLUSH_MAX_ROWS = int(os.environ.get("CHAT_FLUSH_MAX_ROWS", 200))
+CHAT_QUEUE_MAX = int(os.environ.get("CHAT_QUEUE_MAX", 20000))
+
+# Longest chat message accepted from a socket (characters); longer ones are
+# refused before they are broadcast or queued for MySQL.
+CHAT_MESSAGE_MAX_CHARS = int(os.environ.get("CHAT_MESSAGE_MAX_CHARS", 1000))
+
+# Recent chat kept in memory per event (page loads and /api/chats read it);
+# must be at least the largest history a page asks for (50).
+CHAT_RING_SIZE = int(os.environ.get("CHAT_RING_SIZE", 100))
+
+# Questions live in memory per event (app.services.questions_service); only
+# the newest QUESTIONS_READ_KEEP already-read ones are kept (pages show 50).
+# Question writes that fail because MySQL is unreachable stay queued, in
+# order, and are retried every QUESTIONS_WRITE_RETRY_SECONDS.
+QUESTIONS_READ_KEEP = int(os.environ.get("QUESTIONS_READ_KEEP", 200))
+QUESTIONS_WRITE_RETRY_SECONDS = float(os.environ.get("QUESTIONS_WRITE_RETRY_SECONDS", 2))
+
+# Viewer heartbeats are accumulated in memory per (event, user) and written
+# as one bulk upsert every PING_FLUSH_INTERVAL_MS.
+PING_FLUSH_INTERVAL_MS = int(os.environ.get("PING_FLUSH_INTERVAL_MS", 15000))
+
+# Event records are cached per process by id and slug. Edits invalidate every
+# process right away (pub/sub); the TTL bounds staleness if that is missed.
+EVENTS_CACHE_TTL = float(os.environ.get("EVENTS_CACHE_TTL", 60))
+
+# Per-event staff roles, cached per process (including "no role"); staff
+# changes invalidate every process via pub/sub, the TTL bounds staleness.
+STAFF_ROLE_CACHE_TTL = float(os.environ.get("STAFF_ROLE_CACHE_TTL", 120))
+
+# Moderation flags (banned/chat_blocked/qa_blocked) are cached per process.
+# Changes are applied eagerly on every node through pub/sub; this TTL bounds
+# how stale a flag can be if an invalidation is lost (e.g. Redis down).
+MODERATION_CACHE_TTL = float(os.environ.get("MODERATION_CACHE_TTL", 30))
+
+# If the live schema can't be read (MySQL down at startup), has_column()
+# assumes the full schema and retries the read after SCHEMA_RETRY_SECONDS,
+# doubling on every failure up to SCHEMA_RETRY_MAX_SECONDS.
+SCHEMA_RETRY_SECONDS = float(os.environ.get("SCHEMA_RETRY_SECONDS", 5))
+SCHEMA_RETRY_MAX_SECONDS = float(os.environ.get("SCHEMA_RETRY_MAX_SECONDS", 300))
+
+# Report exports read from an unbuffered (server-side) cursor on a dedicated
+# connection and write this many rows per chunk to a temp file, which is then
+# streamed to the client; memory stays at about one chunk regardless of the
+# event's size.
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 1000))
+
+# Export jobs render CSV/XLSX/PDF in a small process pool (so reportlab and
+# openpyxl never compete with the IOLoop) and keep the files on disk keyed by
+# (event, kind, format, data version); unchanged data is just a download.
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR") or os.path.join(basedir, "exports")
+
+# Reports snapshots (active sessions + metrics) are rebuilt at most once per
+# interval per event, no matter how many joins/leaves/pings mark it dirty.
+REPORTS_SNAPSHOT_INTERVAL_MS = int(os.environ.get("REPORTS_SNAPSHOT_INTERVAL_MS", 5000))
+
+# Attendance deltas carry joins/leaves/moderation changes on every snapshot;
+# per-user minutes and last ping only move forward once per this interval,
+# as compact [user_id, minutes, last_ping] triples.
+SESSIONS_PROGRESS_INTERVAL_MS = int(os.environ.get("SESSIONS_PROGRESS_INTERVAL_MS", 60000))
+
+# Per-socket outbound queue limits. At the limit, "drop_oldest" discards the
+# oldest non-control message (event_closed/force_logout are always kept) and
+# "disconnect" closes the slow consumer.
+WS_OUTBOUND_MAX_MESSAGES = int(os.environ.get("WS_OUTBOUND_MAX_MESSAGES", 256))
+WS_OUTBOUND_MAX_BYTES = int(os.environ.get("WS_OUTBOUND_MAX_BYTES", 1024 * 1024))
+WS_OUTBOUND_POLICY = os.environ.get("WS_OUTBOUND_POLICY", "drop_oldest")
+
+# A socket closed by the server (event_closed) first writes what's queued;
+# a client that doesn't read is closed anyway after this many seconds.
+WS_CLOSE_FLUSH_SECONDS = float(os.environ.get("WS_CLOSE_FLUSH_SECONDS", 5))
+
+# Chat batching: when > 0, chat messages are collected for this many ms and
+# sent as one `chat_batch` frame. 0 disables it. Per-event overrides use
+# CHAT_BATCH_EVENT_WINDOWS="<event_id>:<ms>,<event_id>:<ms>".
+CHAT_BATCH_WINDOW_MS = int(os.environ.get("CHAT_BATCH_WINDOW_MS", 0))
+
+
+def _parse_event_windows(raw):
+    windows = {}
+    for item in (raw or "").split(","):
+        event_id, _, window_ms = item.strip().partition(":")
+        try:
+            windows[int(event_id)] = int(window_ms)
+        except ValueError:
+            continue
+    return windows
+
+
+CHAT_BATCH_EVENT_WINDOWS = _parse_event_windows(os.environ.get("CHAT_BATCH_EVENT_WINDOWS"))
+
+# permessage-deflate per WS role. Worth it for the large JSON snapshots that
+# moderator/reports sockets receive; viewers mostly get tiny chat frames.
+WS_COMPRESSION_ROLES = {
+    role.strip() for role in os.environ.get("WS_COMPRESSION_ROLES", "moderator,reports").split(",") if role.strip()
+}
+WS_COMPRESSION_LEVEL = int(os.environ.get("WS_COMPRESSION_LEVEL", 6))
+WS_COMPRESSION_MEM_LEVEL = int(os.environ.get("WS_COMPRESSION_MEM_LEVEL", 5))
+
+# Per-message WS logging (every fan-out and every incoming message). Off by
+# default: at a few thousand sockets the prints alone cost more than the sends.
+WS_DEBUG = os.environ.get("WS_DEBUG", "").lower() in ("1", "true", "yes")
+
 # Validación mínima para evitar errores críticos
 if not MYSQL_CONFIG["host"]:
     print("ERROR: DB_HOST no definido en .env", file=sys.stderr)
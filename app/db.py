@@ -1,8 +1,23 @@
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pymysql
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
-from app.config import MYSQL_CONFIG
+from tornado.ioloop import IOLoop
+
+from app.config import (
+    DB_EXECUTOR_WORKERS,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_PING_AFTER,
+    DB_POOL_TIMEOUT,
+    MYSQL_CONFIG,
+)
 
 
 DEFAULT_APP_TIMEZONE = "America/Mexico_City"
@@ -40,9 +55,55 @@ def now_hhmm_in_timezone(tz_name: str | None) -> str:
     return now_in_timezone(tz_name).strftime("%H:%M")
 
 
-def create_db_connection():
+_BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Awaitable variant of any blocking service call.
+
+    Runs `fn(*args, **kwargs)` on the bounded DB executor so a slow query or
+    Redis round trip never blocks the IOLoop:
+
+        chats = await run_blocking(chat_service.list_recent_chats, event_id=event_id)
+    """
+    return IOLoop.current().run_in_executor(_BLOCKING_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+# --- Connection pool -------------------------------------------------------
+# Opening a MySQL connection (TCP + auth + SET time_zone) per service call was
+# the dominant cost of small queries. Connections are now borrowed from a
+# bounded pool and returned on exit; callers keep using
+# `with create_db_connection() as conn:` unchanged.
+
+_POOL_COND = threading.Condition()
+_POOL_IDLE = []  # LIFO: the most recently used connection is the warmest
+_pool_size = 0  # open connections, idle + borrowed
+_pool_in_use = 0
+
+POOL_STATS = {
+    "checkouts": 0,
+    "created": 0,
+    "discarded": 0,
+    "timeouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+def _open_raw_connection():
     connection = pymysql.connect(**MYSQL_CONFIG)
     # Keep DB timestamps in UTC; convert to local time in the app layer.
+    # Session variables survive for the connection's lifetime, so this runs
+    # once per pooled connection rather than once per query.
     with connection.cursor() as cursor:
         try:
             cursor.execute("SET time_zone = '+00:00'")
@@ -53,6 +114,179 @@ def create_db_connection():
     return connection
 
 
+def _close_quietly(entry):
+    try:
+        entry.conn.close()
+    except Exception:
+        pass
+
+
+def _is_reusable(entry):
+    now = time.monotonic()
+    if now - entry.created_at > DB_POOL_MAX_LIFETIME or not entry.conn.open:
+        return False
+    if now - entry.last_used > DB_POOL_PING_AFTER:
+        # MySQL may have dropped it (wait_timeout, failover); check before use.
+        try:
+            entry.conn.ping(reconnect=False)
+        except Exception:
+            return False
+    return True
+
+
+def _checkout():
+    global _pool_size, _pool_in_use
+    started = time.monotonic()
+    deadline = started + DB_POOL_TIMEOUT
+    entry = None
+    with _POOL_COND:
+        while True:
+            if _POOL_IDLE:
+                entry = _POOL_IDLE.pop()
+                break
+            if _pool_size < DB_POOL_MAX_SIZE:
+                # Reserve the slot now; the connection is opened outside the lock.
+                _pool_size += 1
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                POOL_STATS["timeouts"] += 1
+                raise pymysql.err.OperationalError(
+                    2013, f"MySQL pool exhausted ({DB_POOL_MAX_SIZE} connections busy for {DB_POOL_TIMEOUT}s)"
+                )
+            _POOL_COND.wait(remaining)
+
+        _pool_in_use += 1
+        waited = time.monotonic() - started
+        POOL_STATS["checkouts"] += 1
+        POOL_STATS["wait_seconds_total"] += waited
+        if waited > POOL_STATS["wait_seconds_max"]:
+            POOL_STATS["wait_seconds_max"] = waited
+
+    try:
+        if entry is not None and not _is_reusable(entry):
+            _close_quietly(entry)
+            with _POOL_COND:
+                POOL_STATS["discarded"] += 1
+            entry = None
+        if entry is None:
+            entry = _PoolEntry(_open_raw_connection())
+            with _POOL_COND:
+                POOL_STATS["created"] += 1
+    except Exception:
+        with _POOL_COND:
+            _pool_size -= 1
+            _pool_in_use -= 1
+            _POOL_COND.notify()
+        raise
+    return entry
+
+
+def _release(entry, exc=None):
+    global _pool_size, _pool_in_use
+    conn = entry.conn
+    reusable = conn.open and not isinstance(exc, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+    if reusable:
+        try:
+            # Never hand out a connection with a half-done transaction.
+            if exc is not None or not conn.get_autocommit():
+                conn.rollback()
+                conn.autocommit(True)
+        except Exception:
+            reusable = False
+    if reusable and time.monotonic() - entry.created_at > DB_POOL_MAX_LIFETIME:
+        reusable = False
+
+    with _POOL_COND:
+        _pool_in_use -= 1
+        if reusable:
+            entry.last_used = time.monotonic()
+            _POOL_IDLE.append(entry)
+        else:
+            _pool_size -= 1
+            POOL_STATS["discarded"] += 1
+        _POOL_COND.notify()
+
+    if not reusable:
+        _close_quietly(entry)
+
+
+class _PooledConnection:
+    """A borrowed connection.
+
+    `with create_db_connection() as conn:` yields the underlying pymysql
+    connection and returns it to the pool on exit (discarding it if the block
+    failed with a connection error). Code that holds the object directly can
+    use it like a connection; `close()` gives it back.
+    """
+
+    __slots__ = ("_entry",)
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    def __enter__(self):
+        return self._entry.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._give_back(exc)
+        return False
+
+    def __getattr__(self, name):
+        if name == "_entry":
+            raise AttributeError(name)
+        return getattr(self._entry.conn, name)
+
+    def close(self):
+        self._give_back(None)
+
+    def _give_back(self, exc):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            _release(entry, exc)
+
+    def __del__(self):
+        # Safety net for callers that never close: don't leak the pool slot.
+        if getattr(self, "_entry", None) is not None:
+            self._give_back(None)
+
+
+def create_db_connection():
+    return _PooledConnection(_checkout())
+
+
+def init_db_pool():
+    """Open DB_POOL_MIN_SIZE connections up front. Best-effort."""
+    entries = []
+    try:
+        for _ in range(DB_POOL_MIN_SIZE):
+            entries.append(_checkout())
+        print(f"[DB] OK: pool ready ({len(entries)} connections, max {DB_POOL_MAX_SIZE})")
+    except Exception as e:
+        print(f"[DB] ! pool warm-up failed: {e}")
+    finally:
+        for entry in entries:
+            _release(entry)
+
+
+def get_pool_stats():
+    with _POOL_COND:
+        checkouts = POOL_STATS["checkouts"]
+        return {
+            "size": _pool_size,
+            "in_use": _pool_in_use,
+            "idle": len(_POOL_IDLE),
+            "max_size": DB_POOL_MAX_SIZE,
+            "utilization": round(_pool_in_use / DB_POOL_MAX_SIZE, 3) if DB_POOL_MAX_SIZE else 0.0,
+            "checkouts": checkouts,
+            "avg_wait_ms": round(POOL_STATS["wait_seconds_total"] * 1000 / checkouts, 3) if checkouts else 0.0,
+            "max_wait_ms": round(POOL_STATS["wait_seconds_max"] * 1000, 3),
+            "timeouts": POOL_STATS["timeouts"],
+            "created": POOL_STATS["created"],
+            "discarded": POOL_STATS["discarded"],
+        }
+
+
 def _normalize_timestamps(row):
     if not row:
         return row
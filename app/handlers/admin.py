@@ -1,10 +1,12 @@
 import json
+import os
 import re
 import unicodedata
 import tornado.web
-from app.db import create_db_connection
+from app.db import create_db_connection, get_pool_stats, run_blocking
+from app.handlers import ws
 from app.handlers.base import BaseHandler
-from app.services import events_service, staff_service
+from app.services import chat_service, events_service, staff_service, users_service
 
 
 _HEX_COLOR_RE = re.compile(r"^#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})$")
@@ -41,39 +43,42 @@ def _slugify(value):
     return value.strip('-').lower()
 
 
+def _enrich_events(events):
+    """Attach moderator/speaker names and registration counts to each event (in place)."""
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for evt in events:
+                eid = evt["id"]
+                # Get Staff Names
+                cursor.execute(
+                    "SELECT u.name, es.role FROM event_staff es "
+                    "JOIN users u ON u.id = es.user_id "
+                    "WHERE es.event_id=%s AND es.role IN ('moderator', 'speaker')",
+                    (eid,)
+                )
+                staff_rows = cursor.fetchall()
+                evt["moderator_name"] = next((r["name"] for r in staff_rows if r["role"] == "moderator"), None)
+                evt["speaker_name"] = next((r["name"] for r in staff_rows if r["role"] == "speaker"), None)
+                
+                # Get Registry Count (Viewers registered for this event)
+                cursor.execute(
+                    "SELECT COUNT(*) as cnt FROM users WHERE event_id=%s AND role='viewer'",
+                    (eid,)
+                )
+                count_res = cursor.fetchone()
+                evt["registration_count"] = count_res["cnt"] if count_res else 0
 
 
 class EventsAdminHandler(BaseHandler):
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         # Admin console: superadmin sees all events; event-admin sees only assigned events.
         if self.is_superadmin():
-            events = events_service.list_events()
+            events = await run_blocking(events_service.list_events)
 
             # Enrich events with staff info and registration counts
             if events:
-                with create_db_connection() as conn:
-                    with conn.cursor() as cursor:
-                        for evt in events:
-                            eid = evt["id"]
-                            # Get Staff Names
-                            cursor.execute(
-                                "SELECT u.name, es.role FROM event_staff es "
-                                "JOIN users u ON u.id = es.user_id "
-                                "WHERE es.event_id=%s AND es.role IN ('moderator', 'speaker')",
-                                (eid,)
-                            )
-                            staff_rows = cursor.fetchall()
-                            evt["moderator_name"] = next((r["name"] for r in staff_rows if r["role"] == "moderator"), None)
-                            evt["speaker_name"] = next((r["name"] for r in staff_rows if r["role"] == "speaker"), None)
-                            
-                            # Get Registry Count (Viewers registered for this event)
-                            cursor.execute(
-                                "SELECT COUNT(*) as cnt FROM users WHERE event_id=%s AND role='viewer'",
-                                (eid,)
-                            )
-                            count_res = cursor.fetchone()
-                            evt["registration_count"] = count_res["cnt"] if count_res else 0
+                await run_blocking(_enrich_events, events)
 
             self.render("admin/events.html", events=events, is_superadmin=True)
             return
@@ -84,7 +89,7 @@ class EventsAdminHandler(BaseHandler):
             return
 
         from app.services import staff_service
-        allowed_event_ids = staff_service.list_event_ids_for_role(int(user_id), "admin")
+        allowed_event_ids = await run_blocking(staff_service.list_event_ids_for_role, int(user_id), "admin")
         
         # If they don't have assigned events but ARE admins (global role), 
         # let them see the dashboard (empty state message) instead of /watch.
@@ -92,37 +97,16 @@ class EventsAdminHandler(BaseHandler):
             self.redirect("/watch")
             return
 
-        events = events_service.list_events(event_ids=allowed_event_ids) if allowed_event_ids else []
+        events = await run_blocking(events_service.list_events, event_ids=allowed_event_ids) if allowed_event_ids else []
         
         # Enrich events with staff info and registration counts
         if events:
-            with create_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    for evt in events:
-                        eid = evt["id"]
-                        # Get Staff Names
-                        cursor.execute(
-                            "SELECT u.name, es.role FROM event_staff es "
-                            "JOIN users u ON u.id = es.user_id "
-                            "WHERE es.event_id=%s AND es.role IN ('moderator', 'speaker')",
-                            (eid,)
-                        )
-                        staff_rows = cursor.fetchall()
-                        evt["moderator_name"] = next((r["name"] for r in staff_rows if r["role"] == "moderator"), None)
-                        evt["speaker_name"] = next((r["name"] for r in staff_rows if r["role"] == "speaker"), None)
-                        
-                        # Get Registry Count (Viewers registered for this event)
-                        cursor.execute(
-                            "SELECT COUNT(*) as cnt FROM users WHERE event_id=%s AND role='viewer'",
-                            (eid,)
-                        )
-                        count_res = cursor.fetchone()
-                        evt["registration_count"] = count_res["cnt"] if count_res else 0
+            await run_blocking(_enrich_events, events)
         self.render("admin/events.html", events=events, is_superadmin=False)
 
 class APIEventsHandler(BaseHandler):
     @tornado.web.authenticated
-    def post(self):
+    async def post(self):
         # Only superadmin can create new events.
         if not self.is_superadmin():
             self.set_status(403)
@@ -148,20 +132,22 @@ class APIEventsHandler(BaseHandler):
                 return
 
             # Uniqueness Check
-            existing = events_service.get_event_by_slug(slug)
+            existing = await run_blocking(events_service.get_event_by_slug, slug)
             if existing:
                 self.set_status(409) # Conflict
                 self.write({"status": "error", "message": f"El slug '{slug}' ya está en uso. Elige otro."})
                 return
 
-            event_id = events_service.create_event(slug, title, logo_url, video_url, description, header_bg_color, header_text_color, timezone)
+            event_id = await run_blocking(
+                events_service.create_event, slug, title, logo_url, video_url, description, header_bg_color, header_text_color, timezone
+            )
             self.write({"status": "success", "event_id": event_id})
         except Exception as e:
             self.set_status(500)
             self.write({"status": "error", "message": str(e)})
 
     @tornado.web.authenticated
-    def put(self):
+    async def put(self):
         try:
             data = json.loads(self.request.body)
             event_id = data.get("id")
@@ -171,6 +157,7 @@ class APIEventsHandler(BaseHandler):
                 return
 
             # Superadmin can update any event; event-admin can update assigned events only.
+            await self.prefetch_event_staff_role(event_id)
             if not (self.is_superadmin() or self.is_admin_for_event(event_id)):
                 self.set_status(403)
                 return
@@ -184,7 +171,8 @@ class APIEventsHandler(BaseHandler):
             header_text_color = _sanitize_hex_color(data.get("header_text_color"))
             timezone = data.get("timezone", "America/Mexico_City")
 
-            events_service.update_event(
+            await run_blocking(
+                events_service.update_event,
                 event_id, title, logo_url, video_url, is_active, description, header_bg_color, header_text_color, timezone
             )
 
@@ -199,11 +187,40 @@ class APIEventsHandler(BaseHandler):
             self.write({"status": "error", "message": str(e)})
 
 
+def _search_assignable_users(search_query, target_role):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Base query parts
+            query = "SELECT u.id, u.email, u.name FROM users u "
+            params = []
+            
+            # 1. Filter by Global Role
+            where_clauses = ["u.role = %s"]
+            params.append(target_role)
+
+            # 2. Search filter (name/email)
+            if search_query:
+                where_clauses.append("(u.email LIKE %s OR u.name LIKE %s)")
+                params.append(f"%{search_query}%")
+                params.append(f"%{search_query}%")
+
+            # 3. Availability Check (Exclusive for Moderator/Speaker)
+            # Admins can be in multiple events, but Mods/Speakers must be free.
+            if target_role in ["moderator", "speaker"]:
+                where_clauses.append("u.id NOT IN (SELECT user_id FROM event_staff)")
+
+            # Construct final query
+            sql = f"{query} WHERE {' AND '.join(where_clauses)} ORDER BY u.name ASC LIMIT 20"
+            
+            cursor.execute(sql, tuple(params))
+            return cursor.fetchall() or []
+
+
 class APIEventStaffHandler(BaseHandler):
     """Superadmin-only API to manage per-event staff assignments."""
 
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         if not self.is_superadmin():
             self.set_status(403)
             return
@@ -214,43 +231,18 @@ class APIEventStaffHandler(BaseHandler):
             search_query = self.get_query_argument("q", "").strip().lower()
             target_role = self.get_query_argument("role", "admin").lower()
 
-            with create_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Base query parts
-                    query = "SELECT u.id, u.email, u.name FROM users u "
-                    params = []
-                    
-                    # 1. Filter by Global Role
-                    where_clauses = ["u.role = %s"]
-                    params.append(target_role)
-
-                    # 2. Search filter (name/email)
-                    if search_query:
-                        where_clauses.append("(u.email LIKE %s OR u.name LIKE %s)")
-                        params.append(f"%{search_query}%")
-                        params.append(f"%{search_query}%")
-
-                    # 3. Availability Check (Exclusive for Moderator/Speaker)
-                    # Admins can be in multiple events, but Mods/Speakers must be free.
-                    if target_role in ["moderator", "speaker"]:
-                        where_clauses.append("u.id NOT IN (SELECT user_id FROM event_staff)")
-
-                    # Construct final query
-                    sql = f"{query} WHERE {' AND '.join(where_clauses)} ORDER BY u.name ASC LIMIT 20"
-                    
-                    cursor.execute(sql, tuple(params))
-                    users = cursor.fetchall() or []
-                    
-                    # Map to Select2 format
-                    results = []
-                    for u in users:
-                        email = u["email"]
-                        name = u["name"] or ""
-                        results.append({
-                            "id": email, # We still use email as ID for the frontend logic
-                            "text": f"{name} ({email})" if name else email
-                        })
-                    self.write({"status": "success", "results": results})
+            users = await run_blocking(_search_assignable_users, search_query, target_role)
+            
+            # Map to Select2 format
+            results = []
+            for u in users:
+                email = u["email"]
+                name = u["name"] or ""
+                results.append({
+                    "id": email, # We still use email as ID for the frontend logic
+                    "text": f"{name} ({email})" if name else email
+                })
+            self.write({"status": "success", "results": results})
             return
 
         try:
@@ -261,11 +253,11 @@ class APIEventStaffHandler(BaseHandler):
             return
 
         from app.services import staff_service
-        rows = staff_service.list_staff_for_event(event_id)
+        rows = await run_blocking(staff_service.list_staff_for_event, event_id)
         self.write({"status": "success", "staff": rows})
 
     @tornado.web.authenticated
-    def post(self):
+    async def post(self):
         if not self.is_superadmin():
             self.set_status(403)
             return
@@ -277,14 +269,14 @@ class APIEventStaffHandler(BaseHandler):
             role = data.get("role")
 
             from app.services import staff_service
-            assignment = staff_service.upsert_staff_by_email(event_id=event_id, email=email, role=role)
+            assignment = await run_blocking(staff_service.upsert_staff_by_email, event_id=event_id, email=email, role=role)
             self.write({"status": "success", "assignment": assignment})
         except Exception as e:
             self.set_status(400)
             self.write({"status": "error", "message": str(e)})
 
     @tornado.web.authenticated
-    def delete(self):
+    async def delete(self):
         if not self.is_superadmin():
             self.set_status(403)
             return
@@ -299,24 +291,59 @@ class APIEventStaffHandler(BaseHandler):
             return
 
         from app.services import staff_service
-        ok = staff_service.remove_staff(user_id=user_id, event_id=event_id)
+        ok = await run_blocking(staff_service.remove_staff, user_id=user_id, event_id=event_id)
         self.write({"status": "success", "removed": bool(ok)})
 
 
 class StaffAdminHandler(BaseHandler):
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         if not self.is_superadmin():
             self.redirect("/watch")
             return
         
-        staff_list = staff_service.list_all_staff_global()
+        staff_list = await run_blocking(staff_service.list_all_staff_global)
         self.render("admin/staff.html", staff=staff_list, is_superadmin=True)
 
 
+def _save_staff_user(user_id, email, name, role):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if user_id:
+                # Update by ID
+                cursor.execute(
+                    "UPDATE users SET email=%s, name=%s, role=%s WHERE id=%s",
+                    (email, name, role, user_id)
+                )
+            else:
+                # Check if user already exists by email (for global users)
+                cursor.execute(
+                    "SELECT id FROM users WHERE email=%s AND event_id IS NULL LIMIT 1",
+                    (email,)
+                )
+                existing = cursor.fetchone()
+                if existing:
+                    user_id = existing["id"]
+                    cursor.execute(
+                        "UPDATE users SET name=%s, role=%s WHERE id=%s",
+                        (name, role, user_id)
+                    )
+                else:
+                    cursor.execute(
+                        "INSERT INTO users (email, name, role, event_id) VALUES (%s, %s, %s, NULL)",
+                        (email, name or email.split("@")[0], role)
+                    )
+            users_service.bump_users_revision(cursor)
+            conn.commit()
+
+    if user_id:
+        # viewer <-> staff changes who counts as audience, on every event and node.
+        staff_service.invalidate_user_roles(user_id)
+
+
 class APIStaffHandler(BaseHandler):
     @tornado.web.authenticated
-    def post(self):
+    async def post(self):
         if not self.is_superadmin():
             self.set_status(403)
             return
@@ -333,35 +360,32 @@ class APIStaffHandler(BaseHandler):
                 self.write({"status": "error", "message": "Email es requerido"})
                 return
 
-            with create_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    if user_id:
-                        # Update by ID
-                        cursor.execute(
-                            "UPDATE users SET email=%s, name=%s, role=%s WHERE id=%s",
-                            (email, name, role, user_id)
-                        )
-                    else:
-                        # Check if user already exists by email (for global users)
-                        cursor.execute(
-                            "SELECT id FROM users WHERE email=%s AND event_id IS NULL LIMIT 1",
-                            (email,)
-                        )
-                        existing = cursor.fetchone()
-                        if existing:
-                            cursor.execute(
-                                "UPDATE users SET name=%s, role=%s WHERE id=%s",
-                                (name, role, existing["id"])
-                            )
-                        else:
-                            cursor.execute(
-                                "INSERT INTO users (email, name, role, event_id) VALUES (%s, %s, %s, NULL)",
-                                (email, name or email.split("@")[0], role)
-                            )
-                    conn.commit()
+            await run_blocking(_save_staff_user, user_id, email, name, role)
             
             self.write({"status": "success"})
         except Exception as e:
             self.set_status(500)
             self.write({"status": "error", "message": str(e)})
 
+
+
+def _runtime_stats():
+    # Métricas de ESTE proceso (cada nodo responde por sí mismo).
+    return {
+        "pid": os.getpid(),
+        "ws_snapshots": ws.get_snapshot_stats(),
+        "ws_outbound": ws.get_outbound_stats(),
+        "db_pool": get_pool_stats(),
+        "chat_writes": chat_service.get_chat_write_stats(),
+    }
+
+
+class APIStatsHandler(BaseHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        if not self.is_superadmin():
+            self.set_status(403)
+            return
+
+        self.set_header("Cache-Control", "no-store")
+        self.write(_runtime_stats())
@@ -1,12 +1,91 @@
 import tornado.escape
 
-from app.db import create_db_connection
+from app.db import create_db_connection, run_blocking
 from app.handlers.base import BaseHandler
 from app.services import analytics_service, session_service
 
 
+def _register_viewer(name, email, phone, event_id):
+    """Create a viewer for the event. Returns the new user id, or None if the email is taken."""
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, role FROM users WHERE email=%s AND event_id=%s",
+                (email, event_id),
+            )
+            if cursor.fetchone():
+                return None
+            # Default role is 'viewer', default password in DB is 'produccionesfast2050'
+            cursor.execute(
+                "INSERT INTO users (name, email, phone, role, event_id) VALUES (%s, %s, %s, %s, %s)",
+                (name, email, phone, "viewer", event_id),
+            )
+            return cursor.lastrowid
+
+
+def _find_login_user(email, event_id):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if event_id:
+                cursor.execute(
+                    "SELECT id, name, password, role, event_id FROM users WHERE email=%s AND event_id=%s",
+                    (email, event_id),
+                )
+                user = cursor.fetchone()
+
+                # Allow global staff accounts (event_id IS NULL) to log in from an event-scoped URL.
+                # Superadmin always allowed; other global users must be assigned via event_staff.
+                if not user:
+                    cursor.execute(
+                        "SELECT id, name, password, role, event_id FROM users WHERE email=%s AND event_id IS NULL ORDER BY created_at DESC",
+                        (email,),
+                    )
+                    candidate = cursor.fetchone()
+                    if candidate:
+                        global_role = candidate.get("role")
+                        if global_role in ["superadmin", "admin"]:
+                            user = candidate
+                        else:
+                            # Check event_staff assignment
+                            cursor.execute(
+                                "SELECT role FROM event_staff WHERE user_id=%s AND event_id=%s",
+                                (candidate["id"], event_id),
+                            )
+                            staff = cursor.fetchone()
+                            if staff:
+                                user = candidate
+                return user
+
+            # No event context: prioritize global staff accounts (event_id IS NULL)
+            cursor.execute(
+                "SELECT id, name, password, role, event_id FROM users WHERE email=%s ORDER BY (event_id IS NULL) DESC, created_at DESC",
+                (email,),
+            )
+            users = cursor.fetchall() or []
+            if not users:
+                return None
+            if len(users) == 1:
+                return users[0]
+            # Multiple users: if the first one is global, prioritize it
+            if users[0]["event_id"] is None:
+                return users[0]
+            # Force slug-specific login if all are event-scoped
+            return None
+
+
+def _first_staff_event_id(user_id):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT event_id FROM event_staff WHERE user_id=%s LIMIT 1",
+                (user_id,)
+            )
+            assignment = cursor.fetchone()
+            return assignment["event_id"] if assignment else None
+
+
 class RegistrationHandler(BaseHandler):
-    def get(self, slug=None):
+    async def get(self, slug=None):
         if self.current_user:
             if self.is_admin():
                 self.redirect("/admin/events")
@@ -15,7 +94,7 @@ class RegistrationHandler(BaseHandler):
             return
         
         from app.services import events_service
-        event = events_service.get_event_by_slug(slug)
+        event = await run_blocking(events_service.get_event_by_slug, slug)
         if not event:
             self.render("error.html", message="Evento no encontrado")
             return
@@ -26,13 +105,13 @@ class RegistrationHandler(BaseHandler):
 
         self.render("register.html", event=event, error=None)
 
-    def post(self, slug=None):
+    async def post(self, slug=None):
         name = self.get_body_argument("name", strip=True)
         email = self.get_body_argument("email", strip=True).lower()
         phone = self.get_body_argument("phone", strip=True)
         
         from app.services import events_service
-        event = events_service.get_event_by_slug(slug)
+        event = await run_blocking(events_service.get_event_by_slug, slug)
         event_id = event["id"] if event else None
 
         if not event_id:
@@ -52,25 +131,12 @@ class RegistrationHandler(BaseHandler):
             )
             return
 
-        with create_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT id, role FROM users WHERE email=%s AND event_id=%s",
-                    (email, event_id),
-                )
-                user = cursor.fetchone()
-                if user:
-                    login_url = f"/e/{slug}/login" if slug else "/login"
-                    self.redirect(f"{login_url}?email={tornado.escape.url_escape(email)}")
-                    return
-                else:
-                    # Default role is 'viewer', default password in DB is 'produccionesfast2050'
-                    cursor.execute(
-                        "INSERT INTO users (name, email, phone, role, event_id) VALUES (%s, %s, %s, %s, %s)",
-                        (name, email, phone, "viewer", event_id),
-                    )
-                    user_id = cursor.lastrowid
-                    user_role = "viewer"
+        user_id = await run_blocking(_register_viewer, name, email, phone, event_id)
+        if user_id is None:
+            login_url = f"/e/{slug}/login" if slug else "/login"
+            self.redirect(f"{login_url}?email={tornado.escape.url_escape(email)}")
+            return
+        user_role = "viewer"
         
         # Create Session in Redis
         session_data = {
@@ -79,7 +145,7 @@ class RegistrationHandler(BaseHandler):
             "user_role": user_role,
             "current_event_id": event_id
         }
-        session_id = session_service.create_session(session_data)
+        session_id = await run_blocking(session_service.create_session, session_data)
         is_https = (self.request.protocol == "https") or (self.request.headers.get("X-Forwarded-Proto") == "https")
         self.set_secure_cookie("session_id", session_id, httponly=True, secure=is_https, samesite="Lax")
 
@@ -96,7 +162,7 @@ class RegistrationHandler(BaseHandler):
 
 
 class LoginHandler(BaseHandler):
-    def get(self, slug=None):
+    async def get(self, slug=None):
         if self.current_user:
             if self.is_admin():
                 self.redirect("/admin/events")
@@ -105,7 +171,7 @@ class LoginHandler(BaseHandler):
             return
         
         from app.services import events_service
-        event = events_service.get_event_by_slug(slug)
+        event = await run_blocking(events_service.get_event_by_slug, slug)
         if not event and slug:
             self.render("error.html", message="Evento no encontrado")
             return
@@ -117,12 +183,12 @@ class LoginHandler(BaseHandler):
         prefill_email = self.get_query_argument("email", default="").strip().lower()
         self.render("login.html", event=event, prefill_email=prefill_email, error=None)
 
-    def post(self, slug=None):
+    async def post(self, slug=None):
         email = self.get_body_argument("email", strip=True).lower()
         password = self.get_body_argument("password", default="")
         
         from app.services import events_service
-        event = events_service.get_event_by_slug(slug)
+        event = await run_blocking(events_service.get_event_by_slug, slug)
 
         event_id = None
         if event:
@@ -149,54 +215,7 @@ class LoginHandler(BaseHandler):
             )
             return
 
-        with create_db_connection() as conn:
-            with conn.cursor() as cursor:
-                if event_id:
-                    cursor.execute(
-                        "SELECT id, name, password, role, event_id FROM users WHERE email=%s AND event_id=%s",
-                        (email, event_id),
-                    )
-                    user = cursor.fetchone()
-
-                    # Allow global staff accounts (event_id IS NULL) to log in from an event-scoped URL.
-                    # Superadmin always allowed; other global users must be assigned via event_staff.
-                    if not user:
-                        cursor.execute(
-                            "SELECT id, name, password, role, event_id FROM users WHERE email=%s AND event_id IS NULL ORDER BY created_at DESC",
-                            (email,),
-                        )
-                        candidate = cursor.fetchone()
-                        if candidate:
-                            global_role = candidate.get("role")
-                            if global_role in ["superadmin", "admin"]:
-                                user = candidate
-                            else:
-                                # Check event_staff assignment
-                                cursor.execute(
-                                    "SELECT role FROM event_staff WHERE user_id=%s AND event_id=%s",
-                                    (candidate["id"], event_id),
-                                )
-                                staff = cursor.fetchone()
-                                if staff:
-                                    user = candidate
-                else:
-                    # No event context: prioritize global staff accounts (event_id IS NULL)
-                    cursor.execute(
-                        "SELECT id, name, password, role, event_id FROM users WHERE email=%s ORDER BY (event_id IS NULL) DESC, created_at DESC",
-                        (email,),
-                    )
-                    users = cursor.fetchall() or []
-                    if not users:
-                        user = None
-                    elif len(users) == 1:
-                        user = users[0]
-                    else:
-                        # Multiple users: if the first one is global, prioritize it
-                        if users[0]["event_id"] is None:
-                            user = users[0]
-                        else:
-                            # Force slug-specific login if all are event-scoped
-                            user = None
+        user = await run_blocking(_find_login_user, email, event_id)
 
         if not user:
             self.render(
@@ -229,22 +248,14 @@ class LoginHandler(BaseHandler):
         # If no explicit event context, try to find one from staff assignments
         # This is critical for Global Moderators/Speakers who log in from /login
         if not selected_event_id:
-            with create_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT event_id FROM event_staff WHERE user_id=%s LIMIT 1",
-                        (user_id,)
-                    )
-                    assignment = cursor.fetchone()
-                    if assignment:
-                        selected_event_id = assignment["event_id"]
+            selected_event_id = await run_blocking(_first_staff_event_id, user_id)
 
         # Resolve per-event staff role (if any) to decide redirects later.
         staff_role = None
         if selected_event_id:
             try:
                 from app.services import staff_service
-                staff_role = staff_service.get_event_role(int(user_id), int(selected_event_id))
+                staff_role = await run_blocking(staff_service.get_event_role, int(user_id), int(selected_event_id))
             except Exception:
                 staff_role = None
 
@@ -255,7 +266,7 @@ class LoginHandler(BaseHandler):
             "user_role": user_role,
             "current_event_id": selected_event_id
         }
-        session_id = session_service.create_session(session_data)
+        session_id = await run_blocking(session_service.create_session, session_data)
         is_https = (self.request.protocol == "https") or (self.request.headers.get("X-Forwarded-Proto") == "https")
         self.set_secure_cookie("session_id", session_id, httponly=True, secure=is_https, samesite="Lax")
 
@@ -272,7 +283,7 @@ class LoginHandler(BaseHandler):
             if not slug:
                 try:
                      from app.services import events_service
-                     evt = events_service.get_event_by_id(selected_event_id)
+                     evt = await run_blocking(events_service.get_event_by_id, selected_event_id)
                      if evt:
                          slug = evt.get("slug")
                 except Exception:
@@ -310,20 +321,20 @@ class LoginHandler(BaseHandler):
 
 class LogoutHandler(BaseHandler):
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         user_id = self.get_current_user()
+        event_id = self.current_event_id()
         if user_id:
-            analytics_service.mark_session_inactive(user_id)
+            await run_blocking(analytics_service.mark_session_inactive, user_id, event_id=event_id)
         
         # Determine smart redirect before clearing session
         redirect_url = "/"
         user_role = self.current_user_role()
-        event_id = self.current_event_id()
         
         # Invalidate session in Redis
         s_cookie = self.get_secure_cookie("session_id")
         if s_cookie:
-            session_service.delete_session(s_cookie.decode())
+            await run_blocking(session_service.delete_session, s_cookie.decode())
 
         self.clear_cookie("session_id")
         self.clear_cookie("user_id")
@@ -335,7 +346,7 @@ class LogoutHandler(BaseHandler):
         if user_role == "viewer" and event_id:
             try:
                 from app.services import events_service
-                evt = events_service.get_event_by_id(event_id)
+                evt = await run_blocking(events_service.get_event_by_id, event_id)
                 if evt and evt.get("slug"):
                     redirect_url = f"/e/{evt['slug']}/login"
             except Exception:
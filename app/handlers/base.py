@@ -1,19 +1,23 @@
 import tornado.web
+from app.db import run_blocking
 from app.services import session_service
 
 
 class BaseHandler(tornado.web.RequestHandler):
     def initialize(self):
         self.session = None
+        self._session_loaded = False
         self._staff_role_cache = {}
 
     def get_current_user(self):
-        if self.session is None:
+        if not self._session_loaded:
             self._load_session()
         return self.session.get("user_id") if self.session else None
 
     def _load_session(self):
+        # Blocking fallback; prepare() normally loads the session off the IOLoop.
         self.session = None
+        self._session_loaded = True
         s_cookie = self.get_secure_cookie("session_id")
         if s_cookie:
             try:
@@ -21,35 +25,51 @@ class BaseHandler(tornado.web.RequestHandler):
             except Exception:
                 self.session = None
 
+    async def _load_session_async(self):
+        self.session = None
+        self._session_loaded = True
+        s_cookie = self.get_secure_cookie("session_id")
+        if s_cookie:
+            try:
+                session_id = s_cookie.decode()
+                self.session = session_service.get_cached_session(session_id) or await run_blocking(
+                    session_service.get_session, session_id
+                )
+            except Exception:
+                self.session = None
+
     def current_user_name(self):
-        if self.session is None: self._load_session()
+        if not self._session_loaded: self._load_session()
         return self.session.get("user_name") if self.session else "Visitante"
 
-    def prepare(self):
+    async def prepare(self):
         # Determine event context from URL
         # URL format: /e/SLUG/...
         path_parts = self.request.path.strip("/").split("/")
         if len(path_parts) >= 2 and path_parts[0] == "e":
             from app.services import events_service
             slug = path_parts[1]
-            event = events_service.get_event_by_slug(slug)
+            event = await run_blocking(events_service.get_event_by_slug, slug)
             if event:
                 self.set_secure_cookie("current_event_id", str(event["id"]))
             elif not path_parts[1].startswith("{"): # Ignore if it looks like a regex/placeholder
                  pass
 
         # Load session early
-        self._load_session()
+        await self._load_session_async()
 
         # Global check for banned users
         user_id = self.get_current_user()
         if user_id:
             from app.services import users_service
-            if users_service.is_user_banned(user_id):
+            banned = users_service.get_cached_flag(user_id, "banned")
+            if banned is None:
+                banned = await run_blocking(users_service.is_user_banned, user_id)
+            if banned:
                 # Clear session
                 if self.session:
                      s_cookie = self.get_secure_cookie("session_id")
-                     if s_cookie: session_service.delete_session(s_cookie.decode())
+                     if s_cookie: await run_blocking(session_service.delete_session, s_cookie.decode())
                 
                 self.clear_cookie("session_id")
                 self.clear_cookie("user_id")
@@ -58,9 +78,13 @@ class BaseHandler(tornado.web.RequestHandler):
                 self.redirect("/login?error=" + tornado.escape.url_escape("Tu cuenta ha sido suspendida."))
                 return
 
+            # Warm the staff-role cache for the implicit event context so the
+            # sync is_*() permission helpers don't hit MySQL on the IOLoop.
+            await self.prefetch_event_staff_role()
+
     def current_event_id(self):
         # Priority 1: Session (Logged in user context)
-        if self.session is None: self._load_session()
+        if not self._session_loaded: self._load_session()
         if self.session and self.session.get("current_event_id"):
              return int(self.session.get("current_event_id"))
         
@@ -69,34 +93,50 @@ class BaseHandler(tornado.web.RequestHandler):
         return int(eid.decode()) if eid else None
 
     def current_user_role(self):
-        if self.session is None: self._load_session()
+        if not self._session_loaded: self._load_session()
         return self.session.get("user_role") if self.session else "viewer"
 
     def is_superadmin(self):
         return self.current_user_role() == "superadmin"
 
-    def event_staff_role(self, event_id=None):
+    def _staff_role_key(self, event_id=None):
         user_id = self.get_current_user()
         if not user_id:
-            return None
+            return None, None
 
         if event_id is None:
             event_id = self.current_event_id()
         if not event_id:
-            return None
+            return None, None
 
         try:
-            event_id = int(event_id)
+            return int(user_id), int(event_id)
         except (TypeError, ValueError):
-            return None
+            return None, None
 
-        cached = self._staff_role_cache.get(event_id)
-        if cached is not None:
-            return cached
+    async def prefetch_event_staff_role(self, event_id=None):
+        """Resolve the staff role off the IOLoop so later is_*() checks hit the cache."""
+        user_id, event_id = self._staff_role_key(event_id)
+        if event_id is None or event_id in self._staff_role_cache:
+            return
 
         from app.services import staff_service
-        role = staff_service.get_event_role(int(user_id), int(event_id))
+        hit, role = staff_service.get_cached_event_role(user_id, event_id)
+        if not hit:
+            role = await run_blocking(staff_service.get_event_role, user_id, event_id)
+        self._staff_role_cache[event_id] = role
+
+    def event_staff_role(self, event_id=None):
+        user_id, event_id = self._staff_role_key(event_id)
+        if event_id is None:
+            return None
+
         # Cache even None to avoid repeated DB hits.
+        if event_id in self._staff_role_cache:
+            return self._staff_role_cache[event_id]
+
+        from app.services import staff_service
+        role = staff_service.get_event_role(user_id, event_id)
         self._staff_role_cache[event_id] = role
         return role
 
@@ -161,6 +201,19 @@ class BaseHandler(tornado.web.RequestHandler):
             return "wss"
         return "ws"
 
+    def ws_url(self, role, event_id, event_timezone=None):
+        """WebSocket URL for a page, with a signed ticket for the role the handler just authorized."""
+        url = f"{self.get_ws_scheme()}://{self.request.host}/ws?role={role}&event_id={event_id}"
+        s_cookie = self.get_secure_cookie("session_id")
+        user_id = self.get_current_user()
+        if s_cookie and user_id:
+            from app.services import ticket_service
+            ticket = ticket_service.issue_ws_ticket(
+                s_cookie.decode(), user_id, self.current_user_name(), role, event_id, event_timezone
+            )
+            url += "&ticket=" + tornado.escape.url_escape(ticket)
+        return url
+
     def write_error(self, status_code, **kwargs):
         """Override to implement custom error pages."""
         if status_code == 404:
@@ -1,10 +1,11 @@
 import tornado.web
 
+from app.db import run_blocking
 from app.handlers.base import BaseHandler
 
 
 class HomeHandler(BaseHandler):
-    def get(self):
+    async def get(self):
         # If user already has a session, try to keep them in the same event context.
         if self.current_user:
             from app.services import events_service
@@ -15,7 +16,7 @@ class HomeHandler(BaseHandler):
 
             event_id = self.current_event_id()
             if event_id:
-                event = events_service.get_event_by_id(event_id)
+                event = await run_blocking(events_service.get_event_by_id, event_id)
                 if event and event.get("slug"):
                     self.redirect(f"/e/{event['slug']}/watch")
                     return
@@ -1,7 +1,13 @@
+import json
+import time
+
 import tornado.web
+from tornado.ioloop import IOLoop
 
+from app.db import run_blocking
 from app.handlers.base import BaseHandler
-from app.services import analytics_service
+from app.config import EXPORT_CACHE_DIR
+from app.services import analytics_service, export_service
 
 
 def _safe_int(value, default=0):
@@ -11,38 +17,27 @@ def _safe_int(value, default=0):
         return default
 
 
-def _build_active_sessions_export_rows(active_sessions):
-    rows = []
-    for row in active_sessions or []:
-        rows.append(
-            {
-                "user_id": row.get("user_id"),
-                "user_name": row.get("user_name"),
-                "start_time": row.get("start_time"),
-                "last_ping": row.get("last_ping"),
-                "session_minutes": row.get("session_minutes"),
-                "session_seconds": row.get("session_seconds"),
-            }
-        )
-    return rows
+# Bytes per write when streaming a generated file from disk.
+_FILE_CHUNK_BYTES = 64 * 1024
 
 
 class ReportsHandler(BaseHandler):
     @tornado.web.authenticated
-    def get(self, slug=None):
+    async def get(self, slug=None):
         from app.services import events_service
         event = None
         if slug:
-            event = events_service.get_event_by_slug(slug)
+            event = await run_blocking(events_service.get_event_by_slug, slug)
             
         if not event and self.current_event_id():
-            event = events_service.get_event_by_id(self.current_event_id())
+            event = await run_blocking(events_service.get_event_by_id, self.current_event_id())
             
         if not event:
             self.redirect("/admin/events")
             return
 
         event_id = event["id"]
+        await self.prefetch_event_staff_role(event_id)
 
         if not self.is_moderator_for_event(event_id):
             self.redirect(f"/e/{slug}/watch" if slug else "/watch")
@@ -50,224 +45,228 @@ class ReportsHandler(BaseHandler):
         # Ensure exports (which rely on current_event_id) are scoped to this event.
         self.set_secure_cookie("current_event_id", str(event_id))
         # Live attendees (based on last ping window)
-        active_sessions = analytics_service.list_active_sessions_for_report(event_id=event_id)
-        # All participants (historical list) for totals
-        all_participants = analytics_service.list_all_participants_for_report(event_id=event_id)
-        registered_users = analytics_service.list_registered_users(event_id=event_id)
-
-        total_registered_users = len(registered_users or [])
-        live_watchers_count = len(active_sessions or [])
-        total_minutes_consumed = sum(_safe_int(row.get("session_minutes")) for row in (all_participants or []))
-        
+        active_sessions = await run_blocking(analytics_service.list_active_sessions_for_report, event_id=event_id)
+        # Registered users feed the grid; the headline numbers come from aggregates.
+        registered_users = await run_blocking(analytics_service.list_registered_users, event_id=event_id)
+
+        # The reports socket is admin-only (moderators can see this page but the
+        # socket rejects them), so only sign a ticket for who the socket accepts.
+        if self.is_superadmin() or self.is_admin_for_event(event_id):
+            ws_url = self.ws_url("reports", event_id, event.get("timezone"))
+        else:
+            ws_url = f"{self.get_ws_scheme()}://{self.request.host}/ws?role=reports&event_id={event_id}"
+
+        metrics = await run_blocking(analytics_service.get_report_metrics, event_id)
+
         self.render(
             "reports.html",
             event=event,
             active_sessions=active_sessions,
             registered_users=registered_users,
-            ws_url=f"{self.get_ws_scheme()}://{self.request.host}/ws?role=reports&event_id={event_id}",
-            total_registered_users=total_registered_users,
-            live_watchers_count=live_watchers_count,
-            total_minutes_consumed=total_minutes_consumed,
+            ws_url=ws_url,
+            **metrics,
         )
 
 
-class ReportsExportHandler(BaseHandler):
-    @tornado.web.authenticated
-    def get(self):
-        export_format = self.get_query_argument("format", default="csv").strip().lower()
-        kind = self.get_query_argument("kind", default="active_sessions").strip().lower()
-        active_within_seconds = _safe_int(self.get_query_argument("window", default=None), default=None)
-        
-        event_id = self.current_event_id()
+class _ExportBaseHandler(BaseHandler):
+    async def export_event_id(self, event_id=None):
+        """The event to export if the user may export it; otherwise answers 403 and returns None."""
+        if not event_id:
+            event_id = self.current_event_id()
         if not event_id:
             try:
                 event_id = int(self.get_query_argument("event_id"))
             except (TypeError, ValueError, tornado.web.MissingArgumentError):
                 event_id = None
-        
+
+        if event_id:
+            await self.prefetch_event_staff_role(event_id)
         if not event_id or not self.is_moderator_for_event(event_id):
-             self.set_status(403)
-             self.finish({"error": "Acceso denegado"})
-             return
+            self.set_status(403)
+            self.finish({"error": "Acceso denegado"})
+            return None
+        return int(event_id)
 
-        if kind != "active_sessions":
-            self.set_status(400)
-            self.finish({"error": "kind inválido"})
+    async def event_timezone(self, event_id):
+        from app.services import events_service
+        event = await run_blocking(events_service.get_event_by_id, event_id) or {}
+        return event.get("timezone")
+
+    async def start_job(self, event_id, kind, export_format):
+        event_tz = await self.event_timezone(event_id)
+        # Taken before the version query: the artifact holds data at least this new.
+        observed_at = time.time()
+        version = await run_blocking(export_service.export_version, kind, event_id, event_tz)
+        return export_service.start_export_job(event_id, kind, export_format, version, event_tz, observed_at)
+
+
+def _job_payload(job):
+    payload = dict(job)
+    if job["status"] == "done":
+        payload["download_url"] = f"/reports/export/files/{job['id']}"
+    return payload
+
+
+async def _notify_export_ready(name, event_id, user_id):
+    job = await export_service.wait_export_job(name)
+    if job:
+        from app.handlers import ws
+        ws.broadcast({"type": "export_ready", "job": _job_payload(job)}, event_id=event_id, user_id=user_id)
+
+
+class ReportsExportHandler(_ExportBaseHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        export_format = self.get_query_argument("format", default="csv").strip().lower()
+        kind = self.get_query_argument("kind", default="active_sessions").strip().lower()
+
+        event_id = await self.export_event_id()
+        if not event_id:
             return
 
-        active_sessions = analytics_service.list_all_participants_for_report(event_id=event_id)
+        if kind not in export_service.EXPORT_KINDS:
+            self.set_status(400)
+            self.finish({"error": "kind inválido (use " + ", ".join(export_service.EXPORT_KINDS) + ")"})
+            return
 
-        rows = _build_active_sessions_export_rows(active_sessions)
-        filename_base = "reporte_sesiones_activas"
+        event_tz = await self.event_timezone(event_id)
+        filename_base = export_service.export_filename_base(kind)
 
         if export_format == "csv":
-            self._send_csv(filename_base, rows)
+            await self._stream_csv(filename_base, kind, event_id, event_tz)
             return
 
         if export_format == "xlsx":
-            self._send_xlsx(filename_base, rows)
+            await self._send_xlsx(filename_base, kind, event_id, event_tz)
             return
 
         if export_format == "pdf":
-            self._send_pdf(filename_base, rows)
+            # reportlab builds the whole document; render it in the export
+            # process pool (or reuse the cached file) and hand out the download.
+            job = await self.start_job(event_id, kind, "pdf")
+            job = await export_service.wait_export_job(job["id"])
+            if not job or job["status"] != "done":
+                self.set_status(500)
+                self.finish({"error": (job or {}).get("error") or "No se pudo generar el PDF"})
+                return
+            self.redirect(_job_payload(job)["download_url"])
             return
 
         self.set_status(400)
         self.finish({"error": "format inválido (use csv, xlsx o pdf)"})
 
-    def _send_csv(self, filename_base, rows):
-        import csv
-        import io
-        from app.db import now_in_timezone
-        from app.services import events_service
-
-        event_id = self.current_event_id()
-        event_tz = None
-        if event_id:
-            event = events_service.get_event_by_id(event_id) or {}
-            event_tz = event.get("timezone")
-
-        output = io.StringIO(newline="")
-        writer = csv.writer(output)
-        writer.writerow(["user_id", "user_name", "start_time", "last_ping", "session_minutes", "session_seconds"])
-        for row in rows:
-            writer.writerow(
-                [
-                    row.get("user_id"),
-                    row.get("user_name"),
-                    row.get("start_time"),
-                    row.get("last_ping"),
-                    row.get("session_minutes"),
-                    row.get("session_seconds"),
-                ]
-            )
-
-        # Excel on Windows often expects BOM for UTF-8 CSV.
-        csv_text = "\ufeff" + output.getvalue()
-        data = csv_text.encode("utf-8")
-
-        ts = now_in_timezone(event_tz).strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_base}_{ts}.csv"
-        self.set_header("Content-Type", "text/csv; charset=utf-8")
-        self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
-        self.write(data)
+    async def _stream_csv(self, filename_base, kind, event_id, event_tz=None):
+        # Spooled to a temp file at database speed, then streamed from disk:
+        # a slow client never keeps a MySQL result set open.
+        await self._send_spooled(
+            export_service.write_csv, "csv", "text/csv; charset=utf-8", filename_base, kind, event_id, event_tz
+        )
 
-    def _send_xlsx(self, filename_base, rows):
+    async def _send_xlsx(self, filename_base, kind, event_id, event_tz=None):
         try:
-            from openpyxl import Workbook
+            import openpyxl  # noqa: F401
         except Exception:
             self.set_status(500)
             self.finish({"error": "Falta dependencia openpyxl para generar XLSX"})
             return
 
-        import io
-        from app.db import now_in_timezone
-        from app.services import events_service
-
-        event_id = self.current_event_id()
-        event_tz = None
-        if event_id:
-            event = events_service.get_event_by_id(event_id) or {}
-            event_tz = event.get("timezone")
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Sesiones activas"
-
-        headers = ["user_id", "user_name", "start_time", "last_ping", "session_minutes", "session_seconds"]
-        ws.append(headers)
-        for row in rows:
-            ws.append(
-                [
-                    row.get("user_id"),
-                    row.get("user_name"),
-                    row.get("start_time"),
-                    row.get("last_ping"),
-                    row.get("session_minutes"),
-                    row.get("session_seconds"),
-                ]
-            )
-
-        stream = io.BytesIO()
-        wb.save(stream)
-        stream.seek(0)
-
-        ts = now_in_timezone(event_tz).strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_base}_{ts}.xlsx"
-        self.set_header(
-            "Content-Type",
+        await self._send_spooled(
+            export_service.write_xlsx,
+            "xlsx",
             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            filename_base,
+            kind,
+            event_id,
+            event_tz,
         )
-        self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
-        self.write(stream.getvalue())
 
-    def _send_pdf(self, filename_base, rows):
+    async def _send_spooled(self, write_fn, extension, content_type, filename_base, kind, event_id, event_tz=None):
+        import os
+        import tempfile
+        from app.db import now_in_timezone
+
+        # Built in a worker thread into a temp file, then streamed from disk.
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{extension}")
+        os.close(fd)
         try:
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-        except Exception:
-            self.set_status(500)
-            self.finish({"error": "Falta dependencia reportlab para generar PDF"})
+            await run_blocking(write_fn, path, kind, event_id, event_tz)
+
+            ts = now_in_timezone(event_tz).strftime("%Y%m%d_%H%M%S")
+            filename = f"{filename_base}_{ts}.{extension}"
+            self.set_header("Content-Type", content_type)
+            self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
+            self.set_header("Content-Length", str(os.path.getsize(path)))
+            with open(path, "rb") as f:
+                while True:
+                    data = await run_blocking(f.read, _FILE_CHUNK_BYTES)
+                    if not data:
+                        break
+                    self.write(data)
+                    await self.flush()
+        finally:
+            os.remove(path)
+
+
+class ExportJobsHandler(_ExportBaseHandler):
+    """POST creates (or reuses) an export job; GET /<id> reports its state."""
+
+    @tornado.web.authenticated
+    async def post(self, job_id=None):
+        try:
+            data = json.loads(self.request.body) if self.request.body else {}
+        except ValueError:
+            data = {}
+        kind = str(data.get("kind") or self.get_argument("kind", "active_sessions")).strip().lower()
+        export_format = str(data.get("format") or self.get_argument("format", "csv")).strip().lower()
+
+        event_id = await self.export_event_id(_safe_int(data.get("event_id"), default=None))
+        if not event_id:
+            return
+        if kind not in export_service.EXPORT_KINDS or export_format not in export_service.EXPORT_FORMATS:
+            self.set_status(400)
+            self.finish({"status": "error", "message": "kind o format inválido"})
             return
 
-        import io
-        from app.db import now_in_timezone
-        from app.services import events_service
+        job = await self.start_job(event_id, kind, export_format)
+        if job["status"] != "done":
+            # The page hears about it over its socket; polling GET works too.
+            IOLoop.current().spawn_callback(_notify_export_ready, job["id"], event_id, self.get_current_user())
+        self.write({"status": "success", "job": _job_payload(job)})
+
+    @tornado.web.authenticated
+    async def get(self, job_id=None):
+        parsed = export_service.parse_artifact_name(job_id)
+        if not parsed or not await self.export_event_id(parsed[0]):
+            if not self._finished:
+                self.set_status(404)
+                self.finish({"status": "error", "message": "job no encontrado"})
+            return
+        # Unknown here but valid: another process may be rendering it.
+        job = export_service.get_export_job(job_id) or {"id": job_id, "status": "pending"}
+        self.write({"status": "success", "job": _job_payload(job)})
 
-        event_id = self.current_event_id()
-        event_tz = None
-        if event_id:
-            event = events_service.get_event_by_id(event_id) or {}
-            event_tz = event.get("timezone")
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-
-        ts_human = now_in_timezone(event_tz).strftime("%Y-%m-%d %H:%M:%S")
-        elements = [
-            Paragraph("Reporte: Sesiones activas", styles["Title"]),
-            Paragraph(f"Generado: {ts_human}", styles["Normal"]),
-            Spacer(1, 12),
-        ]
-
-        table_data = [["User ID", "Nombre", "Inicio", "Último ping", "Min", "Seg"]]
-        for row in rows:
-            table_data.append(
-                [
-                    str(row.get("user_id") or ""),
-                    str(row.get("user_name") or ""),
-                    str(row.get("start_time") or ""),
-                    str(row.get("last_ping") or ""),
-                    str(row.get("session_minutes") or ""),
-                    str(row.get("session_seconds") or ""),
-                ]
-            )
-
-        table = Table(table_data, repeatRows=1)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e0f2fe")),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#0f172a")),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 9),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8fafc")]),
-                ]
-            )
-        )
-        elements.append(table)
 
-        doc.build(elements)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
+class ExportFileHandler(tornado.web.StaticFileHandler, BaseHandler):
+    """Serves finished export files from EXPORT_CACHE_DIR (ETag, Range, HEAD)."""
 
-        ts = now_in_timezone(event_tz).strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_base}_{ts}.pdf"
-        self.set_header("Content-Type", "application/pdf")
+    def initialize(self, path=EXPORT_CACHE_DIR, default_filename=None):
+        BaseHandler.initialize(self)
+        tornado.web.StaticFileHandler.initialize(self, path, default_filename)
+
+    @tornado.web.authenticated
+    async def get(self, path, include_body=True):
+        parsed = export_service.parse_artifact_name(path)
+        if not parsed:
+            raise tornado.web.HTTPError(404)
+        event_id, kind, export_format = parsed
+        await self.prefetch_event_staff_role(event_id)
+        if not self.is_moderator_for_event(event_id):
+            raise tornado.web.HTTPError(403)
+
+        version = path.rsplit("_", 1)[1].split(".", 1)[0]
+        filename = f"{export_service.export_filename_base(kind)}_{version}.{export_format}"
         self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
-        self.write(pdf_bytes)
+        await super().get(path, include_body)
+
+    def set_extra_headers(self, path):
+        self.set_header("Cache-Control", "private, max-age=3600")
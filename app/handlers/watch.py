@@ -1,20 +1,21 @@
 import tornado.web
 
+from app.db import run_blocking
 from app.handlers.base import BaseHandler
 from app.services import analytics_service, chat_service, questions_service
 
 
 class WatchHandler(BaseHandler):
     @tornado.web.authenticated
-    def get(self, slug=None):
+    async def get(self, slug=None):
         from app.services import events_service
         event = None
         if slug:
-            event = events_service.get_event_by_slug(slug)
+            event = await run_blocking(events_service.get_event_by_slug, slug)
         
         # Fallback to current session event if no slug but has cookie
         if not event and self.current_event_id():
-            event = events_service.get_event_by_id(self.current_event_id())
+            event = await run_blocking(events_service.get_event_by_id, self.current_event_id())
 
         if not event:
             # If no event found, show a placeholder or redirect to events list if admin
@@ -25,6 +26,7 @@ class WatchHandler(BaseHandler):
             return
 
         event_id = event["id"]
+        await self.prefetch_event_staff_role(event_id)
 
         # Check if event is active (allow staff even if paused?)
         # Let's say Viewers cannot enter if paused, but staff can.
@@ -35,10 +37,10 @@ class WatchHandler(BaseHandler):
         # Mark viewer as active even if WebSocket can't connect (fallback).
         user_id = self.get_current_user()
         if user_id:
-            analytics_service.ensure_session_analytics(user_id, event_id=event_id)
+            await run_blocking(analytics_service.ensure_session_analytics, user_id, event_id=event_id)
 
-        chats = chat_service.list_recent_chats(event_id=event_id)
-        questions = questions_service.list_questions(status="approved", event_id=event_id)
+        chats = await run_blocking(chat_service.list_recent_chats, event_id=event_id)
+        questions = await run_blocking(questions_service.list_questions, status="approved", event_id=event_id)
         
         self.render(
             "watch.html",
@@ -47,7 +49,7 @@ class WatchHandler(BaseHandler):
             user_name=self.current_user_name(),
             chats=chats,
             approved_questions=questions,
-            ws_url=f"{self.get_ws_scheme()}://{self.request.host}/ws?role=viewer&event_id={event_id}",
+            ws_url=self.ws_url("viewer", event_id, event.get("timezone")),
         )
 
 
@@ -56,7 +58,7 @@ class APIPingHandler(BaseHandler):
 
     # Remove @authenticated decorator to prevent 302 Redirect on session expiry
     # We want a clean 401 for the JS fetch to detect.
-    def post(self):
+    async def post(self):
         # Manual check
         user_id = self.get_current_user()
         if not user_id:
@@ -1,16 +1,42 @@
+import collections
 import json
 from datetime import datetime
+import struct
+import time
 import traceback
 
+import tornado.iostream
 import tornado.websocket
+from tornado.ioloop import IOLoop
 
-from app.db import now_hhmm_in_timezone
+from app.config import (
+    CHAT_BATCH_EVENT_WINDOWS,
+    CHAT_BATCH_WINDOW_MS,
+    CHAT_MESSAGE_MAX_CHARS,
+    REPORTS_SNAPSHOT_INTERVAL_MS,
+    SESSIONS_PROGRESS_INTERVAL_MS,
+    WS_COMPRESSION_LEVEL,
+    WS_COMPRESSION_MEM_LEVEL,
+    WS_COMPRESSION_ROLES,
+    WS_CLOSE_FLUSH_SECONDS,
+    WS_DEBUG,
+    WS_LEASE_CHECK_MS,
+    WS_OUTBOUND_MAX_BYTES,
+    WS_OUTBOUND_MAX_MESSAGES,
+    WS_OUTBOUND_POLICY,
+    WS_TICKET_TTL,
+)
+from app.db import now_hhmm_in_timezone, run_blocking
 from app.services import analytics_service, chat_service, questions_service, users_service
 from app.services import session_service
 from app.services import events_service
+from app.services import pubsub_service
+from app.services import ticket_service
 
-# Keep per-role client pools. Reports is a first-class role.
-WEBSOCKET_CLIENTS = {"viewer": set(), "moderator": set(), "speaker": set(), "reports": set()}
+# Live sockets indexed by event -> role -> user_id -> set of sockets.
+# Fan-out, kicks and the active-event list only walk the sockets they target
+# instead of every socket of every event hosted by this process.
+WEBSOCKET_CLIENTS = {}
 
 
 def _safe_int(value, default=0):
@@ -20,97 +46,652 @@ def _safe_int(value, default=0):
         return default
 
 
-def push_reports_snapshot(event_id=None):
+def _register_client(client):
+    by_role = WEBSOCKET_CLIENTS.setdefault(client.event_id, {})
+    by_user = by_role.setdefault(client.role, {})
+    by_user.setdefault(client.user_id, set()).add(client)
+
+
+def _unregister_client(client):
+    event_id = getattr(client, "event_id", None)
+    role = getattr(client, "role", None)
+    user_id = getattr(client, "user_id", None)
+
+    by_role = WEBSOCKET_CLIENTS.get(event_id)
+    if not by_role:
+        return
+    by_user = by_role.get(role)
+    if not by_user:
+        return
+    sockets = by_user.get(user_id)
+    if not sockets:
+        return
+
+    sockets.discard(client)
+    # Prune empty branches so the index only ever holds live events.
+    if not sockets:
+        del by_user[user_id]
+    if not by_user:
+        del by_role[role]
+    if not by_role:
+        del WEBSOCKET_CLIENTS[event_id]
+
+
+def _iter_clients(event_id=None, roles=None, user_id=None):
+    """Return (role, client) pairs for the sockets matching the given filters.
+
+    `event_id=None` means every event. The index is snapshotted up front so
+    callers may close/unregister sockets while iterating.
+    """
+    if event_id is not None:
+        by_role = WEBSOCKET_CLIENTS.get(event_id)
+        scopes = [by_role] if by_role else []
+    else:
+        scopes = list(WEBSOCKET_CLIENTS.values())
+
+    targets = []
+    for by_role in scopes:
+        for role in (roles if roles else list(by_role)):
+            by_user = by_role.get(role)
+            if not by_user:
+                continue
+            if user_id is not None:
+                targets.extend((role, client) for client in by_user.get(user_id, ()))
+            else:
+                for sockets in by_user.values():
+                    targets.extend((role, client) for client in sockets)
+    return targets
+
+
+class FramedPayload:
+    """A broadcast payload JSON-encoded once and framed once.
+
+    Every recipient on a plain (uncompressed) connection gets the very same
+    frame bytes, instead of Tornado re-framing the text on each
+    `write_message` call. Compressed connections go through `write_message`:
+    browsers never negotiate server_no_context_takeover, so their deflate
+    stream is per connection anyway.
+    """
+
+    __slots__ = ("text", "data", "control", "_frame")
+
+    def __init__(self, text, control=False):
+        self.text = text
+        self.data = text.encode("utf-8")
+        # Control messages are never dropped from a slow consumer's queue.
+        self.control = control
+        self._frame = None
+
+    def frame(self):
+        if self._frame is None:
+            self._frame = _build_text_frame(self.data)
+        return self._frame
+
+
+def _build_text_frame(data):
+    # RFC 6455 unmasked, final text frame (server to client, no extensions).
+    header = struct.pack("B", 0x80 | 0x1)
+    data_len = len(data)
+    if data_len < 126:
+        header += struct.pack("B", data_len)
+    elif data_len <= 0xFFFF:
+        header += struct.pack("!BH", 126, data_len)
+    else:
+        header += struct.pack("!BQ", 127, data_len)
+    return header + data
+
+
+# Message types that must reach the client even when its queue is full.
+CONTROL_MESSAGE_TYPES = {"event_closed", "force_logout"}
+
+# Slow-consumer evictions per event: dropped messages and forced disconnects.
+OUTBOUND_EVICTIONS = collections.defaultdict(lambda: {"dropped": 0, "disconnected": 0})
+
+
+def get_outbound_stats():
+    return {eid: dict(counts) for eid, counts in OUTBOUND_EVICTIONS.items()}
+
+
+def active_event_ids():
+    """Events with at least one socket connected to this process."""
+    return sorted(eid for eid in WEBSOCKET_CLIENTS if eid is not None)
+
+
+# Last active_sessions snapshot sent per event:
+# {"seq": n, "rows": {user_id: row}, "progress": {user_id: (minutes, last_ping)}, "progress_at": t}.
+# Clients get the full list on connect (or on request) and `sessions_delta`
+# messages afterwards; a gap in `seq` makes them ask for a full snapshot.
+_SESSION_SNAPSHOTS = {}
+
+# Fields that make a row "changed". Minutes/last ping move on every heartbeat
+# and travel separately as `progress` triples.
+_SESSION_IDENTITY_FIELDS = ("user_name", "chat_blocked", "qa_blocked", "banned", "start_time", "timezone")
+
+
+def _row_progress(row):
+    return (row.get("session_minutes"), row.get("last_ping"))
+
+
+def _new_snapshot_state(rows):
+    return {
+        "seq": 0,
+        "rows": rows,
+        "progress": {uid: _row_progress(row) for uid, row in rows.items()},
+        "progress_at": time.monotonic(),
+    }
+
+
+def _diff_active_sessions(event_id, sessions):
+    """Record the new snapshot and return the message that brings clients up to date."""
+    rows = {row.get("user_id"): row for row in (sessions or [])}
+    state = _SESSION_SNAPSHOTS.get(event_id)
+    if state is None:
+        _SESSION_SNAPSHOTS[event_id] = _new_snapshot_state(rows)
+        return {"type": "active_sessions", "seq": 0, "sessions": list(rows.values())}
+
+    previous = state["rows"]
+    joined = [row for uid, row in rows.items() if uid not in previous]
+    changed = [
+        row
+        for uid, row in rows.items()
+        if uid in previous and any(previous[uid].get(f) != row.get(f) for f in _SESSION_IDENTITY_FIELDS)
+    ]
+    left = [uid for uid in previous if uid not in rows]
+    state["rows"] = rows
+
+    sent = state["progress"]
+    for uid in left:
+        sent.pop(uid, None)
+    for row in joined + changed:
+        sent[row.get("user_id")] = _row_progress(row)
+
+    progress = []
+    now = time.monotonic()
+    if now - state["progress_at"] >= SESSIONS_PROGRESS_INTERVAL_MS / 1000.0:
+        state["progress_at"] = now
+        for uid, row in rows.items():
+            current = _row_progress(row)
+            if sent.get(uid) != current:
+                sent[uid] = current
+                progress.append([uid, current[0], current[1]])
+
+    if not (joined or changed or left or progress):
+        return None
+
+    state["seq"] += 1
+    delta = {"type": "sessions_delta", "seq": state["seq"], "joined": joined, "changed": changed, "left": left}
+    if progress:
+        delta["progress"] = progress
+    return delta
+
+
+async def _full_sessions_message(event_id):
+    state = _SESSION_SNAPSHOTS.get(event_id)
+    if state is None:
+        sessions = await run_blocking(analytics_service.list_active_sessions_for_report, event_id=event_id)
+        # A delta may have created the state during the query: keep it and its
+        # seq, or the clients that already got deltas would see seq go back.
+        state = _SESSION_SNAPSHOTS.setdefault(
+            event_id, _new_snapshot_state({row.get("user_id"): row for row in sessions})
+        )
+
+    # No await from here on: rows and seq come from the same version of the state.
+    sessions = sorted(state["rows"].values(), key=lambda row: row.get("last_ping") or "", reverse=True)
+    return {"type": "active_sessions", "seq": state["seq"], "sessions": sessions}
+
+
+async def push_reports_snapshot(event_id=None):
     try:
         # If no event_id is provided (e.g., periodic refresh), broadcast a scoped snapshot
         # per event to avoid mixing data across events in the UI.
         if event_id is None:
-            event_ids = set()
-            for clients in WEBSOCKET_CLIENTS.values():
-                for client in list(clients):
-                    eid = getattr(client, "event_id", None)
-                    if eid is not None:
-                        event_ids.add(eid)
-
-            for eid in sorted(event_ids):
-                push_reports_snapshot(event_id=eid)
+            for eid in active_event_ids():
+                await push_reports_snapshot(event_id=eid)
             return
 
-        # 1. Reports view: active sessions for live attendance
-        active_viewers = analytics_service.list_active_sessions_for_report(event_id=event_id)
-        broadcast({"type": "active_sessions", "sessions": active_viewers}, roles={"reports"}, event_id=event_id)
-        
-        # 2. Truly active sessions (live viewers) for the Moderator view
-        broadcast({"type": "active_sessions", "sessions": active_viewers}, roles={"moderator"}, event_id=event_id)
-
-        # 3. Reports metrics snapshot
-        all_participants = analytics_service.list_all_participants_for_report(event_id=event_id)
-        registered_users = analytics_service.list_registered_users(event_id=event_id)
-        total_registered_users = len(registered_users or [])
-        live_watchers_count = len(active_viewers or [])
-        total_minutes_consumed = sum(_safe_int(row.get("session_minutes")) for row in (all_participants or []))
-
-        broadcast(
-            {
-                "type": "reports_metrics",
-                "total_registered_users": total_registered_users,
-                "live_watchers_count": live_watchers_count,
-                "total_minutes_consumed": total_minutes_consumed,
-            },
+        # 1. Live attendance for reports and moderators, sent as a delta against
+        # the last snapshot. Snapshots are built per node for its own sockets,
+        # so they are delivered locally rather than fanned out over Redis.
+        active_viewers = await run_blocking(analytics_service.list_active_sessions_for_report, event_id=event_id)
+        delta = _diff_active_sessions(event_id, active_viewers)
+        if delta:
+            _broadcast_local(json.dumps(delta), roles={"reports", "moderator"}, event_id=event_id)
+
+        # 2. Reports metrics snapshot
+        metrics = await run_blocking(analytics_service.get_report_metrics, event_id)
+        _broadcast_local(
+            json.dumps({"type": "reports_metrics", **metrics}),
             roles={"reports"},
             event_id=event_id,
         )
 
-        print(f"[WS] snapshot event_id={event_id} active={len(active_viewers)} total={len(all_participants)}")
+        print(
+            f"[WS] snapshot event_id={event_id} active={len(active_viewers)} "
+            f"registered={metrics['total_registered_users']}"
+        )
         
     except Exception as exc:
         print(f"[WS] ! Error building reports snapshot: {exc}")
         traceback.print_exc()
         return
 
+# Snapshot scheduler: callers only mark an event dirty; the rebuild runs at
+# most once per REPORTS_SNAPSHOT_INTERVAL_MS per event.
+_SNAPSHOT_DIRTY = set()
+_SNAPSHOT_LAST_BUILT = {}
+SNAPSHOT_STATS = {"rebuilds": 0, "skipped": 0}
+
+
+def schedule_reports_snapshot(event_id=None):
+    """Mark an event's reports snapshot dirty (all live events if None)."""
+    if event_id is None:
+        for eid in active_event_ids():
+            schedule_reports_snapshot(event_id=eid)
+        return
+
+    if event_id in _SNAPSHOT_DIRTY:
+        # Already queued: this change rides along with the pending rebuild.
+        SNAPSHOT_STATS["skipped"] += 1
+        return
+
+    _SNAPSHOT_DIRTY.add(event_id)
+    due = _SNAPSHOT_LAST_BUILT.get(event_id, 0.0) + REPORTS_SNAPSHOT_INTERVAL_MS / 1000.0
+    IOLoop.current().call_later(max(0.0, due - time.monotonic()), _flush_reports_snapshot, event_id)
+
+
+async def _flush_reports_snapshot(event_id):
+    _SNAPSHOT_DIRTY.discard(event_id)
+
+    # Nobody is watching the reports for this event: skip the queries entirely.
+    if not _iter_clients(event_id=event_id, roles={"reports", "moderator"}):
+        _SNAPSHOT_LAST_BUILT.pop(event_id, None)
+        _SESSION_SNAPSHOTS.pop(event_id, None)
+        SNAPSHOT_STATS["skipped"] += 1
+        return
+
+    _SNAPSHOT_LAST_BUILT[event_id] = time.monotonic()
+    SNAPSHOT_STATS["rebuilds"] += 1
+    await push_reports_snapshot(event_id=event_id)
+
+
+async def flush_heartbeats():
+    """Write buffered viewer pings in one upsert, then refresh the affected reports."""
+    try:
+        event_ids = await run_blocking(analytics_service.flush_pings)
+    except Exception:
+        traceback.print_exc()
+        return
+    for event_id in event_ids:
+        schedule_reports_snapshot(event_id=event_id)
+
+
+def get_snapshot_stats():
+    return {**SNAPSHOT_STATS, "pending": len(_SNAPSHOT_DIRTY)}
+
+
+# Session leases: instead of a Redis lookup per message, each socket is trusted
+# until `lease_until`. One sweep per WS_LEASE_CHECK_MS refreshes every session
+# held by this process in a single pipelined call, closes sockets whose session
+# is gone and renews the rest (a missed sweep is tolerated).
+_LEASE_SWEEP = {"running": False}
+
+
+def _lease_span():
+    return 2 * WS_LEASE_CHECK_MS / 1000.0
+
+
+def _role_allowed(requested_role, user_role, staff_role, own_event):
+    """Whether a user may hold `requested_role` on an event.
+
+    `user_role` is the global role, `staff_role` the event_staff role (or None)
+    and `own_event` says whether a per-event staff account belongs to this event.
+    """
+    if requested_role == "viewer":
+        return True
+    if requested_role not in ("moderator", "speaker", "reports"):
+        return False
+    if user_role == "superadmin":
+        return True
+    if requested_role == "moderator":
+        return staff_role in ("admin", "moderator") or (user_role in ("moderator", "moderador") and own_event)
+    if requested_role == "speaker":
+        return staff_role in ("admin", "speaker") or (user_role == "speaker" and own_event)
+    return staff_role == "admin"
+
+
+def _revoked_sockets(keys):
+    """Blocking: re-resolve ban, event state and role for (user_id, role, event_id) keys.
+
+    Returns {key: reason} for the sockets that lost access. Moderation flags,
+    events and staff roles come from their caches; only the global role of
+    staff sockets (a handful) is read from MySQL every time.
+    """
+    from app.services import staff_service
+
+    statuses = users_service.get_statuses({user_id for user_id, _, _ in keys})
+    accounts = users_service.get_account_roles({user_id for user_id, role, _ in keys if role != "viewer"})
+    events = {}
+    revoked = {}
+    for key in keys:
+        user_id, role, event_id = key
+        if (statuses.get(user_id) or {}).get("banned"):
+            revoked[key] = "banned"
+            continue
+        if role == "viewer":
+            if event_id is not None:
+                if event_id not in events:
+                    events[event_id] = events_service.get_event_by_id(event_id)
+                if events[event_id] is not None and not events[event_id].get("is_active"):
+                    revoked[key] = "event_closed"
+            continue
+
+        account = accounts.get(_safe_int(user_id))
+        staff_role = staff_service.get_event_role(_safe_int(user_id), _safe_int(event_id)) if event_id else None
+        if account is None or not _role_allowed(
+            role,
+            account.get("role") or "viewer",
+            staff_role,
+            account.get("event_id") is None or _safe_int(account.get("event_id")) == _safe_int(event_id),
+        ):
+            revoked[key] = "role_revoked"
+    return revoked
+
+
+async def revalidate_leases():
+    if _LEASE_SWEEP["running"]:
+        return
+    clients = [client for _, client in _iter_clients()]
+    session_ids = {client.session_id for client in clients if getattr(client, "session_id", None)}
+    if not session_ids:
+        return
+
+    _LEASE_SWEEP["running"] = True
+    try:
+        live = await run_blocking(session_service.refresh_sessions, session_ids)
+        # A live session isn't enough: bans, closed events and removed staff
+        # roles must stop both the socket and its ticket renewals.
+        keys = {(client.user_id, client.role, client.event_id) for client in clients}
+        try:
+            revoked = await run_blocking(_revoked_sockets, keys)
+        except Exception as e:
+            print(f"[WS] ! could not re-check socket roles: {e}")
+            revoked = None
+    except Exception:
+        traceback.print_exc()
+        return
+    finally:
+        _LEASE_SWEEP["running"] = False
+
+    # live=None: Redis can't tell right now; keep sockets rather than drop everyone.
+    lease_until = time.monotonic() + _lease_span()
+    for client in clients:
+        if live is not None and client.session_id not in live:
+            try:
+                client.close(code=4001, reason="session_expired")
+            except Exception:
+                pass
+            continue
+        reason = revoked.get((client.user_id, client.role, client.event_id)) if revoked is not None else None
+        if reason:
+            print(f"[WS] ! Acceso revocado ({reason}): {client.role} | user_id={client.user_id} | event_id={client.event_id}")
+            try:
+                client.close(code=4003, reason=reason)
+            except Exception:
+                pass
+            continue
+        client.lease_until = lease_until
+        if revoked is None:
+            # Roles couldn't be re-checked: keep the socket, but don't extend its ticket.
+            continue
+        try:
+            client.renew_ticket()
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+
+def _fanout_channel(event_id):
+    return f"ws:event:{event_id}" if event_id is not None else "ws:global"
+
+
 def kick_all_from_event(event_id):
-    """Forcefully disconnect all clients from a closed event."""
-    text = json.dumps({"type": "event_closed", "message": "Esta transmisión ha finalizado."})
-    target_roles = ["viewer", "moderator", "speaker", "reports"]
-    
-    for role in target_roles:
-        clients = list(WEBSOCKET_CLIENTS.get(role, []))
-        for client in clients:
-            if getattr(client, "event_id", None) == event_id:
-                try:
-                    client.write_message(text)
-                    client.close()
-                except:
-                    pass
-                WEBSOCKET_CLIENTS[role].discard(client)
+    """Forcefully disconnect all clients from a closed event, on every node."""
+    event_id = _safe_int(event_id, default=None)
+    if event_id is None:
+        return
 
+    pubsub_service.publish(_fanout_channel(event_id), {"op": "kick", "event_id": event_id})
+    _kick_local(event_id)
 
-def broadcast(payload, roles=None, event_id=None):
+
+def _kick_local(event_id):
+    # Queued like any broadcast (framed once); each socket closes once it's sent.
+    framed = FramedPayload(
+        json.dumps({"type": "event_closed", "message": "Esta transmisión ha finalizado."}), control=True
+    )
+    for _role, client in _iter_clients(event_id=event_id):
+        try:
+            client.write_framed(framed)
+            client.close_when_flushed()
+        except:
+            pass
+        _unregister_client(client)
+
+
+def broadcast(payload, roles=None, event_id=None, user_id=None):
+    """Send `payload` to matching sockets on this node and, via Redis, on every other node."""
     text = json.dumps(payload)
-    target_roles = roles if roles else WEBSOCKET_CLIENTS.keys()
-    
+    control = payload.get("type") in CONTROL_MESSAGE_TYPES
+    pubsub_service.publish(
+        _fanout_channel(event_id),
+        {
+            "op": "broadcast",
+            "text": text,
+            "control": control,
+            "roles": sorted(roles) if roles else None,
+            "event_id": event_id,
+            "user_id": user_id,
+        },
+    )
+    _broadcast_local(text, roles=roles, event_id=event_id, user_id=user_id, control=control)
+
+
+def _broadcast_local(text, roles=None, event_id=None, user_id=None, control=False):
+    framed = FramedPayload(text, control=control)
+
     sent_count = 0
-    for role in target_roles:
-        clients = list(WEBSOCKET_CLIENTS.get(role, []))
-        for client in clients:
-            # Filter by event_id if provided
-            if event_id is not None and getattr(client, "event_id", None) != event_id:
-                continue
-            
-            try:
-                client.write_message(text)
-                sent_count += 1
-            except tornado.websocket.WebSocketClosedError:
-                WEBSOCKET_CLIENTS[role].discard(client)
-    
-    print(f"[WS] OK: Enviado a {sent_count} clientes")
+    for _role, client in _iter_clients(event_id=event_id, roles=roles, user_id=user_id):
+        try:
+            client.write_framed(framed)
+            sent_count += 1
+        except tornado.websocket.WebSocketClosedError:
+            _unregister_client(client)
+
+    if WS_DEBUG:
+        print(f"[WS] OK: Enviado a {sent_count} clientes")
+
+
+# Chat messages waiting for their event's batch window to close.
+_CHAT_BATCHES = {}
+
+
+def chat_batch_window_ms(event_id):
+    return CHAT_BATCH_EVENT_WINDOWS.get(event_id, CHAT_BATCH_WINDOW_MS)
+
+
+def broadcast_chat(chat_payload, event_id=None):
+    """Broadcast a chat message, batching it if the event has a batch window."""
+    if event_id is None:
+        broadcast(chat_payload, event_id=event_id)
+        return
+
+    # Each node batches for its own sockets, so peers get the raw message.
+    pubsub_service.publish(_fanout_channel(event_id), {"op": "chat", "event_id": event_id, "payload": chat_payload})
+    _queue_chat_local(chat_payload, event_id)
+
+
+def _queue_chat_local(chat_payload, event_id):
+    window_ms = chat_batch_window_ms(event_id)
+    if window_ms <= 0:
+        _broadcast_local(json.dumps(chat_payload), event_id=event_id)
+        return
+
+    batch = _CHAT_BATCHES.get(event_id)
+    if batch is None:
+        batch = _CHAT_BATCHES[event_id] = []
+        IOLoop.current().call_later(window_ms / 1000.0, _flush_chat_batch, event_id)
+    batch.append(chat_payload)
+
+
+def _flush_chat_batch(event_id):
+    messages = _CHAT_BATCHES.pop(event_id, None)
+    if not messages:
+        return
+    if len(messages) == 1:
+        _broadcast_local(json.dumps(messages[0]), event_id=event_id)
+    else:
+        _broadcast_local(json.dumps({"type": "chat_batch", "messages": messages}), event_id=event_id)
+
+
+def _on_remote_fanout(channel, data):
+    # Another node already delivered to its own sockets; deliver to ours.
+    data = data or {}
+    if data.get("op") == "kick":
+        _kick_local(data.get("event_id"))
+    elif data.get("op") == "chat" and data.get("payload"):
+        chat_service.remember_remote_chat(data["payload"], data.get("event_id"))
+        _queue_chat_local(data["payload"], data.get("event_id"))
+    elif data.get("op") == "broadcast" and data.get("text"):
+        _broadcast_local(
+            data["text"],
+            roles=set(data["roles"]) if data.get("roles") else None,
+            event_id=data.get("event_id"),
+            user_id=data.get("user_id"),
+            control=bool(data.get("control")),
+        )
+
+
+pubsub_service.subscribe("ws:*", _on_remote_fanout)
 
 
 class LiveWebSocket(tornado.websocket.WebSocketHandler):
     def allow_draft76(self):
         return True
 
-    def open(self):
+    def get_compression_options(self):
+        # Negotiated during the handshake, before open() has validated the
+        # role; the requested role only picks a wire format, not permissions.
+        if self.get_query_argument("role", "viewer") not in WS_COMPRESSION_ROLES:
+            return None
+        return {"compression_level": WS_COMPRESSION_LEVEL, "mem_level": WS_COMPRESSION_MEM_LEVEL}
+
+    def initialize(self):
+        # Bounded outbound queue: at most one frame is handed to Tornado at a
+        # time, the rest wait here so a slow link can't grow an unbounded buffer.
+        self._outbound = collections.deque()
+        self._outbound_bytes = 0
+        self._writing = False
+        self._close_after_flush = None
+        self.lease_until = 0.0
+        self._ticket_exp = 0
+        # Sockets that can't negotiate permessage-deflate share pre-built frames.
+        self._shared_frames = self.get_compression_options() is None
+
+    def write_framed(self, framed):
+        """Queue a `FramedPayload` for this socket, enforcing the outbound limits."""
+        conn = self.ws_connection
+        if conn is None or conn.is_closing():
+            raise tornado.websocket.WebSocketClosedError()
+
+        size = len(framed.data)
+        while self._outbound_over_limit(size):
+            if WS_OUTBOUND_POLICY == "disconnect":
+                self._evict_slow_consumer()
+                return
+            if not self._drop_oldest_message():
+                break
+
+        if self._outbound_over_limit(size) and not framed.control:
+            # Only control messages are left queued; drop the newcomer instead.
+            OUTBOUND_EVICTIONS[getattr(self, "event_id", None)]["dropped"] += 1
+            return
+
+        self._outbound.append(framed)
+        self._outbound_bytes += size
+        self._pump_outbound()
+
+    def send_error(self, message):
+        """Error reply to this socket only, queued behind what's already pending."""
+        self.write_framed(FramedPayload(json.dumps({"type": "error", "message": message})))
+
+    def close_when_flushed(self, code=None, reason=None):
+        """Close once the outbound queue is written (or after WS_CLOSE_FLUSH_SECONDS)."""
+        self._close_after_flush = (code, reason)
+        IOLoop.current().call_later(WS_CLOSE_FLUSH_SECONDS, self.close, code, reason)
+        self._pump_outbound()
+
+    def _outbound_over_limit(self, incoming_size):
+        return bool(self._outbound) and (
+            len(self._outbound) >= WS_OUTBOUND_MAX_MESSAGES
+            or self._outbound_bytes + incoming_size > WS_OUTBOUND_MAX_BYTES
+        )
+
+    def _drop_oldest_message(self):
+        for index, queued in enumerate(self._outbound):
+            if not queued.control:
+                del self._outbound[index]
+                self._outbound_bytes -= len(queued.data)
+                OUTBOUND_EVICTIONS[getattr(self, "event_id", None)]["dropped"] += 1
+                return True
+        return False
+
+    def _evict_slow_consumer(self):
+        OUTBOUND_EVICTIONS[getattr(self, "event_id", None)]["disconnected"] += 1
+        self._outbound.clear()
+        self._outbound_bytes = 0
+        print(f"[WS] ! Cliente lento desconectado | user_id={getattr(self, 'user_id', None)} | event_id={getattr(self, 'event_id', None)}")
+        self.close(code=1013, reason="slow_consumer")
+
+    def _pump_outbound(self):
+        if self._writing:
+            return
+        if not self._outbound:
+            if self._close_after_flush is not None:
+                code, reason = self._close_after_flush
+                self._close_after_flush = None
+                self.close(code=code, reason=reason)
+            return
+        conn = self.ws_connection
+        if conn is None or conn.is_closing():
+            self._outbound.clear()
+            self._outbound_bytes = 0
+            return
+
+        framed = self._outbound.popleft()
+        self._outbound_bytes -= len(framed.data)
+        try:
+            future = self._write_now(conn, framed)
+        except tornado.websocket.WebSocketClosedError:
+            return
+        self._writing = True
+        future.add_done_callback(self._on_outbound_written)
+
+    def _on_outbound_written(self, future):
+        self._writing = False
+        if not future.cancelled() and future.exception() is not None:
+            # The socket dropped mid-write; on_close handles cleanup.
+            return
+        self._pump_outbound()
+
+    def _write_now(self, conn, framed):
+        # Reuse the payload's pre-built frame on plain server-side connections.
+        if not self._shared_frames or conn.mask_outgoing or conn.stream is None:
+            return self.write_message(framed.text)
+        try:
+            return conn.stream.write(framed.frame())
+        except tornado.iostream.StreamClosedError:
+            raise tornado.websocket.WebSocketClosedError()
+
+    async def open(self):
         # Redis session-backed auth
         s_cookie = self.get_secure_cookie("session_id")
         if not s_cookie:
@@ -119,24 +700,90 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
             return
 
         self.session_id = s_cookie.decode()
-        session = session_service.get_session(self.session_id)
+        requested_role = self.get_query_argument("role", "viewer")
+
+        # Fast path: the page handler already authorized this user/role/event
+        # and signed it into the URL, so no Redis/MySQL round trip is needed.
+        if self._accept_ticket(requested_role):
+            if not await self._ticket_still_valid():
+                return
+        elif not await self._authorize_from_session(requested_role):
+            return
+        self.lease_until = time.monotonic() + _lease_span()
+
+        # The client may have gone away while we were waiting on the DB;
+        # registering it now would leave a dead socket in the index.
+        if self.ws_connection is None or self.ws_connection.is_closing():
+            return
+
+        _register_client(self)
+
+        # Attendance panels start from a full snapshot, then apply deltas.
+        if self.role in ("moderator", "reports"):
+            await self.send_sessions_snapshot()
+        
+        # Track session analytics only for viewers
+        if self.role == "viewer":
+            await run_blocking(analytics_service.ensure_session_analytics, self.user_id, event_id=self.event_id)
+        
+        # Push update to everyone interested (moderators/reports)
+        schedule_reports_snapshot(event_id=self.event_id)
+        
+        print(f"[WS] OK: Conectado: {self.role} | user_id={self.user_id} | event_id={self.event_id}")
+
+    def _accept_ticket(self, requested_role):
+        ticket = ticket_service.verify_ws_ticket(self.get_query_argument("ticket", None))
+        if not ticket or ticket.get("sid") != self.session_id or ticket.get("role") != requested_role:
+            return False
+        arg_event = self.get_query_argument("event_id", default=None)
+        if arg_event and str(ticket.get("eid")) != arg_event:
+            return False
+
+        self.user_id = ticket.get("uid")
+        self.user_name = ticket.get("name") or "Guest"
+        self.role = ticket["role"]
+        self.event_id = ticket.get("eid")
+        self.event_timezone = ticket.get("tz")
+        self._ticket_exp = ticket.get("exp", 0)
+        return self.user_id is not None
+
+    async def _ticket_still_valid(self):
+        # A ticket can outlive a ban or a removed staff role. Staff sockets are
+        # few, so they are re-checked now; viewers only against cached flags
+        # (the lease sweep re-checks everyone within WS_LEASE_CHECK_MS).
+        if users_service.get_cached_flag(self.user_id, "banned"):
+            reason = "banned"
+        elif self.role == "viewer":
+            return True
+        else:
+            key = (self.user_id, self.role, self.event_id)
+            try:
+                reason = (await run_blocking(_revoked_sockets, {key})).get(key)
+            except Exception as e:
+                print(f"[WS] ! could not re-check ticket role: {e}")
+                return await self._authorize_from_session(self.role)
+        if not reason:
+            return True
+        print(f"[WS] ! Ticket rechazado ({reason}): {self.role} | user_id={self.user_id} | event_id={self.event_id}")
+        self.close(code=4003, reason=reason)
+        return False
+
+    async def _authorize_from_session(self, requested_role):
+        session = await run_blocking(session_service.get_session, self.session_id)
         if not session:
             print("[WS] ! Conexión rechazada: sesión expirada o inválida")
             self.close(code=4001, reason="session_expired")
-            return
+            return False
 
         self.user_id = session.get("user_id")
         if not self.user_id:
             self.close(code=4001, reason="session_invalid")
-            return
+            return False
 
         self.user_name = session.get("user_name") or "Guest"
 
-        requested_role = self.get_query_argument("role", "viewer")
         user_role = session.get("user_role") or "viewer"
 
-        is_superadmin = user_role == "superadmin"
-
         arg_event = self.get_query_argument("event_id", default=None)
         # Fallback: if client omitted event_id (or malformed), try the cookie set by BaseHandler.prepare
         try:
@@ -164,7 +811,9 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
         if self.event_id is not None:
             try:
                 from app.services import staff_service
-                staff_role = staff_service.get_event_role(int(self.user_id), int(self.event_id))
+                hit, staff_role = staff_service.get_cached_event_role(int(self.user_id), int(self.event_id))
+                if not hit:
+                    staff_role = await run_blocking(staff_service.get_event_role, int(self.user_id), int(self.event_id))
             except Exception:
                 staff_role = None
 
@@ -175,38 +824,20 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
 
         if requested_role == "viewer":
             self.role = "viewer"
-        elif requested_role == "moderator":
+        elif requested_role in ("moderator", "speaker", "reports"):
             if self.event_id is None:
                 self.close(code=4002, reason="event_missing")
-                return
-            # Allowed if superadmin, event-assigned staff, or per-event moderator account
-            if is_superadmin or staff_role in ["admin", "moderator"] or (user_role in ["moderator", "moderador"] and session_event_id == self.event_id):
-                self.role = "moderator"
+                return False
+            # Superadmin, event-assigned staff, or a per-event staff account of this event.
+            if _role_allowed(requested_role, user_role, staff_role, session_event_id == self.event_id):
+                self.role = requested_role
             else:
                 self.close(code=4003, reason="role_forbidden")
-                return
-        elif requested_role == "speaker":
-            if self.event_id is None:
-                self.close(code=4002, reason="event_missing")
-                return
-            if is_superadmin or staff_role in ["admin", "speaker"] or (user_role == "speaker" and session_event_id == self.event_id):
-                self.role = "speaker"
-            else:
-                self.close(code=4003, reason="role_forbidden")
-                return
-        elif requested_role == "reports":
-            if self.event_id is None:
-                self.close(code=4002, reason="event_missing")
-                return
-            if is_superadmin or staff_role == "admin":
-                self.role = "reports"
-            else:
-                self.close(code=4003, reason="role_forbidden")
-                return
+                return False
         else:
             print(f"[WS] ! Conexión rechazada: role inválido requested={requested_role}")
             self.close(code=4003, reason="role_forbidden")
-            return
+            return False
 
         # Keep accepting connections even if event_id is missing.
         # Audience counting also has an HTTP fallback on /api/ping.
@@ -214,39 +845,71 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
         self.event_timezone = None
         if self.event_id is not None:
             try:
-                event = events_service.get_event_by_id(self.event_id) or {}
+                event = await run_blocking(events_service.get_event_by_id, self.event_id) or {}
                 self.event_timezone = event.get("timezone")
             except Exception:
                 self.event_timezone = None
 
-        WEBSOCKET_CLIENTS.setdefault(self.role, set()).add(self)
-        
-        # Track session analytics only for viewers
-        if self.role == "viewer":
-            analytics_service.ensure_session_analytics(self.user_id, event_id=self.event_id)
-        
-        # Push update to everyone interested (moderators/reports)
-        push_reports_snapshot(event_id=self.event_id)
-        
-        print(f"[WS] OK: Conectado: {self.role} | user_id={self.user_id} | event_id={self.event_id}")
+        self._ticket_exp = 0
+        return True
+
+    def renew_ticket(self):
+        """Send a fresh ticket before the current one expires so reconnects stay on the fast path."""
+        if self._ticket_exp - time.time() > WS_TICKET_TTL / 2:
+            return
+        ticket = ticket_service.issue_ws_ticket(
+            self.session_id, self.user_id, self.user_name, self.role, self.event_id, self.event_timezone
+        )
+        self._ticket_exp = time.time() + WS_TICKET_TTL
+        self.write_framed(FramedPayload(json.dumps({"type": "ws_ticket", "ticket": ticket})))
+
+    async def send_sessions_snapshot(self):
+        # Goes through the outbound queue so it stays ordered with the deltas,
+        # and as a control message so a full queue never drops it.
+        try:
+            message = await _full_sessions_message(self.event_id)
+            self.write_framed(FramedPayload(json.dumps(message), control=True))
+        except Exception:
+            traceback.print_exc()
 
     def on_close(self):
-        WEBSOCKET_CLIENTS.get(self.role, set()).discard(self)
+        _unregister_client(self)
+        self._outbound.clear()
+        self._outbound_bytes = 0
         if getattr(self, "role", None) == "viewer" and getattr(self, "user_id", None) is not None:
-            analytics_service.mark_session_inactive(self.user_id)
-            push_reports_snapshot(event_id=self.event_id)
+            IOLoop.current().spawn_callback(self._on_viewer_left)
         print(f"[WS] OUT: Desconectado: {self.role} | user_id={self.user_id} | event_id={self.event_id}")
 
-    def on_message(self, message):
+    async def _on_viewer_left(self):
+        try:
+            await run_blocking(analytics_service.mark_session_inactive, self.user_id, event_id=self.event_id)
+        except Exception:
+            traceback.print_exc()
+        schedule_reports_snapshot(event_id=self.event_id)
+
+    async def _question_transition(self, transition, question_id, **kwargs):
+        # The event's queues live in memory; only the first touch reads MySQL.
+        if not questions_service.is_loaded(self.event_id):
+            await run_blocking(questions_service.ensure_loaded, self.event_id)
+        return transition(question_id, event_id=self.event_id, **kwargs)
+
+    async def on_message(self, message):
         try:
-            # Refresh/validate session on every WS message (5-min TTL safety).
+            # The lease sweep keeps the session validated (and its TTL refreshed);
+            # only check Redis here if the sweep hasn't confirmed it recently.
             # If the session was purged in Redis, drop the socket so the client re-auths.
-            if not getattr(self, "session_id", None) or not session_service.get_session(self.session_id):
-                try:
-                    self.close(code=4001, reason="session_expired")
-                except Exception:
-                    pass
-                return
+            if time.monotonic() > self.lease_until:
+                session_id = getattr(self, "session_id", None)
+                if not session_id or not (
+                    session_service.get_cached_session(session_id)
+                    or await run_blocking(session_service.get_session, session_id)
+                ):
+                    try:
+                        self.close(code=4001, reason="session_expired")
+                    except Exception:
+                        pass
+                    return
+                self.lease_until = time.monotonic() + _lease_span()
 
             try:
                 payload = json.loads(message)
@@ -254,17 +917,30 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                 return
 
             msg_type = payload.get("type")
-            print(f"[WS] {self.role} | Mensaje: {msg_type} | Payload: {payload}")
+            if WS_DEBUG:
+                print(f"[WS] {self.role} | Mensaje: {msg_type} | Payload: {payload}")
 
             if msg_type == "chat":
-                if users_service.is_chat_blocked(self.user_id):
-                    self.write_message(json.dumps({"type": "error", "message": "Tu acceso al chat ha sido restringido."}))
+                blocked = users_service.get_cached_flag(self.user_id, "chat_blocked")
+                if blocked is None:
+                    blocked = await run_blocking(users_service.is_chat_blocked, self.user_id)
+                if blocked:
+                    self.send_error("Tu acceso al chat ha sido restringido.")
                     return
                 text = payload.get("message", "").strip()
                 if not text:
                     return
-                chat_payload = chat_service.add_chat_message(self.user_id, text, event_id=self.event_id)
-                broadcast(
+                if len(text) > CHAT_MESSAGE_MAX_CHARS:
+                    self.send_error(f"El mensaje es demasiado largo (máximo {CHAT_MESSAGE_MAX_CHARS} caracteres).")
+                    return
+                # Queued for a batched write; the message goes out right away.
+                chat_payload = chat_service.add_chat_message(
+                    self.user_id, text, event_id=self.event_id, user_name=self.user_name
+                )
+                if chat_payload is None:
+                    self.send_error("El chat está saturado, intenta de nuevo en unos segundos.")
+                    return
+                broadcast_chat(
                     {
                         "type": "chat",
                         **chat_payload,
@@ -274,19 +950,25 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                 )
 
             elif msg_type == "ask":
-                if users_service.is_qa_blocked(self.user_id):
-                    self.write_message(json.dumps({"type": "error", "message": "Tu acceso a preguntas ha sido restringido."}))
+                blocked = users_service.get_cached_flag(self.user_id, "qa_blocked")
+                if blocked is None:
+                    blocked = await run_blocking(users_service.is_qa_blocked, self.user_id)
+                if blocked:
+                    self.send_error("Tu acceso a preguntas ha sido restringido.")
                     return
                 question = payload.get("question", "").strip()
                 manual_user = payload.get("manual_user", "").strip()
                 if not question:
                     return
 
-                question_payload = questions_service.add_question(
+                question_payload = await run_blocking(
+                    questions_service.add_question,
                     self.user_id,
                     question,
                     event_id=self.event_id,
                     manual_user_name=(manual_user or None),
+                    user_name=self.user_name,
+                    event_tz=self.event_timezone,
                 )
                 broadcast({"type": "pending_question", **question_payload}, roles={"moderator"}, event_id=self.event_id)
 
@@ -296,7 +978,9 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                     question_id = int(question_id)
                 except (TypeError, ValueError):
                     return
-                approved_payload = questions_service.approve_question(question_id)
+                approved_payload = await self._question_transition(
+                    questions_service.approve_question, question_id, event_tz=self.event_timezone
+                )
                 if approved_payload:
                     broadcast({"type": "approved_question", **approved_payload}, roles={"viewer", "speaker", "moderator"}, event_id=self.event_id)
 
@@ -306,7 +990,7 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                     question_id = int(question_id)
                 except (TypeError, ValueError):
                     return
-                questions_service.reject_question(question_id)
+                await self._question_transition(questions_service.reject_question, question_id)
                 broadcast({"type": "rejected_question", "id": question_id}, roles={"moderator"}, event_id=self.event_id)
 
             elif msg_type == "read" and self.role == "speaker":
@@ -315,7 +999,9 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                     question_id = int(question_id)
                 except (TypeError, ValueError):
                     return
-                read_payload = questions_service.mark_question_as_read(question_id)
+                read_payload = await self._question_transition(
+                    questions_service.mark_question_as_read, question_id, event_tz=self.event_timezone
+                )
                 if read_payload:
                     broadcast({"type": "question_read", **read_payload}, roles={"viewer", "speaker", "moderator"}, event_id=self.event_id)
 
@@ -325,16 +1011,21 @@ class LiveWebSocket(tornado.websocket.WebSocketHandler):
                     question_id = int(question_id)
                 except (TypeError, ValueError):
                     return
-                returned_payload = questions_service.return_question_to_pending(question_id)
+                returned_payload = await self._question_transition(
+                    questions_service.return_question_to_pending, question_id, event_tz=self.event_timezone
+                )
                 if returned_payload:
                     # Remove it from the "Approved/Speaker" view for everyone
                     broadcast({"type": "question_removed", "id": question_id}, roles={"viewer", "speaker", "moderator"}, event_id=self.event_id)
                     # Re-add it to the Moderator's "Pending" queue
                     broadcast({"type": "pending_question", **returned_payload}, roles={"moderator"}, event_id=self.event_id)
 
+            elif msg_type == "sessions_snapshot" and self.role in ("moderator", "reports"):
+                await self.send_sessions_snapshot()
+
             elif msg_type == "ping":
+                # Buffered; flush_heartbeats() writes it and refreshes the reports.
                 analytics_service.record_ping(self.user_id, event_id=self.event_id)
-                push_reports_snapshot(event_id=self.event_id)
 
         except Exception:
             traceback.print_exc()
@@ -0,0 +1,237 @@
+"""Versioned schema migrations and capability detection.
+
+`python migrate.py` applies MIGRATIONS in order and records each version in
+`schema_version`. Every step checks information_schema first, so running it
+against a database created from init.sql (which already has everything) only
+records the versions.
+
+At startup the server calls load_capabilities() once; services ask
+has_column() instead of catching "Unknown column" on every query.
+"""
+import threading
+import time
+
+from app.config import SCHEMA_RETRY_MAX_SECONDS, SCHEMA_RETRY_SECONDS
+from app.db import create_db_connection
+
+
+_SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "  version INT PRIMARY KEY, "
+    "  description VARCHAR(255) NOT NULL, "
+    "  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+    ")"
+)
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    return cursor.fetchone() is not None
+
+
+def _index_exists(cursor, table, index_name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, index_name),
+    )
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, definition):
+    # MySQL has no ADD COLUMN IF NOT EXISTS.
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _add_index(cursor, table, index_name, columns):
+    if not _index_exists(cursor, table, index_name):
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})")
+
+
+def _questions_read_status(cursor):
+    # Antes vivía en fix_db.py.
+    cursor.execute(
+        "ALTER TABLE questions MODIFY COLUMN status "
+        "ENUM('pending', 'approved', 'rejected', 'read') NOT NULL DEFAULT 'pending'"
+    )
+
+
+def _event_columns(cursor):
+    _add_column(cursor, "events", "description", "TEXT")
+    _add_column(cursor, "events", "header_bg_color", "VARCHAR(50)")
+    _add_column(cursor, "events", "header_text_color", "VARCHAR(50)")
+    _add_column(cursor, "events", "timezone", "VARCHAR(50) DEFAULT 'America/Mexico_City'")
+
+
+# Secondary indexes for the hot per-event filters.
+PERFORMANCE_INDEXES = (
+    ("chat_messages", "idx_chat_event_id", "event_id, id"),
+    ("questions", "idx_questions_event_status_created", "event_id, status, created_at"),
+    ("session_analytics", "idx_analytics_event_ping", "event_id, last_ping"),
+    ("users", "idx_users_event_role", "event_id, role"),
+)
+
+
+def _performance_indexes(cursor):
+    for table, index_name, columns in PERFORMANCE_INDEXES:
+        _add_index(cursor, table, index_name, columns)
+
+
+def _data_revisions(cursor):
+    # Counters bumped by writes that change what exports show without
+    # changing their per-event counts (user edits, staff changes).
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS data_revisions ("
+        "  name VARCHAR(32) PRIMARY KEY, "
+        "  revision BIGINT NOT NULL DEFAULT 0"
+        ")"
+    )
+
+
+# (version, description, step). Append only; never renumber.
+MIGRATIONS = (
+    (1, "questions.status accepts 'read'", _questions_read_status),
+    (2, "events description/header colors/timezone columns", _event_columns),
+    (3, "per-event indexes for chat, questions, analytics and users", _performance_indexes),
+    (4, "data_revisions counters for export versions", _data_revisions),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(cursor):
+    cursor.execute(_SCHEMA_VERSION_DDL)
+    cursor.execute("SELECT version FROM schema_version")
+    return {int(row["version"]) for row in cursor.fetchall()}
+
+
+def apply_migrations():
+    """Apply every pending migration in order. Returns the versions applied."""
+    applied = []
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            done = applied_versions(cursor)
+            for version, description, step in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"[SCHEMA] applying {version}: {description}")
+                step(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description),
+                )
+                conn.commit()
+                applied.append(version)
+    return applied
+
+
+# Hot queries and the table whose access must use an index. EXPLAIN on each
+# must not show a full scan ("ALL") of that table without any usable key.
+HOT_QUERIES = (
+    (
+        "recent chat",
+        "SELECT cm.id FROM chat_messages cm WHERE cm.event_id = %s ORDER BY cm.id DESC LIMIT 100",
+        "cm",
+    ),
+    (
+        "question queues",
+        "SELECT q.id FROM questions q "
+        "WHERE q.event_id <=> %s AND q.status IN ('pending', 'approved', 'read') ORDER BY q.id ASC",
+        "q",
+    ),
+    (
+        "live sessions",
+        "SELECT sa.user_id FROM session_analytics sa "
+        "WHERE sa.event_id = %s AND sa.last_ping >= DATE_SUB(NOW(), INTERVAL 90 SECOND)",
+        "sa",
+    ),
+    (
+        "registered viewers",
+        "SELECT id FROM users WHERE event_id = %s AND role = 'viewer'",
+        "users",
+    ),
+)
+
+
+def explain_hot_queries(event_id=1):
+    """EXPLAIN every hot query. Returns the failures as a list of strings.
+
+    A query fails whenever its table is scanned, also when a usable key
+    exists and the optimizer still picked the scan (stale statistics or a
+    near-empty table: check against production-sized data).
+    """
+    failures = []
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for name, sql, table in HOT_QUERIES:
+                cursor.execute("EXPLAIN " + sql, (event_id,))
+                for row in cursor.fetchall():
+                    if row.get("table") != table or row.get("type") != "ALL":
+                        continue
+                    if row.get("possible_keys"):
+                        failures.append(f"{name}: full scan of {table} although {row['possible_keys']} is usable")
+                    else:
+                        failures.append(f"{name}: full scan of {table} (no usable index)")
+    return failures
+
+
+# table -> set(column names), filled once by load_capabilities().
+_COLUMNS = {}
+_CAPS_LOCK = threading.Lock()
+_CAPS = {"loaded": False, "version": None, "failures": 0, "retry_at": 0.0}
+
+
+def load_capabilities():
+    """Read the live schema once (columns per table, schema version)."""
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+            )
+            rows = cursor.fetchall()
+            version = None
+            if any(row["table_name"] == "schema_version" for row in rows):
+                cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+                version = (cursor.fetchone() or {}).get("version")
+
+    columns = {}
+    for row in rows:
+        columns.setdefault(row["table_name"], set()).add(row["column_name"])
+    with _CAPS_LOCK:
+        _COLUMNS.clear()
+        _COLUMNS.update(columns)
+        _CAPS["loaded"] = True
+        _CAPS["version"] = version
+        _CAPS["failures"] = 0
+
+    if version is None or version < LATEST_VERSION:
+        print(f"[SCHEMA] ! schema version {version}, latest is {LATEST_VERSION}: run `python migrate.py`")
+    else:
+        print(f"[SCHEMA] OK: schema version {version}")
+    return version
+
+
+def has_column(table, column):
+    """True if `table.column` exists. Assumes the full schema if it can't be read.
+
+    A failed read is not retried on every call, only once its backoff is over.
+    """
+    if not _CAPS["loaded"] and time.monotonic() >= _CAPS["retry_at"]:
+        try:
+            load_capabilities()
+        except Exception as e:
+            with _CAPS_LOCK:
+                _CAPS["failures"] += 1
+                delay = min(SCHEMA_RETRY_SECONDS * 2 ** (_CAPS["failures"] - 1), SCHEMA_RETRY_MAX_SECONDS)
+                _CAPS["retry_at"] = time.monotonic() + delay
+            print(f"[SCHEMA] ! could not read schema, retrying in {delay:.0f}s: {e}")
+    with _CAPS_LOCK:
+        if not _CAPS["loaded"]:
+            return True
+        return column in _COLUMNS.get(table, ())
@@ -1,22 +1,66 @@
+import threading
+from datetime import datetime, timezone
+
 from app.db import _normalize_timestamps, create_db_connection
+from app.services import presence_service
 
 
 # Active window for "connected" audience; bumped to be more tolerant of slow networks
 DEFAULT_ACTIVE_WINDOW_SECONDS = 600
 
+# Heartbeats waiting to be written: (event_id, user_id) -> {"first", "last", "pings"}
+# (times are naive UTC, like the DB session). flush_pings() writes them all
+# with one multi-row upsert, so a ping costs a dict update instead of a query.
+_PENDING_PINGS = {}
+_PINGS_LOCK = threading.Lock()
+# One flush at a time (swap, upsert, presence update).
+_FLUSH_LOCK = threading.Lock()
+# Users marked inactive since the running flush swapped its batch out (guarded
+# by _PINGS_LOCK, reset on every swap). The flush re-applies the inactive mark
+# for them after its upsert, so a batch taken before the close can't bring
+# last_ping back, and mark_session_inactive never waits for a flush's I/O.
+_CLOSED_DURING_FLUSH = set()
+
+_UPSERT_PINGS_SQL = (
+    "INSERT INTO session_analytics (user_id, event_id, start_time, last_ping, total_minutes) "
+    "VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE "
+    "last_ping = GREATEST(last_ping, VALUES(last_ping)), "
+    "total_minutes = total_minutes + VALUES(total_minutes)"
+)
+
+_MARK_INACTIVE_SQL = "UPDATE session_analytics SET last_ping=DATE_SUB(NOW(), INTERVAL 1 DAY) WHERE user_id=%s"
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
-def mark_session_inactive(user_id: int):
+
+def _upsert_rows(entries):
+    return [(uid, eid, e["first"], e["last"], e["pings"]) for (eid, uid), e in entries.items()]
+
+
+def mark_session_inactive(user_id: int, event_id: int = None):
     """Mark a user's session as inactive so it no longer appears as "connected".
 
     We don't have an explicit end_time column; instead we move last_ping far enough
     into the past so the active filter excludes it.
     """
+    # Write this user's buffered minutes first; a later flush must not bring
+    # last_ping back to "now" after the session was closed. A flush that
+    # already took this user's pings sees the user in _CLOSED_DURING_FLUSH and
+    # marks it inactive again once its upsert lands.
+    user_id = int(user_id)
+    with _PINGS_LOCK:
+        pending = {key: _PENDING_PINGS.pop(key) for key in list(_PENDING_PINGS) if key[1] == user_id}
+        _CLOSED_DURING_FLUSH.add(user_id)
+
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(
-                "UPDATE session_analytics SET last_ping=DATE_SUB(NOW(), INTERVAL 1 DAY) WHERE user_id=%s",
-                (user_id,),
-            )
+            if pending:
+                cursor.executemany(_UPSERT_PINGS_SQL, _upsert_rows(pending))
+            cursor.execute(_MARK_INACTIVE_SQL, (user_id,))
+    presence_service.leave(event_id, user_id)
 
 
 def ensure_session_analytics(user_id: int, event_id: int = None):
@@ -39,27 +83,93 @@ def ensure_session_analytics(user_id: int, event_id: int = None):
                     "INSERT INTO session_analytics (user_id, event_id, start_time, last_ping, total_minutes) VALUES (%s, %s, NOW(), NOW(), 0)",
                     (user_id, event_id),
                 )
+    with _PINGS_LOCK:
+        # Back online: a flush in flight must not mark it inactive again.
+        _CLOSED_DURING_FLUSH.discard(int(user_id))
+    presence_service.touch(event_id, user_id)
 
 def record_ping(user_id: int, event_id: int = None):
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            if event_id is None:
-                return
+    """Count one minute of viewing. Buffered in memory until flush_pings()."""
+    if event_id is None:
+        return
 
-            updated = cursor.execute(
-                "UPDATE session_analytics SET last_ping=NOW(), total_minutes=total_minutes+1 WHERE user_id=%s AND event_id=%s",
-                (user_id, event_id),
-            )
+    user_id, event_id = int(user_id), int(event_id)
+    now = _utcnow()
+    with _PINGS_LOCK:
+        entry = _PENDING_PINGS.get((event_id, user_id))
+        if entry is None:
+            _PENDING_PINGS[(event_id, user_id)] = {"first": now, "last": now, "pings": 1}
+        else:
+            entry["last"] = now
+            entry["pings"] += 1
+
+
+def flush_pings():
+    """Write all buffered heartbeats in one upsert. Returns the event ids touched."""
+    with _FLUSH_LOCK:
+        return _flush_pings_locked()
 
-            if updated == 0:
-                cursor.execute(
-                    "INSERT INTO session_analytics (user_id, event_id, start_time, last_ping, total_minutes) VALUES (%s, %s, NOW(), NOW(), 0)",
-                    (user_id, event_id),
-                )
-                cursor.execute(
-                    "UPDATE session_analytics SET last_ping=NOW(), total_minutes=total_minutes+1 WHERE user_id=%s AND event_id=%s",
-                    (user_id, event_id),
-                )
+
+def _flush_pings_locked():
+    global _PENDING_PINGS
+    with _PINGS_LOCK:
+        _CLOSED_DURING_FLUSH.clear()
+        if not _PENDING_PINGS:
+            return set()
+        pending, _PENDING_PINGS = _PENDING_PINGS, {}
+
+    try:
+        with create_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # PyMySQL turns this into a single multi-row INSERT ... ON DUPLICATE KEY UPDATE.
+                cursor.executemany(_UPSERT_PINGS_SQL, _upsert_rows(pending))
+                with _PINGS_LOCK:
+                    closed = {user_id for _, user_id in pending} & _CLOSED_DURING_FLUSH
+                if closed:
+                    # Closed while this batch was in flight: the upsert may
+                    # have landed after the inactive mark.
+                    cursor.executemany(_MARK_INACTIVE_SQL, [(user_id,) for user_id in sorted(closed)])
+    except Exception as e:
+        # Merge back so the minutes are retried on the next flush (not for
+        # sessions closed meanwhile: that write would revive them).
+        with _PINGS_LOCK:
+            for key, entry in pending.items():
+                if key[1] in _CLOSED_DURING_FLUSH:
+                    continue
+                current = _PENDING_PINGS.get(key)
+                if current is None:
+                    _PENDING_PINGS[key] = entry
+                else:
+                    current["first"] = min(current["first"], entry["first"])
+                    current["last"] = max(current["last"], entry["last"])
+                    current["pings"] += entry["pings"]
+        print(f"[ANALYTICS] ! ping flush of {len(pending)} viewers failed, will retry: {e}")
+        return set()
+
+    with _PINGS_LOCK:
+        closed = {user_id for _, user_id in pending} & _CLOSED_DURING_FLUSH
+    heartbeats = {}
+    for (event_id, user_id), entry in pending.items():
+        if user_id in closed:
+            continue
+        heartbeats.setdefault(event_id, {})[user_id] = entry["last"].replace(tzinfo=timezone.utc).timestamp()
+    try:
+        if heartbeats:
+            presence_service.touch_many(heartbeats, active_within_seconds=DEFAULT_ACTIVE_WINDOW_SECONDS)
+        # A close that raced the touch above may have left presence first.
+        with _PINGS_LOCK:
+            late = [key for key in pending if key[1] in _CLOSED_DURING_FLUSH and key[1] not in closed]
+        for event_id, user_id in late:
+            presence_service.leave(event_id, user_id)
+    except Exception as e:
+        print(f"[ANALYTICS] ! presence update failed: {e}")
+
+    return {event_id for event_id, _ in pending}
+
+
+def pending_ping_count():
+    with _PINGS_LOCK:
+        return len(_PENDING_PINGS)
 
 
 def list_users_for_report():
@@ -89,6 +199,13 @@ def list_active_sessions_for_report(active_within_seconds: int = DEFAULT_ACTIVE_
     if active_within_seconds <= 0:
         active_within_seconds = DEFAULT_ACTIVE_WINDOW_SECONDS
 
+    # Who is live comes from the presence index; MySQL only supplies the
+    # per-user details for those ids (primary-key lookups).
+    if event_id:
+        live_ids = presence_service.live_user_ids(event_id, active_within_seconds)
+        if live_ids is not None:
+            return _sessions_for_users(event_id, live_ids)
+
     # NOTE: MySQL does not reliably allow binding the INTERVAL value as a parameter,
     # so we safely inline this integer after coercion.
     query = (
@@ -129,6 +246,72 @@ def list_active_sessions_for_report(active_within_seconds: int = DEFAULT_ACTIVE_
     return [_normalize_timestamps(row) for row in rows]
 
 
+def _sessions_for_users(event_id: int, user_ids):
+    """Report rows for the given live user ids, in the presence order (most recent first)."""
+    if not user_ids:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    query = (
+        "SELECT "
+        "  sa.user_id, "
+        "  u.name AS user_name, "
+        "  u.chat_blocked, "
+        "  u.qa_blocked, "
+        "  u.banned, "
+        "  sa.start_time, "
+        "  sa.last_ping, "
+        "  sa.total_minutes AS session_minutes, "
+        "  e.timezone AS timezone "
+        "FROM session_analytics sa "
+        "JOIN users u ON u.id = sa.user_id "
+        "LEFT JOIN events e ON e.id = sa.event_id "
+        f"WHERE sa.event_id = %s AND sa.user_id IN ({placeholders})"
+    )
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (event_id, *user_ids))
+            rows = {row["user_id"]: row for row in cursor.fetchall()}
+
+    return [_normalize_timestamps(rows[uid]) for uid in user_ids if uid in rows]
+
+
+def count_live_viewers(event_id: int, active_within_seconds: int = DEFAULT_ACTIVE_WINDOW_SECONDS):
+    """Live audience size: a ZCOUNT on the presence index, SQL only as fallback."""
+    count = presence_service.count_live(event_id, active_within_seconds)
+    if count is not None:
+        return count
+    return len(list_active_sessions_for_report(active_within_seconds, event_id=event_id))
+
+
+def get_report_metrics(event_id: int, active_within_seconds: int = DEFAULT_ACTIVE_WINDOW_SECONDS):
+    """Headline numbers for the reports page: aggregates only, no per-user rows.
+
+    Same audience rules as list_registered_users / list_all_participants_for_report
+    (viewers, minus the event's staff); both sides use the per-event indexes.
+    """
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT "
+                "  (SELECT COUNT(*) FROM users "
+                "   WHERE event_id = %s AND role = 'viewer' "
+                "   AND id NOT IN (SELECT user_id FROM event_staff WHERE event_id = %s)) AS registered, "
+                "  (SELECT COALESCE(SUM(sa.total_minutes), 0) FROM session_analytics sa "
+                "   JOIN users u ON u.id = sa.user_id "
+                "   WHERE sa.event_id = %s AND u.role = 'viewer' "
+                "   AND sa.user_id NOT IN (SELECT user_id FROM event_staff WHERE event_id = %s)) AS minutes",
+                (event_id, event_id, event_id, event_id),
+            )
+            row = cursor.fetchone() or {}
+
+    return {
+        "total_registered_users": int(row.get("registered") or 0),
+        "live_watchers_count": count_live_viewers(event_id, active_within_seconds),
+        "total_minutes_consumed": int(row.get("minutes") or 0),
+    }
+
+
 def list_all_participants_for_report(event_id: int = None):
     """Lists all participants for an event, even if inactive."""
     query = (
@@ -1,43 +1,289 @@
-from app.db import _normalize_timestamps, create_db_connection
+import collections
+import threading
+import time
+from datetime import datetime, timezone
+
+import pymysql
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from app.config import CHAT_FLUSH_INTERVAL_MS, CHAT_FLUSH_MAX_ROWS, CHAT_QUEUE_MAX, CHAT_RING_SIZE
+from app.db import _normalize_timestamps, create_db_connection, run_blocking
+
+
+# Write-behind queue. add_chat_message only enqueues (the caller broadcasts
+# right away); the writer started by start_chat_writer() drains it with
+# multi-row INSERTs. Rows stay in memory until the INSERT commits: a failed
+# flush puts them back at the head of the queue for the next attempt.
+_PENDING = collections.deque()
+_IN_FLIGHT = []
+_QUEUE_LOCK = threading.Lock()
+_FLUSH_LOCK = threading.Lock()
+_writer = {"io_loop": None, "flushing": False}
+
+CHAT_WRITE_STATS = {
+    "enqueued": 0,
+    "rejected": 0,
+    "flushes": 0,
+    "failed_flushes": 0,
+    "rows_written": 0,
+    "dropped_rows": 0,
+    "last_flush_rows": 0,
+    "max_flush_rows": 0,
+    "last_lag_ms": 0.0,
+    "max_lag_ms": 0.0,
+}
+
+# Recent history per event: event_id -> deque of rows (newest last), warmed
+# from MySQL on first read and then kept current by add_chat_message and by
+# chats relayed from other nodes. Guarded by _QUEUE_LOCK together with the
+# write queue, so a warm-up never misses or duplicates a queued message.
+_RECENT = {}
+
+# Display names by user id, so a chat message never waits on a users lookup.
+_USER_NAMES = {}
+
+
+def _history_row(user_id, user_name, message, created_at):
+    return {"user_name": user_name, "user_id": user_id, "message": message, "created_at": created_at}
+
+
+def _warm_recent(event_id):
+    # Holding the flush lock keeps rows from moving between "queued" and
+    # "written" while we read both sides.
+    with _FLUSH_LOCK:
+        with create_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT u.name AS user_name, cm.user_id, cm.message, cm.created_at "
+                    "FROM chat_messages cm "
+                    "JOIN users u ON u.id = cm.user_id "
+                    "WHERE cm.event_id = %s "
+                    "ORDER BY cm.id DESC LIMIT %s",
+                    (event_id, CHAT_RING_SIZE),
+                )
+                rows = list(reversed(cursor.fetchall()))
+
+        with _QUEUE_LOCK:
+            if event_id not in _RECENT:
+                # Messages already broadcast but not yet written are part of the history too.
+                rows.extend(
+                    _history_row(p["user_id"], p["user_name"], p["message"], p["created_at"])
+                    for p in _PENDING
+                    if p["event_id"] == event_id
+                )
+                _RECENT[event_id] = collections.deque(rows, maxlen=CHAT_RING_SIZE)
+            return list(_RECENT[event_id])
 
 
 def list_recent_chats(limit=25, event_id=None):
+    if event_id:
+        with _QUEUE_LOCK:
+            recent = _RECENT.get(event_id)
+            rows = list(recent) if recent is not None else None
+        if rows is None:
+            rows = _warm_recent(event_id)
+        return [_normalize_timestamps(row) for row in rows[-limit:]]
+
+    # Cross-event history (no event context): not cached.
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
-            sql = (
-                "SELECT "
-                "  u.name AS user_name, "
-                "  cm.user_id, "
-                "  cm.message, "
-                "  cm.created_at "
+            cursor.execute(
+                "SELECT u.name AS user_name, cm.user_id, cm.message, cm.created_at "
                 "FROM chat_messages cm "
-                "JOIN users u ON u.id = cm.user_id"
+                "JOIN users u ON u.id = cm.user_id "
+                "ORDER BY cm.id DESC LIMIT %s",
+                (limit,),
             )
-            params = []
-            if event_id:
-                sql += " WHERE cm.event_id = %s"
-                params.append(event_id)
-            sql += " ORDER BY cm.id DESC LIMIT %s"
-            params.append(limit)
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-    return [_normalize_timestamps(row) for row in reversed(rows)]
-
-
-def add_chat_message(user_id: int, text: str, event_id: int = None):
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO chat_messages (user_id, message, event_id) VALUES (%s, %s, %s)",
-                (user_id, text, event_id),
+            rows = list(reversed(cursor.fetchall()))
+    return [_normalize_timestamps(row) for row in rows]
+
+
+def remember_remote_chat(payload, event_id):
+    """Add a chat accepted by another node to this node's history."""
+    with _QUEUE_LOCK:
+        recent = _RECENT.get(event_id)
+        if recent is not None:
+            recent.append(
+                _history_row(
+                    payload.get("user_id"),
+                    payload.get("user"),
+                    payload.get("message"),
+                    datetime.now(timezone.utc).replace(tzinfo=None),
+                )
             )
 
+
+def _lookup_user_name(user_id):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
             cursor.execute("SELECT name FROM users WHERE id=%s", (user_id,))
             user = cursor.fetchone() or {}
-            user_name = user.get("name") or "Visitante"
+    return user.get("name") or "Visitante"
+
+
+def add_chat_message(user_id: int, text: str, event_id: int = None, user_name: str = None):
+    """
+    Queue a chat message for persistence and return the broadcast payload.
+
+    Pass `user_name` (the socket already knows it) to avoid any I/O. Returns
+    None when the write queue is full: the caller should tell the user to retry.
+    """
+    if user_name:
+        _USER_NAMES[user_id] = user_name
+    else:
+        user_name = _USER_NAMES.get(user_id)
+        if user_name is None:
+            user_name = _USER_NAMES[user_id] = _lookup_user_name(user_id)
+
+    # Naive UTC, like the DB session (time_zone = '+00:00').
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    with _QUEUE_LOCK:
+        if len(_PENDING) >= CHAT_QUEUE_MAX:
+            CHAT_WRITE_STATS["rejected"] += 1
+            return None
+        _PENDING.append(
+            {
+                "user_id": user_id,
+                "user_name": user_name,
+                "message": text,
+                "event_id": event_id,
+                "created_at": created_at,
+                "queued_at": time.monotonic(),
+            }
+        )
+        recent = _RECENT.get(event_id)
+        if recent is not None:
+            recent.append(_history_row(user_id, user_name, text, created_at))
+        CHAT_WRITE_STATS["enqueued"] += 1
+        backlog = len(_PENDING)
+
+    if backlog >= CHAT_FLUSH_MAX_ROWS and _writer["io_loop"] is not None:
+        _writer["io_loop"].add_callback(_flush_soon)
+
     # Return a simple payload for broadcast
     return {
         "user_id": user_id,
         "user": user_name,
         "message": text,
     }
+
+
+_INSERT_SQL = "INSERT INTO chat_messages (user_id, message, event_id, created_at) VALUES (%s, %s, %s, %s)"
+
+
+def _insert_params(row):
+    return (row["user_id"], row["message"], row["event_id"], row["created_at"])
+
+
+def _requeue_in_flight():
+    with _QUEUE_LOCK:
+        _PENDING.extendleft(reversed(_IN_FLIGHT))
+        _IN_FLIGHT.clear()
+
+
+def _insert_one_by_one(batch):
+    """Insert rows individually, dropping (and logging) the ones MySQL rejects.
+
+    Connection errors propagate; rows already handled have left _IN_FLIGHT,
+    so only the rest goes back to the queue. Returns the rows written.
+    """
+    written = 0
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for row in batch:
+                try:
+                    cursor.execute(_INSERT_SQL, _insert_params(row))
+                    written += 1
+                except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+                    raise
+                except Exception as e:
+                    CHAT_WRITE_STATS["dropped_rows"] += 1
+                    print(
+                        f"[CHAT] ! dropped message from user_id={row['user_id']} "
+                        f"event_id={row['event_id']}: {e}"
+                    )
+                with _QUEUE_LOCK:
+                    _IN_FLIGHT.pop(0)
+    return written
+
+
+def flush_pending_chats(max_rows=None):
+    """Write queued messages to MySQL (blocking). Returns the number of rows written."""
+    with _FLUSH_LOCK:
+        with _QUEUE_LOCK:
+            take = min(len(_PENDING), max_rows or len(_PENDING))
+            _IN_FLIGHT.extend(_PENDING.popleft() for _ in range(take))
+            batch = list(_IN_FLIGHT)
+        if not batch:
+            return 0
+
+        try:
+            with create_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    # PyMySQL turns executemany on INSERT ... VALUES into one multi-row INSERT.
+                    cursor.executemany(_INSERT_SQL, [_insert_params(row) for row in batch])
+            written = len(batch)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            # MySQL unreachable: keep the rows, in order, for the next flush.
+            _requeue_in_flight()
+            CHAT_WRITE_STATS["failed_flushes"] += 1
+            print(f"[CHAT] ! flush of {len(batch)} messages failed, will retry: {e}")
+            return 0
+        except Exception as e:
+            # A row MySQL will never accept (too long, user deleted...) must
+            # not hold back the rest: write them one by one and drop the bad ones.
+            print(f"[CHAT] ! batch of {len(batch)} messages rejected ({e}), writing them one by one")
+            try:
+                written = _insert_one_by_one(batch)
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                _requeue_in_flight()
+                CHAT_WRITE_STATS["failed_flushes"] += 1
+                print(f"[CHAT] ! flush failed, will retry the remaining messages: {e}")
+                return 0
+
+        with _QUEUE_LOCK:
+            _IN_FLIGHT.clear()
+
+    lag_ms = (time.monotonic() - batch[0]["queued_at"]) * 1000
+    CHAT_WRITE_STATS["flushes"] += 1
+    CHAT_WRITE_STATS["rows_written"] += written
+    CHAT_WRITE_STATS["last_flush_rows"] = len(batch)
+    CHAT_WRITE_STATS["max_flush_rows"] = max(CHAT_WRITE_STATS["max_flush_rows"], len(batch))
+    CHAT_WRITE_STATS["last_lag_ms"] = round(lag_ms, 1)
+    CHAT_WRITE_STATS["max_lag_ms"] = max(CHAT_WRITE_STATS["max_lag_ms"], round(lag_ms, 1))
+    return len(batch)
+
+
+async def _flush_soon():
+    if _writer["flushing"]:
+        return
+    _writer["flushing"] = True
+    try:
+        while _PENDING:
+            if not await run_blocking(flush_pending_chats, CHAT_FLUSH_MAX_ROWS):
+                break
+    finally:
+        _writer["flushing"] = False
+
+
+def start_chat_writer(io_loop=None):
+    """Start the periodic flusher on the IOLoop (idempotent)."""
+    if _writer["io_loop"] is not None:
+        return
+    _writer["io_loop"] = io_loop or IOLoop.current()
+    PeriodicCallback(_flush_soon, CHAT_FLUSH_INTERVAL_MS).start()
+
+
+async def drain_chat_queue():
+    """Flush everything still queued (graceful shutdown)."""
+    while _PENDING:
+        if not await run_blocking(flush_pending_chats):
+            break
+
+
+def get_chat_write_stats():
+    with _QUEUE_LOCK:
+        pending = len(_PENDING) + len(_IN_FLIGHT)
+        oldest = _IN_FLIGHT[0] if _IN_FLIGHT else (_PENDING[0] if _PENDING else None)
+    lag_ms = round((time.monotonic() - oldest["queued_at"]) * 1000, 1) if oldest else 0.0
+    return {**CHAT_WRITE_STATS, "pending": pending, "current_lag_ms": lag_ms}
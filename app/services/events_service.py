@@ -1,12 +1,33 @@
+import threading
+import time
+
+from app import schema
+from app.config import EVENTS_CACHE_TTL
 from app.db import create_db_connection, _normalize_timestamps
+from app.services import pubsub_service
+
+
+INVALIDATE_CHANNEL = "events:invalidate"
+
+# event_id -> (event or None, fetched_at); slug -> (event_id or None, fetched_at).
+# None entries remember misses so unknown slugs don't hit MySQL every time.
+_EVENTS_BY_ID = {}
+_EVENT_IDS_BY_SLUG = {}
+_CACHE_LOCK = threading.Lock()
 
+# Columns older databases may lack (see app/schema.py, migration 2). Which
+# ones exist is read once at startup; missing ones select as NULL.
+_OPTIONAL_EVENT_COLUMNS = ("description", "header_bg_color", "header_text_color", "timezone")
 
-def _supports_header_fields(error: Exception) -> bool:
-    # PyMySQL raises ProgrammingError for unknown columns.
-    msg = str(error)
-    return "Unknown column" in msg and (
-        "header_bg_color" in msg or "header_text_color" in msg
-    )
+
+def _present_optional_columns():
+    return [col for col in _OPTIONAL_EVENT_COLUMNS if schema.has_column("events", col)]
+
+
+def _select_columns(*extra):
+    present = _present_optional_columns()
+    optional = [col if col in present else f"NULL AS {col}" for col in _OPTIONAL_EVENT_COLUMNS]
+    return ", ".join(["id", "slug", "title", "logo_url", "video_url", "is_active", *extra, *optional])
 
 
 def create_event(
@@ -19,64 +40,105 @@ def create_event(
     header_text_color=None,
     timezone="America/Mexico_City",
 ):
+    values = {"slug": slug, "title": title, "logo_url": logo_url, "video_url": video_url}
+    optional = {
+        "description": description,
+        "header_bg_color": header_bg_color,
+        "header_text_color": header_text_color,
+        "timezone": timezone,
+    }
+    values.update({col: optional[col] for col in _present_optional_columns()})
+
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
-            try:
-                cursor.execute(
-                    "INSERT INTO events (slug, title, description, logo_url, video_url, header_bg_color, header_text_color, timezone) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                    (slug, title, description, logo_url, video_url, header_bg_color, header_text_color, timezone),
-                )
-            except Exception as e:
-                # Fallback logic tailored for common missing column errors
-                msg = str(e)
-                if "Unknown column" in msg:
-                    # Try inserting without new columns
-                    try:
-                        cursor.execute(
-                            "INSERT INTO events (slug, title, logo_url, video_url) VALUES (%s, %s, %s, %s)",
-                            (slug, title, logo_url, video_url),
-                        )
-                    except Exception:
-                         raise
-                else:
-                    raise
+            cursor.execute(
+                f"INSERT INTO events ({', '.join(values)}) VALUES ({', '.join(['%s'] * len(values))})",
+                tuple(values.values()),
+            )
             conn.commit()
-            return cursor.lastrowid
+            event_id = cursor.lastrowid
+    invalidate_event(event_id, slug)
+    return event_id
 
 
-def get_event_by_slug(slug):
+def invalidate_event(event_id=None, slug=None, publish=True):
+    """Drop an event from this process's cache (and, by default, every other's)."""
+    with _CACHE_LOCK:
+        if event_id is not None:
+            cached = _EVENTS_BY_ID.pop(_safe_event_id(event_id), None)
+            if cached and cached[0]:
+                _EVENT_IDS_BY_SLUG.pop(cached[0].get("slug"), None)
+        if slug is not None:
+            _EVENT_IDS_BY_SLUG.pop(slug, None)
+    if publish:
+        pubsub_service.publish(INVALIDATE_CHANNEL, {"event_id": event_id, "slug": slug})
+
+
+def _on_remote_invalidate(channel, data):
+    data = data or {}
+    invalidate_event(data.get("event_id"), data.get("slug"), publish=False)
+
+
+pubsub_service.subscribe(INVALIDATE_CHANNEL, _on_remote_invalidate)
+
+
+def _safe_event_id(event_id):
+    try:
+        return int(event_id)
+    except (TypeError, ValueError):
+        return event_id
+
+
+def _fresh(entry):
+    return entry is not None and time.monotonic() - entry[1] <= EVENTS_CACHE_TTL
+
+
+def _select_event(where_sql, value):
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
-            try:
-                cursor.execute(
-                    "SELECT id, slug, title, description, logo_url, video_url, header_bg_color, header_text_color, is_active, timezone FROM events WHERE slug = %s",
-                    (slug,),
-                )
-            except Exception:
-                 # Fallback if description or colors missing
-                 cursor.execute(
-                    "SELECT id, slug, title, logo_url, video_url, header_bg_color, header_text_color, is_active, timezone FROM events WHERE slug = %s",
-                    (slug,),
-                )
+            cursor.execute(f"SELECT {_select_columns()} FROM events WHERE {where_sql}", (value,))
             row = cursor.fetchone()
             return _normalize_timestamps(row) if row else None
 
 
+def _remember(event, slug=None, event_id=None):
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        if event:
+            _EVENTS_BY_ID[event["id"]] = (event, now)
+            _EVENT_IDS_BY_SLUG[event["slug"]] = (event["id"], now)
+        else:
+            if event_id is not None:
+                _EVENTS_BY_ID[event_id] = (None, now)
+            if slug is not None:
+                _EVENT_IDS_BY_SLUG[slug] = (None, now)
+
+
+def get_event_by_slug(slug):
+    with _CACHE_LOCK:
+        slug_entry = _EVENT_IDS_BY_SLUG.get(slug)
+        id_entry = _EVENTS_BY_ID.get(slug_entry[0]) if slug_entry and slug_entry[0] is not None else None
+    if _fresh(slug_entry):
+        if slug_entry[0] is None:
+            return None
+        if _fresh(id_entry) and id_entry[0]:
+            return dict(id_entry[0])
+
+    event = _select_event("slug = %s", slug)
+    _remember(event, slug=slug)
+    return dict(event) if event else None
+
+
 def get_event_by_id(event_id):
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            try:
-                cursor.execute(
-                    "SELECT id, slug, title, description, logo_url, video_url, header_bg_color, header_text_color, is_active, timezone FROM events WHERE id = %s",
-                    (event_id,),
-                )
-            except Exception:
-                cursor.execute(
-                    "SELECT id, slug, title, logo_url, video_url, header_bg_color, header_text_color, is_active, timezone FROM events WHERE id = %s",
-                    (event_id,),
-                )
-            row = cursor.fetchone()
-            return _normalize_timestamps(row) if row else None
+    event_id = _safe_event_id(event_id)
+    with _CACHE_LOCK:
+        entry = _EVENTS_BY_ID.get(event_id)
+    if _fresh(entry):
+        return dict(entry[0]) if entry[0] else None
+
+    event = _select_event("id = %s", event_id)
+    _remember(event, event_id=event_id)
+    return dict(event) if event else None
 
 
 def list_events(event_ids=None):
@@ -90,21 +152,10 @@ def list_events(event_ids=None):
                     placeholders = ",".join(["%s"] * len(event_ids))
                     where_sql = f" WHERE id IN ({placeholders}) "
                     params.extend(event_ids)
-            try:
-                cursor.execute(
-                    "SELECT id, slug, title, description, logo_url, video_url, header_bg_color, header_text_color, is_active, created_at, timezone FROM events"
-                    + where_sql
-                    + " ORDER BY created_at DESC",
-                    params,
-                )
-            except Exception:
-                # Fallback for missing description
-                cursor.execute(
-                    "SELECT id, slug, title, logo_url, video_url, header_bg_color, header_text_color, is_active, created_at, timezone FROM events"
-                    + where_sql
-                    + " ORDER BY created_at DESC",
-                    params,
-                )
+            cursor.execute(
+                f"SELECT {_select_columns('created_at')} FROM events" + where_sql + " ORDER BY created_at DESC",
+                params,
+            )
             rows = cursor.fetchall()
             return [_normalize_timestamps(row) for row in rows]
 
@@ -120,31 +171,21 @@ def update_event(
     header_text_color=None,
     timezone="America/Mexico_City",
 ):
+    values = {"title": title, "logo_url": logo_url, "video_url": video_url, "is_active": 1 if is_active else 0}
+    optional = {
+        "description": description,
+        "header_bg_color": header_bg_color,
+        "header_text_color": header_text_color,
+        "timezone": timezone,
+    }
+    values.update({col: optional[col] for col in _present_optional_columns()})
+
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
-            try:
-                cursor.execute(
-                    "UPDATE events SET title=%s, description=%s, logo_url=%s, video_url=%s, header_bg_color=%s, header_text_color=%s, is_active=%s, timezone=%s WHERE id=%s",
-                    (
-                        title,
-                        description,
-                        logo_url,
-                        video_url,
-                        header_bg_color,
-                        header_text_color,
-                        1 if is_active else 0,
-                        timezone,
-                        event_id,
-                    ),
-                )
-            except Exception as e:
-                # Fallback
-                if "Unknown column" in str(e):
-                    cursor.execute(
-                        "UPDATE events SET title=%s, logo_url=%s, video_url=%s, is_active=%s WHERE id=%s",
-                        (title, logo_url, video_url, 1 if is_active else 0, event_id),
-                    )
-                else:
-                    raise
+            cursor.execute(
+                f"UPDATE events SET {', '.join(f'{col}=%s' for col in values)} WHERE id=%s",
+                (*values.values(), event_id),
+            )
             conn.commit()
-            return True
+    invalidate_event(event_id)
+    return True
@@ -0,0 +1,389 @@
+import asyncio
+import csv
+import glob
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pymysql.cursors import SSDictCursor
+
+from app import schema
+from app.config import EXPORT_CACHE_DIR, EXPORT_CHUNK_ROWS, EXPORT_WORKERS
+from app.db import _normalize_timestamps, _open_raw_connection, create_db_connection, now_in_timezone
+
+
+# kind -> (title, columns, query). Every query takes the event id once per %s
+# and is read with an unbuffered cursor, so rows arrive as they are written.
+EXPORT_KINDS = {
+    "active_sessions": (
+        "Sesiones activas",
+        ("user_id", "user_name", "start_time", "last_ping", "session_minutes", "session_seconds"),
+        "SELECT "
+        "  sa.user_id, "
+        "  u.name AS user_name, "
+        "  sa.start_time, "
+        "  sa.last_ping, "
+        "  sa.total_minutes AS session_minutes, "
+        "  NULL AS session_seconds "
+        "FROM session_analytics sa "
+        "JOIN users u ON u.id = sa.user_id "
+        "WHERE u.role = 'viewer' AND sa.event_id = %s "
+        "AND u.id NOT IN (SELECT user_id FROM event_staff WHERE event_id = %s) "
+        "ORDER BY sa.last_ping DESC",
+    ),
+    "registered_users": (
+        "Usuarios registrados",
+        ("user_id", "name", "email", "phone", "created_at"),
+        "SELECT id AS user_id, name, email, phone, created_at "
+        "FROM users "
+        "WHERE event_id = %s AND role = 'viewer' "
+        "AND id NOT IN (SELECT user_id FROM event_staff WHERE event_id = %s) "
+        "ORDER BY created_at DESC",
+    ),
+    "chat": (
+        "Chat",
+        ("created_at", "user_id", "user_name", "message"),
+        "SELECT cm.created_at, cm.user_id, u.name AS user_name, cm.message "
+        "FROM chat_messages cm "
+        "JOIN users u ON u.id = cm.user_id "
+        "WHERE cm.event_id = %s "
+        "ORDER BY cm.id ASC",
+    ),
+    "questions": (
+        "Preguntas",
+        ("question_id", "created_at", "status", "user_name", "question_text"),
+        "SELECT "
+        "  q.id AS question_id, "
+        "  q.created_at, "
+        "  q.status, "
+        "  COALESCE(q.manual_user_name, u.name) AS user_name, "
+        "  q.question_text "
+        "FROM questions q "
+        "JOIN users u ON u.id = q.user_id "
+        "WHERE q.event_id = %s "
+        "ORDER BY q.id ASC",
+    ),
+}
+
+
+EXPORT_FORMATS = ("csv", "xlsx", "pdf")
+
+_EXPORT_FILENAMES = {
+    "active_sessions": "reporte_sesiones_activas",
+    "registered_users": "reporte_usuarios_registrados",
+    "chat": "reporte_chat",
+    "questions": "reporte_preguntas",
+}
+
+_PDF_LABELS = {
+    "user_id": "User ID",
+    "user_name": "Nombre",
+    "name": "Nombre",
+    "start_time": "Inicio",
+    "last_ping": "Último ping",
+    "session_minutes": "Min",
+    "session_seconds": "Seg",
+    "created_at": "Fecha",
+    "question_id": "ID",
+    "status": "Estado",
+    "question_text": "Pregunta",
+    "message": "Mensaje",
+}
+
+# kind -> one indexed aggregate that changes when the event's own rows do.
+# Edits to the joined users/event_staff rows are covered by the 'users'
+# counter in data_revisions (see users_service.bump_users_revision).
+_VERSION_QUERIES = {
+    "active_sessions": (
+        "SELECT COUNT(*) AS n, MAX(last_ping) AS a, SUM(total_minutes) AS b "
+        "FROM session_analytics WHERE event_id = %s"
+    ),
+    "registered_users": "SELECT COUNT(*) AS n, MAX(id) AS a, MAX(created_at) AS b FROM users WHERE event_id = %s",
+    "chat": "SELECT COUNT(*) AS n, MAX(id) AS a, NULL AS b FROM chat_messages WHERE event_id = %s",
+    "questions": (
+        "SELECT COUNT(*) AS n, MAX(id) AS a, "
+        "CONCAT_WS('/', SUM(status = 'pending'), SUM(status = 'approved'), SUM(status = 'read')) AS b "
+        "FROM questions WHERE event_id = %s"
+    ),
+}
+
+
+def export_filename_base(kind):
+    return _EXPORT_FILENAMES[kind]
+
+
+def export_columns(kind):
+    return EXPORT_KINDS[kind][1]
+
+
+def export_title(kind):
+    return EXPORT_KINDS[kind][0]
+
+
+def iter_export_chunks(kind, event_id, event_tz=None, chunk_size=EXPORT_CHUNK_ROWS):
+    """Yield lists of row values (in export_columns order), chunk_size rows at a time.
+
+    Reads through its own connection, outside the pool: an unbuffered result
+    ties up the connection until the last row, and it is closed (not handed
+    back) when the generator finishes or is closed early.
+    """
+    _, columns, query = EXPORT_KINDS[kind]
+    params = (event_id,) * query.count("%s")
+
+    conn = _open_raw_connection()
+    try:
+        cursor = conn.cursor(SSDictCursor)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = []
+            for row in rows:
+                row = _normalize_timestamps({**row, "timezone": event_tz})
+                chunk.append([row.get(col) for col in columns])
+            yield chunk
+    finally:
+        # Closing the socket directly; cursor.close() would first read every
+        # remaining row of an abandoned result.
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def write_xlsx(path, kind, event_id, event_tz=None):
+    """Write the export to `path` as XLSX (blocking; run it off the IOLoop).
+
+    openpyxl's write-only mode streams each row to a temp XML part instead of
+    keeping a cell object per value, so memory stays at about one chunk.
+    Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(export_title(kind))
+    ws.append(list(export_columns(kind)))
+    written = 0
+    for chunk in iter_export_chunks(kind, event_id, event_tz):
+        for row in chunk:
+            ws.append(row)
+        written += len(chunk)
+    wb.save(path)
+    return written
+
+
+def write_csv(path, kind, event_id, event_tz=None):
+    # utf-8-sig: Excel on Windows often expects BOM for UTF-8 CSV.
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(export_columns(kind))
+        for chunk in iter_export_chunks(kind, event_id, event_tz):
+            writer.writerows(chunk)
+
+
+def write_pdf(path, kind, event_id, event_tz=None):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    styles = getSampleStyleSheet()
+
+    ts_human = now_in_timezone(event_tz).strftime("%Y-%m-%d %H:%M:%S")
+    elements = [
+        Paragraph(f"Reporte: {export_title(kind)}", styles["Title"]),
+        Paragraph(f"Generado: {ts_human}", styles["Normal"]),
+        Spacer(1, 12),
+    ]
+
+    table_data = [[_PDF_LABELS.get(col, col) for col in export_columns(kind)]]
+    for chunk in iter_export_chunks(kind, event_id, event_tz):
+        table_data.extend([str(value or "") for value in row] for row in chunk)
+
+    table = Table(table_data, repeatRows=1)
+    table.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e0f2fe")),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#0f172a")),
+                ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, -1), 9),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8fafc")]),
+            ]
+        )
+    )
+    elements.append(table)
+    doc.build(elements)
+
+
+_WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "pdf": write_pdf}
+
+
+def render_export(path, kind, export_format, event_id, event_tz=None, observed_at=None):
+    """Process-pool entry point: render into a temp name, then move it into place.
+
+    The file's mtime is set to `observed_at`, when its version was read, so
+    every process can tell which artifact holds the newer data.
+    """
+    partial = f"{path}.{os.getpid()}.part"
+    try:
+        _WRITERS[export_format](partial, kind, event_id, event_tz)
+        if observed_at is not None:
+            os.utime(partial, (observed_at, observed_at))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Export jobs. A job's id is its artifact file name, so any process sharing
+# EXPORT_CACHE_DIR can answer "done" for it, and identical requests (same
+# event, kind, format and data version) share one render.
+# ---------------------------------------------------------------------------
+
+_ARTIFACT_RE = re.compile(r"^(\d+)_([a-z_]+)_([0-9a-f]{12})\.(csv|xlsx|pdf)$")
+
+# job id -> {"id", "event_id", "kind", "format", "status", "error"}; only
+# touched on the IOLoop. Finished jobs leave; their file is the record.
+_JOBS = {}
+_RUNNING = {}
+_POOL = None
+
+
+def export_version(kind, event_id, event_tz=None):
+    """Short fingerprint of the data an export would contain (blocking)."""
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(_VERSION_QUERIES[kind], (event_id,))
+            row = cursor.fetchone() or {}
+            # Edits to users/staff don't move the counts above; they bump this.
+            revision = None
+            if schema.has_column("data_revisions", "revision"):
+                cursor.execute("SELECT revision FROM data_revisions WHERE name = 'users'")
+                revision = (cursor.fetchone() or {}).get("revision")
+    raw = f"{row.get('n')}|{row.get('a')}|{row.get('b')}|{revision}|{event_tz}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def artifact_name(event_id, kind, export_format, version):
+    return f"{int(event_id)}_{kind}_{version}.{export_format}"
+
+
+def parse_artifact_name(name):
+    """(event_id, kind, format) for a valid artifact name, else None."""
+    match = _ARTIFACT_RE.match(name or "")
+    if not match or match.group(2) not in EXPORT_KINDS:
+        return None
+    return int(match.group(1)), match.group(2), match.group(4)
+
+
+def artifact_path(name):
+    return os.path.join(EXPORT_CACHE_DIR, name)
+
+
+def _process_pool():
+    global _POOL
+    if _POOL is None:
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        # spawn, not fork: children must not inherit the pooled MySQL sockets,
+        # Redis clients or IOLoop of the web process.
+        _POOL = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _POOL
+
+
+def get_export_job(name):
+    parsed = parse_artifact_name(name)
+    if parsed is None:
+        return None
+    if os.path.exists(artifact_path(name)):
+        event_id, kind, export_format = parsed
+        return {"id": name, "event_id": event_id, "kind": kind, "format": export_format, "status": "done", "error": None}
+    job = _JOBS.get(name)
+    return dict(job) if job else None
+
+
+def start_export_job(event_id, kind, export_format, version, event_tz=None, observed_at=None):
+    """Return the job for this artifact, starting a render if needed. Call on the IOLoop.
+
+    `observed_at` is the time.time() taken before export_version() read the data.
+    """
+    name = artifact_name(event_id, kind, export_format, version)
+    job = get_export_job(name)
+    if job and job["status"] in ("done", "running"):
+        return job
+
+    job = {"id": name, "event_id": int(event_id), "kind": kind, "format": export_format, "status": "running", "error": None}
+    _JOBS[name] = job
+    future = asyncio.wrap_future(
+        _process_pool().submit(
+            render_export, artifact_path(name), kind, export_format, event_id, event_tz, observed_at or time.time()
+        )
+    )
+    future.add_done_callback(lambda f: _finish_job(name, f))
+    _RUNNING[name] = future
+    print(f"[EXPORT] job {name} started")
+    return dict(job)
+
+
+def _finish_job(name, future):
+    _RUNNING.pop(name, None)
+    job = _JOBS.get(name)
+    error = future.exception() if not future.cancelled() else RuntimeError("cancelled")
+    if error is not None:
+        print(f"[EXPORT] ! job {name} failed: {error}")
+        if job:
+            job["status"] = "error"
+            job["error"] = str(error)
+        return
+
+    _JOBS.pop(name, None)
+    print(f"[EXPORT] OK: job {name} done")
+    _prune_older_versions(name)
+
+
+def _prune_older_versions(name):
+    """Remove artifacts of the same report whose data was read before `name`'s.
+
+    Versions are hashes, so they are ordered by file mtime (the observation
+    time, see render_export). Newer artifacts and the ones of jobs still
+    running in this process are kept.
+    """
+    event_id, kind, export_format = parse_artifact_name(name)
+    try:
+        observed_at = os.path.getmtime(artifact_path(name))
+    except OSError:
+        return
+    for old in glob.glob(os.path.join(EXPORT_CACHE_DIR, f"{event_id}_{kind}_*.{export_format}")):
+        old_name = os.path.basename(old)
+        if old_name == name or old_name in _RUNNING or old_name in _JOBS:
+            continue
+        try:
+            if os.path.getmtime(old) < observed_at:
+                os.remove(old)
+        except OSError:
+            pass
+
+
+async def wait_export_job(name):
+    """Wait for a running job (if any) and return its final state."""
+    future = _RUNNING.get(name)
+    if future is not None:
+        try:
+            await asyncio.shield(future)
+        except Exception:
+            pass
+    return get_export_job(name)
+
+
+def shutdown_export_pool():
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
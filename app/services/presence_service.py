@@ -0,0 +1,218 @@
+"""Live audience per event, kept in Redis sorted sets.
+
+`presence:event:{event_id}` holds one member per viewer (user_id) scored with
+the time of their last heartbeat (epoch seconds). Joins/heartbeats are ZADD,
+leaves ZREM, "who is live" is a ZRANGEBYSCORE over the active window and the
+live count a ZCOUNT, so none of it touches MySQL.
+
+Only the event's audience is tracked: global staff and users in event_staff
+for that event are filtered out when they are first seen (one query per batch,
+cached). Every read returns None when Redis is unavailable so callers can fall
+back to the SQL path.
+"""
+import threading
+import time
+
+from app.config import REDIS_CONFIG
+from app.db import create_db_connection
+
+try:
+    import redis  # type: ignore
+except Exception:
+    redis = None
+
+
+REDIS_RETRY_SECONDS = 5.0
+AUDIENCE_CACHE_SECONDS = 300.0
+
+_client = None
+_down_until = 0.0
+
+# (event_id, user_id) -> (is_audience, checked_at)
+_AUDIENCE = {}
+_AUDIENCE_LOCK = threading.Lock()
+
+
+def _key(event_id):
+    return f"presence:event:{event_id}"
+
+
+def _get_client():
+    global _client
+    if redis is None or time.monotonic() < _down_until:
+        return None
+    if _client is None:
+        _client = redis.Redis(
+            host=REDIS_CONFIG["host"],
+            port=REDIS_CONFIG["port"],
+            db=REDIS_CONFIG["db"],
+            decode_responses=True,
+            socket_connect_timeout=1.0,
+            socket_timeout=1.0,
+        )
+    return _client
+
+
+def _mark_down(error):
+    global _client, _down_until
+    print(f"[PRESENCE] ! Redis unavailable, using SQL fallback: {error}")
+    _client = None
+    _down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+def _audience_only(event_id, user_ids):
+    """Drop staff from `user_ids` (viewers of this event only)."""
+    now = time.monotonic()
+    known, unknown = set(), []
+    with _AUDIENCE_LOCK:
+        for user_id in user_ids:
+            cached = _AUDIENCE.get((event_id, user_id))
+            if cached is not None and now - cached[1] <= AUDIENCE_CACHE_SECONDS:
+                if cached[0]:
+                    known.add(user_id)
+            else:
+                unknown.append(user_id)
+
+    if unknown:
+        placeholders = ", ".join(["%s"] * len(unknown))
+        with create_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id FROM users WHERE id IN ({placeholders}) AND role = 'viewer' "
+                    "AND id NOT IN (SELECT user_id FROM event_staff WHERE event_id = %s)",
+                    (*unknown, event_id),
+                )
+                audience = {row["id"] for row in cursor.fetchall()}
+        with _AUDIENCE_LOCK:
+            for user_id in unknown:
+                _AUDIENCE[(event_id, user_id)] = (user_id in audience, now)
+        known |= audience
+    return known
+
+
+def forget_audience(event_id, user_id):
+    """Re-check this user's audience status next time (their staff role changed)."""
+    try:
+        key = (int(event_id), int(user_id))
+    except (TypeError, ValueError):
+        return
+    with _AUDIENCE_LOCK:
+        _AUDIENCE.pop(key, None)
+
+
+def forget_user(user_id):
+    """Re-check a user's audience status on every event (their global role changed).
+
+    Also drops them from the live sets this process knew them in; if they are
+    still audience their next heartbeat adds them back.
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return
+    with _AUDIENCE_LOCK:
+        event_ids = [key[0] for key in _AUDIENCE if key[1] == user_id]
+        for event_id in event_ids:
+            _AUDIENCE.pop((event_id, user_id), None)
+    _remove_member(event_ids, user_id)
+
+
+def _user_event_ids(user_id):
+    """Events this user has an analytics session in (where they can be live)."""
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT event_id FROM session_analytics WHERE user_id = %s", (user_id,))
+            return [row["event_id"] for row in cursor.fetchall() if row["event_id"] is not None]
+
+
+def _remove_member(event_ids, user_id):
+    if not event_ids:
+        return True
+    client = _get_client()
+    if client is None:
+        return False
+    try:
+        pipe = client.pipeline(transaction=False)
+        for event_id in event_ids:
+            pipe.zrem(_key(event_id), str(user_id))
+        pipe.execute()
+        return True
+    except Exception as e:
+        _mark_down(e)
+        return False
+
+
+def touch_many(heartbeats, active_within_seconds=None):
+    """Record heartbeats: {event_id: {user_id: epoch_seconds}}. One pipelined round trip."""
+    if not heartbeats:
+        return True
+    client = _get_client()
+    if client is None:
+        return False
+
+    scored = {}
+    for event_id, users in heartbeats.items():
+        audience = _audience_only(event_id, list(users))
+        if audience:
+            scored[event_id] = {str(uid): ts for uid, ts in users.items() if uid in audience}
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for event_id, members in scored.items():
+            if not members:
+                continue
+            pipe.zadd(_key(event_id), members)
+            if active_within_seconds:
+                # Trim members that fell out of the window so the set stays small.
+                pipe.zremrangebyscore(_key(event_id), "-inf", time.time() - active_within_seconds)
+        pipe.execute()
+        return True
+    except Exception as e:
+        _mark_down(e)
+        return False
+
+
+def touch(event_id, user_id):
+    """A viewer joined or is still watching."""
+    if event_id is None:
+        return False
+    return touch_many({int(event_id): {int(user_id): time.time()}})
+
+
+def leave(event_id, user_id):
+    """A viewer left. Without an event (e.g. logout with no event cookie) they
+    leave every event they have a session in."""
+    if event_id is None:
+        try:
+            event_ids = _user_event_ids(user_id)
+        except Exception as e:
+            print(f"[PRESENCE] ! could not resolve events of user {user_id}: {e}")
+            return False
+    else:
+        event_ids = [event_id]
+    return _remove_member(event_ids, user_id)
+
+
+def live_user_ids(event_id, active_within_seconds):
+    """User ids with a heartbeat inside the window, most recent first (None: Redis down)."""
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        members = client.zrevrangebyscore(_key(event_id), "+inf", time.time() - active_within_seconds)
+    except Exception as e:
+        _mark_down(e)
+        return None
+    return [int(member) for member in members]
+
+
+def count_live(event_id, active_within_seconds):
+    """Number of live viewers (None: Redis down)."""
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        return client.zcount(_key(event_id), time.time() - active_within_seconds, "+inf")
+    except Exception as e:
+        _mark_down(e)
+        return None
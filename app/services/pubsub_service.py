@@ -0,0 +1,198 @@
+"""Cross-process messaging over Redis pub/sub.
+
+Every Tornado process publishes on plain Redis channels and runs one listener
+thread that hands incoming messages to the IOLoop. Messages are tagged with the
+publishing node id: the publisher already handled the message locally, so it
+skips its own echo.
+
+`publish()` never touches the network: it queues the message and a publisher
+thread sends whatever is queued in one pipelined round trip, in order. While
+Redis is down the queue is kept (oldest dropped past PUBLISH_QUEUE_MAX) and
+sent once it is back.
+
+Handlers must be registered with `subscribe()` before `start()` is called
+(services do it at import time; `server.py` starts the listener).
+"""
+import collections
+import fnmatch
+import json
+import threading
+import time
+import uuid
+
+from tornado.ioloop import IOLoop
+
+from app.config import REDIS_CONFIG
+
+try:
+    import redis  # type: ignore
+except Exception:
+    redis = None
+
+
+NODE_ID = uuid.uuid4().hex
+
+_HANDLERS = {}  # channel pattern -> [callback(channel, data)]
+_publisher = None
+_publisher_down_until = 0.0
+_listener = None
+
+# After a failed publish, wait this long before trying Redis again instead of
+# paying the connect timeout on every message while it is down.
+PUBLISH_RETRY_SECONDS = 5.0
+
+# Messages waiting for the publisher thread, as (channel, encoded message).
+PUBLISH_QUEUE_MAX = 10000
+PUBLISH_BATCH_MAX = 500
+_OUTBOX = collections.deque()
+_OUTBOX_COND = threading.Condition()
+_publisher_thread = None
+_in_flight = 0
+_dropped = 0
+
+
+def _create_redis_client(**extra):
+    if redis is None:
+        return None
+    return redis.Redis(
+        host=REDIS_CONFIG["host"],
+        port=REDIS_CONFIG["port"],
+        db=REDIS_CONFIG["db"],
+        decode_responses=True,
+        socket_connect_timeout=1.0,
+        **extra,
+    )
+
+
+def subscribe(pattern: str, callback):
+    """Register `callback(channel, data)` for messages from other nodes."""
+    _HANDLERS.setdefault(pattern, []).append(callback)
+
+
+def publish(channel: str, data) -> bool:
+    """Queue `data` (JSON-serialisable) for other nodes. Best-effort, never blocks."""
+    global _dropped
+    if redis is None:
+        return False
+
+    message = json.dumps({"node": NODE_ID, "data": data}, default=str)
+    with _OUTBOX_COND:
+        if len(_OUTBOX) >= PUBLISH_QUEUE_MAX:
+            _OUTBOX.popleft()
+            _dropped += 1
+            if _dropped % 1000 == 1:
+                print(f"[PUBSUB] ! publish queue full, {_dropped} messages dropped so far")
+        _OUTBOX.append((channel, message))
+        _ensure_publisher_thread()
+        _OUTBOX_COND.notify()
+    return True
+
+
+def _ensure_publisher_thread():
+    # Called with _OUTBOX_COND held.
+    global _publisher_thread
+    if _publisher_thread is None:
+        _publisher_thread = threading.Thread(target=_publish_forever, name="redis-publisher", daemon=True)
+        _publisher_thread.start()
+
+
+def _send_batch(batch):
+    global _publisher
+    if _publisher is None:
+        _publisher = _create_redis_client(socket_timeout=1.0)
+    if len(batch) == 1:
+        _publisher.publish(*batch[0])
+        return
+    pipe = _publisher.pipeline(transaction=False)
+    for channel, message in batch:
+        pipe.publish(channel, message)
+    pipe.execute()
+
+
+def _publish_forever():
+    global _publisher, _publisher_down_until, _in_flight
+    while True:
+        with _OUTBOX_COND:
+            while not _OUTBOX:
+                _OUTBOX_COND.wait()
+            batch = [_OUTBOX.popleft() for _ in range(min(len(_OUTBOX), PUBLISH_BATCH_MAX))]
+            _in_flight = len(batch)
+
+        while True:
+            delay = _publisher_down_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                _send_batch(batch)
+                break
+            except Exception as e:
+                _publisher = None
+                _publisher_down_until = time.monotonic() + PUBLISH_RETRY_SECONDS
+                print(f"[PUBSUB] ! publish failed ({len(batch)} queued on {batch[0][0]}...): {e}")
+
+        with _OUTBOX_COND:
+            _in_flight = 0
+            _OUTBOX_COND.notify_all()
+
+
+def pending_publishes() -> int:
+    with _OUTBOX_COND:
+        return len(_OUTBOX) + _in_flight
+
+
+def drain(timeout=2.0) -> bool:
+    """Wait up to `timeout` seconds for queued messages to be sent (shutdown)."""
+    deadline = time.monotonic() + timeout
+    with _OUTBOX_COND:
+        while _OUTBOX or _in_flight:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _OUTBOX_COND.wait(remaining)
+    return True
+
+
+def _dispatch(channel, raw):
+    try:
+        message = json.loads(raw)
+    except (TypeError, json.JSONDecodeError):
+        return
+    if message.get("node") == NODE_ID:
+        return
+
+    for pattern, callbacks in _HANDLERS.items():
+        if fnmatch.fnmatchcase(channel, pattern):
+            for callback in callbacks:
+                try:
+                    callback(channel, message.get("data"))
+                except Exception as e:
+                    print(f"[PUBSUB] ! handler error on {channel}: {e}")
+
+
+def _listen_forever(io_loop):
+    backoff = 1.0
+    while True:
+        try:
+            client = _create_redis_client(health_check_interval=30)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(*_HANDLERS.keys())
+            print(f"[PUBSUB] OK: node {NODE_ID[:8]} subscribed to {sorted(_HANDLERS)}")
+            backoff = 1.0
+            for item in pubsub.listen():
+                if item.get("type") == "pmessage":
+                    io_loop.add_callback(_dispatch, item["channel"], item["data"])
+        except Exception as e:
+            print(f"[PUBSUB] ! listener disconnected: {e}; retrying in {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def start(io_loop=None):
+    """Start the background listener (idempotent). No-op without redis-py."""
+    global _listener
+    if redis is None or _listener is not None or not _HANDLERS:
+        return
+
+    io_loop = io_loop or IOLoop.current()
+    _listener = threading.Thread(target=_listen_forever, args=(io_loop,), name="redis-pubsub", daemon=True)
+    _listener.start()
@@ -1,4 +1,37 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+
+import pymysql
+
+from app.config import QUESTIONS_READ_KEEP, QUESTIONS_WRITE_RETRY_SECONDS
 from app.db import _normalize_timestamps, create_db_connection, now_hhmm_in_timezone
+from app.services import pubsub_service
+
+
+# Per-event question store, authoritative while the process runs:
+# event_id -> {"pending": {id: q}, "approved": {id: q}, "read": {id: q}}
+# with q = {"id", "user_name", "question_text", "created_at"} (naive UTC).
+# Loaded from MySQL once per event; transitions move a question between
+# dicts in memory and the matching UPDATE/DELETE is written behind, in order,
+# by a single writer thread. Other processes apply the same transition from
+# pub/sub. Only the newest QUESTIONS_READ_KEEP read questions are kept.
+QUEUES = ("pending", "approved", "read")
+_STORES = {}
+_STORE_LOCK = threading.RLock()
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="questions-writer")
+WRITE_ATTEMPTS = 3
+
+# Mientras corre el SELECT de un evento, los cambios que llegan (add_question,
+# pub/sub) se guardan aquí y se aplican sobre lo leído antes de instalarlo.
+_LOADING = {}
+_LOAD_LOCKS = {}
+# Eventos cuyo store se descartó porque una escritura no se pudo aplicar:
+# se recargan de MySQL cuando el writer termina lo que tenía en cola.
+_DIRTY = set()
+_SHUTDOWN = threading.Event()
 
 
 def _fetch_event_timezone(cursor, event_id: int | None) -> str | None:
@@ -12,7 +45,119 @@ def _fetch_event_timezone(cursor, event_id: int | None) -> str | None:
         return None
 
 
+def _event_timezone(event_id):
+    from app.services import events_service
+
+    event = events_service.get_event_by_id(event_id) if event_id else None
+    return (event or {}).get("timezone")
+
+
+def _channel(event_id):
+    # Questions without an event travel as event 0.
+    return f"questions:event:{event_id or 0}"
+
+
+def is_loaded(event_id) -> bool:
+    return event_id in _STORES
+
+
+def ensure_loaded(event_id):
+    """Load the event's questions from MySQL once (blocking)."""
+    if event_id in _STORES:
+        return
+    with _STORE_LOCK:
+        load_lock = _LOAD_LOCKS.setdefault(event_id, threading.Lock())
+    with load_lock:
+        if event_id in _STORES:
+            return
+        if event_id in _DIRTY:
+            # Que el SELECT vea las escrituras que siguen en cola.
+            drain_question_writes()
+        with _STORE_LOCK:
+            _LOADING[event_id] = []
+        try:
+            rows = _select_questions(event_id)
+        except Exception:
+            with _STORE_LOCK:
+                _LOADING.pop(event_id, None)
+            raise
+
+        store = {queue: {} for queue in QUEUES}
+        for row in rows:
+            status = row.pop("status")
+            store[status][row["id"]] = row
+        _trim_read(store)
+        with _STORE_LOCK:
+            for question_id, to_status, question in _LOADING.pop(event_id):
+                _move(store, question_id, to_status, question)
+            _STORES[event_id] = store
+            _DIRTY.discard(event_id)
+
+
+def _select_questions(event_id):
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT "
+                "  q.id, "
+                "  COALESCE(q.manual_user_name, u.name) AS user_name, "
+                "  q.question_text, "
+                "  q.status, "
+                "  q.created_at "
+                "FROM questions q "
+                "JOIN users u ON u.id = q.user_id "
+                "WHERE q.event_id <=> %s AND q.status IN ('pending', 'approved', 'read') "
+                "ORDER BY q.id ASC",
+                (event_id,),
+            )
+            return cursor.fetchall()
+
+
+def _trim_read(store):
+    # Dicts keep insertion order: the first read entries are the oldest.
+    read = store["read"]
+    while len(read) > QUESTIONS_READ_KEEP:
+        del read[next(iter(read))]
+
+
+def _loaded_store(event_id):
+    """The event's store, loading it if needed; None if a reload keeps racing us.
+
+    _mark_dirty (a failed write, a remote reload) can drop the store right
+    after ensure_loaded returns, so callers must use what this returns and
+    never index _STORES themselves.
+    """
+    for _ in range(2):
+        ensure_loaded(event_id)
+        with _STORE_LOCK:
+            store = _STORES.get(event_id)
+        if store is not None:
+            return store
+    return None
+
+
+def _rows(store, statuses, limit):
+    """status -> newest `limit` questions, all read under one lock round."""
+    with _STORE_LOCK:
+        # Newest first, like the old ORDER BY q.id DESC.
+        picked = {
+            status: heapq.nlargest(limit, store[status].values(), key=lambda q: q["id"]) for status in statuses
+        }
+    return {
+        status: [_normalize_timestamps({**q, "status": status}) for q in questions]
+        for status, questions in picked.items()
+    }
+
+
 def list_questions(status=None, limit=30, event_id=None):
+    if event_id and status in QUEUES:
+        store = _loaded_store(event_id)
+        if store is not None:
+            return _rows(store, (status,), limit)[status]
+    return _select_rows(status, limit, event_id)
+
+
+def _select_rows(status, limit, event_id):
     sql = (
         "SELECT "
         "  q.id, "
@@ -46,6 +191,21 @@ def list_questions(status=None, limit=30, event_id=None):
 
 
 def list_pending_and_approved(limit=50, event_id=None):
+    """Pending, approved and read queues (newest first) from one store read."""
+    if event_id:
+        store = _loaded_store(event_id)
+        if store is not None:
+            rows = _rows(store, QUEUES, limit)
+        else:
+            rows = {status: _select_rows(status, limit, event_id) for status in QUEUES}
+        result = {}
+        for status in QUEUES:
+            result[status] = [
+                {key: row[key] for key in ("id", "user_name", "question_text", "created_at")}
+                for row in rows[status]
+            ]
+        return result
+
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
             base_select = (
@@ -60,23 +220,16 @@ def list_pending_and_approved(limit=50, event_id=None):
             pending_sql = base_select + " WHERE q.status='pending'"
             approved_sql = base_select + " WHERE q.status='approved'"
             read_sql = base_select + " WHERE q.status='read'"
-            params = []
-            
-            if event_id:
-                pending_sql += " AND q.event_id = %s"
-                approved_sql += " AND q.event_id = %s"
-                read_sql += " AND q.event_id = %s"
-                params.append(event_id)
-            
+
             pending_sql += " ORDER BY q.created_at DESC LIMIT %s"
             approved_sql += " ORDER BY q.created_at DESC LIMIT %s"
             read_sql += " ORDER BY q.created_at DESC LIMIT %s"
             
-            cursor.execute(pending_sql, params + [limit])
+            cursor.execute(pending_sql, [limit])
             pending = cursor.fetchall()
-            cursor.execute(approved_sql, params + [limit])
+            cursor.execute(approved_sql, [limit])
             approved = cursor.fetchall()
-            cursor.execute(read_sql, params + [limit])
+            cursor.execute(read_sql, [limit])
             read_questions = cursor.fetchall()
     return {
         "pending": [_normalize_timestamps(row) for row in pending],
@@ -85,7 +238,60 @@ def list_pending_and_approved(limit=50, event_id=None):
     }
 
 
-def add_question(user_id: int, question_text: str, event_id: int = None, manual_user_name: str = None):
+def _write_behind(event_id, sql, params):
+    def write():
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with create_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(sql, params)
+                if attempt > 1:
+                    print(f"[QUESTIONS] write applied after {attempt} attempts")
+                return
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                # MySQL caído: la escritura se queda al frente de la cola (el
+                # orden importa) y se reintenta hasta que vuelva.
+                if attempt == 1 or attempt % 10 == 0:
+                    print(f"[QUESTIONS] ! write failed (attempt {attempt}), retrying: {e}")
+            except Exception as e:
+                print(f"[QUESTIONS] ! write failed (attempt {attempt}/{WRITE_ATTEMPTS}): {e}")
+                if attempt >= WRITE_ATTEMPTS:
+                    _mark_dirty(event_id)
+                    return
+            if _SHUTDOWN.wait(QUESTIONS_WRITE_RETRY_SECONDS):
+                print(f"[QUESTIONS] ! write dropped at shutdown: {sql} {params}")
+                return
+
+    _WRITER.submit(write)
+
+
+def _mark_dirty(event_id, publish=True):
+    """Drop the event's store so the next access reloads it from MySQL."""
+    with _STORE_LOCK:
+        _DIRTY.add(event_id)
+        _STORES.pop(event_id, None)
+    if publish:
+        pubsub_service.publish(_channel(event_id), {"op": "reload"})
+
+
+def drain_question_writes(timeout=None):
+    """Block until every queued question write has run (graceful shutdown).
+
+    With a timeout, writes still waiting for MySQL when it expires are given
+    up on so the process can exit."""
+    try:
+        _WRITER.submit(lambda: None).result(timeout)
+    except FutureTimeoutError:
+        print(f"[QUESTIONS] ! MySQL unreachable for {timeout}s, dropping queued writes")
+        _SHUTDOWN.set()
+        _WRITER.submit(lambda: None).result()
+
+
+def add_question(user_id: int, question_text: str, event_id: int = None, manual_user_name: str = None,
+                 user_name: str = None, event_tz: str = None):
+    # The INSERT stays synchronous: its id is what every later transition uses.
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
@@ -94,14 +300,22 @@ def add_question(user_id: int, question_text: str, event_id: int = None, manual_
             )
             question_id = cursor.lastrowid
 
-            cursor.execute(
-                "SELECT COALESCE(q.manual_user_name, u.name) AS user_name "
-                "FROM questions q JOIN users u ON u.id=q.user_id WHERE q.id=%s",
-                (question_id,),
-            )
-            row = cursor.fetchone() or {}
-            display_name = row.get("user_name") or "Visitante"
-            event_tz = _fetch_event_timezone(cursor, event_id)
+            display_name = manual_user_name or user_name
+            if not display_name:
+                cursor.execute("SELECT name FROM users WHERE id=%s", (user_id,))
+                display_name = (cursor.fetchone() or {}).get("name")
+            display_name = display_name or "Visitante"
+            if event_tz is None:
+                event_tz = _fetch_event_timezone(cursor, event_id)
+
+    question = {
+        "id": question_id,
+        "user_name": display_name,
+        "question_text": question_text,
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+    _apply(event_id, question_id, "pending", question)
+    pubsub_service.publish(_channel(event_id), {"op": "move", "id": question_id, "to": "pending", "question": question})
     return {
         "id": question_id,
         "user": display_name,
@@ -110,80 +324,91 @@ def add_question(user_id: int, question_text: str, event_id: int = None, manual_
     }
 
 
-def approve_question(question_id: int):
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("UPDATE questions SET status='approved' WHERE id=%s", (question_id,))
-            cursor.execute(
-                "SELECT COALESCE(q.manual_user_name, u.name) AS user_name, q.question_text, e.timezone "
-                "FROM questions q "
-                "JOIN users u ON u.id=q.user_id "
-                "LEFT JOIN events e ON e.id=q.event_id "
-                "WHERE q.id=%s",
-                (question_id,),
-            )
-            row = cursor.fetchone()
-    if not row:
+def _apply(event_id, question_id, to_status, question=None):
+    """Move (or insert/remove with to_status=None) a question. Returns it, or None if unknown."""
+    with _STORE_LOCK:
+        store = _STORES.get(event_id)
+        if store is None:
+            buffered = _LOADING.get(event_id)
+            if buffered is not None:
+                buffered.append((question_id, to_status, question))
+            return None
+        return _move(store, question_id, to_status, question)
+
+
+def _move(store, question_id, to_status, question):
+    for status in QUEUES:
+        found = store[status].pop(question_id, None)
+        if found is not None:
+            question = found
+            break
+    if question is not None and to_status is not None:
+        store[to_status][question_id] = question
+        if to_status == "read":
+            _trim_read(store)
+    return question
+
+
+def _on_remote_change(channel, data):
+    data = data or {}
+    try:
+        event_id = int(channel.rsplit(":", 1)[1]) or None
+        if data.get("op") == "reload":
+            _mark_dirty(event_id, publish=False)
+            return
+        question_id = int(data.get("id"))
+    except (TypeError, ValueError, IndexError):
+        return
+    question = data.get("question")
+    if question and isinstance(question.get("created_at"), str):
+        try:
+            question["created_at"] = datetime.fromisoformat(question["created_at"])
+        except ValueError:
+            pass
+    _apply(event_id, question_id, data.get("to"), question)
+
+
+pubsub_service.subscribe("questions:event:*", _on_remote_change)
+
+
+def _transition(question_id, event_id, to_status, sql, event_tz=None):
+    ensure_loaded(event_id)
+    question = _apply(event_id, question_id, to_status)
+    if question is None:
         return None
+
+    _write_behind(event_id, sql, (question_id,))
+    pubsub_service.publish(_channel(event_id), {"op": "move", "id": question_id, "to": to_status})
+    if to_status is None:
+        return True
     return {
         "id": question_id,
-        "user": row["user_name"],
-        "question": row["question_text"],
-        "timestamp": now_hhmm_in_timezone(row.get("timezone")),
+        "user": question["user_name"],
+        "question": question["question_text"],
+        "timestamp": now_hhmm_in_timezone(event_tz if event_tz is not None else _event_timezone(event_id)),
     }
 
 
-def reject_question(question_id: int):
+def approve_question(question_id: int, event_id: int = None, event_tz: str = None):
+    return _transition(
+        question_id, event_id, "approved", "UPDATE questions SET status='approved' WHERE id=%s", event_tz
+    )
+
+
+def reject_question(question_id: int, event_id: int = None):
     """Delete rejected question from database"""
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("DELETE FROM questions WHERE id=%s", (question_id,))
-    return True
+    return _transition(question_id, event_id, None, "DELETE FROM questions WHERE id=%s")
 
 
-def return_question_to_pending(question_id: int):
+def return_question_to_pending(question_id: int, event_id: int = None, event_tz: str = None):
     """Returns an approved question back to pending status."""
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("UPDATE questions SET status='pending' WHERE id=%s", (question_id,))
-            cursor.execute(
-                "SELECT COALESCE(q.manual_user_name, u.name) AS user_name, q.question_text, e.timezone "
-                "FROM questions q "
-                "JOIN users u ON u.id=q.user_id "
-                "LEFT JOIN events e ON e.id=q.event_id "
-                "WHERE q.id=%s",
-                (question_id,),
-            )
-            row = cursor.fetchone()
-    if not row:
-        return None
-    return {
-        "id": question_id,
-        "user": row["user_name"],
-        "question": row["question_text"],
-        "timestamp": now_hhmm_in_timezone(row.get("timezone")),
-    }
+    return _transition(
+        question_id, event_id, "pending", "UPDATE questions SET status='pending' WHERE id=%s", event_tz
+    )
 
 
-def mark_question_as_read(question_id: int):
+def mark_question_as_read(question_id: int, event_id: int = None, event_tz: str = None):
     """Sets a question status to 'read' or 'answered'."""
-    with create_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("UPDATE questions SET status='read' WHERE id=%s", (question_id,))
-            cursor.execute(
-                "SELECT COALESCE(q.manual_user_name, u.name) AS user_name, q.question_text, e.timezone "
-                "FROM questions q "
-                "JOIN users u ON u.id=q.user_id "
-                "LEFT JOIN events e ON e.id=q.event_id "
-                "WHERE q.id=%s",
-                (question_id,),
-            )
-            row = cursor.fetchone()
-    if not row:
-        return None
-    return {
-        "id": question_id,
-        "user": row["user_name"],
-        "question": row["question_text"],
-        "timestamp": now_hhmm_in_timezone(row.get("timezone")),
-    }
+    return _transition(
+        question_id, event_id, "read", "UPDATE questions SET status='read' WHERE id=%s", event_tz
+    )
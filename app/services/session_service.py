@@ -1,7 +1,11 @@
 import json
+import os
+import threading
+import time
 import uuid
 
-from app.config import REDIS_CONFIG
+from app.config import REDIS_CONFIG, SESSION_L1_TTL, SESSION_REFRESH_INTERVAL, SESSION_TOMBSTONE_DIR
+from app.services import pubsub_service
 
 try:
     import redis  # type: ignore
@@ -37,59 +41,342 @@ redis_client = _create_redis_client()
 
 SESSION_TTL = 300  # 5 minutes in seconds
 
+# If Redis was unreachable, don't retry the connect (and its timeout) on
+# every request; try again after this many seconds.
+REDIS_RETRY_SECONDS = 5.0
+_redis_down_until = 0.0
+
+INVALIDATE_CHANNEL = "session:invalidate"
+
+# L1: session_id -> {"data", "cached_at", "refreshed_at", "local"}.
+# Entries with local=True only exist in this process: they were created while
+# Redis was down and live for SESSION_TTL (sliding) instead of SESSION_L1_TTL.
+_L1 = {}
+_L1_LOCK = threading.Lock()
+_L1_PRUNE_EVERY = 60.0
+_l1_pruned_at = 0.0
+_getex_supported = True
+
+
+def _key(session_id):
+    return f"session:{session_id}"
+
+
+def _get_client():
+    global redis_client
+    if redis_client is None and redis is not None and time.monotonic() >= _redis_down_until:
+        redis_client = _create_redis_client()
+        if redis_client is None:
+            _mark_redis_down()
+        else:
+            _replay_tombstones(redis_client)
+    return redis_client
+
+
+def _mark_redis_down(error=None):
+    global redis_client, _redis_down_until
+    if error is not None:
+        print(f"[SESSION] ! Redis unavailable: {error}")
+    redis_client = None
+    _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+def _cache_put(session_id, data, refreshed=True, local=False):
+    global _l1_pruned_at
+    now = time.monotonic()
+    with _L1_LOCK:
+        if now - _l1_pruned_at > _L1_PRUNE_EVERY:
+            # Anything not confirmed for a full TTL has expired in Redis too.
+            for sid in [sid for sid, e in _L1.items() if now - e["refreshed_at"] > SESSION_TTL]:
+                del _L1[sid]
+            _l1_pruned_at = now
+        previous = _L1.get(session_id)
+        _L1[session_id] = {
+            "data": data,
+            "cached_at": now,
+            "refreshed_at": now if refreshed or previous is None else previous["refreshed_at"],
+            "local": local,
+        }
+
+
+def _cache_drop(session_id):
+    with _L1_LOCK:
+        _L1.pop(session_id, None)
+
+
+def _cache_lookup(session_id):
+    """Return (entry, fresh). Expired local entries are removed."""
+    now = time.monotonic()
+    with _L1_LOCK:
+        entry = _L1.get(session_id)
+        if entry is None:
+            return None, False
+        if entry["local"]:
+            if now - entry["refreshed_at"] > SESSION_TTL:
+                _L1.pop(session_id, None)
+                return None, False
+            entry["refreshed_at"] = now
+            return entry, True
+        return entry, now - entry["cached_at"] <= SESSION_L1_TTL
+
+
+def _tombstone_path(session_id):
+    try:
+        # Session ids are uuid4 strings; anything else never becomes a path.
+        name = str(uuid.UUID(str(session_id)))
+    except ValueError:
+        return None
+    return os.path.join(SESSION_TOMBSTONE_DIR, name)
+
+
+def _write_tombstone(session_id):
+    path = _tombstone_path(session_id)
+    if path is None:
+        return
+    try:
+        os.makedirs(SESSION_TOMBSTONE_DIR, exist_ok=True)
+        with open(path, "w"):
+            pass
+    except OSError as e:
+        print(f"[SESSION] ! could not record deleted session {session_id[:8]}: {e}")
+
+
+def _tombstoned(session_id):
+    """True if some process on this host deleted the session while Redis was down."""
+    path = _tombstone_path(session_id)
+    if path is None or not os.path.exists(path):
+        return False
+    _cache_drop(session_id)
+    return True
+
+
+def _replay_tombstones(client):
+    """Apply deletes recorded during an outage to Redis, then forget them."""
+    try:
+        names = os.listdir(SESSION_TOMBSTONE_DIR)
+    except OSError:
+        return
+    now = time.time()
+    for name in names:
+        path = os.path.join(SESSION_TOMBSTONE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) <= SESSION_TTL:
+                client.delete(_key(name))
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            # Still down (or the file is busy): keep it for the next reconnect.
+            print(f"[SESSION] ! could not replay deleted session {name[:8]}: {e}")
+            return
+
+
+def _publish_invalidation(session_id):
+    pubsub_service.publish(INVALIDATE_CHANNEL, {"session_id": session_id})
+
+
+def _on_remote_invalidate(channel, data):
+    session_id = (data or {}).get("session_id")
+    if session_id:
+        _cache_drop(session_id)
+
+
+pubsub_service.subscribe(INVALIDATE_CHANNEL, _on_remote_invalidate)
+
+
+def _read_session(client, session_id, refresh):
+    """One round trip: GETEX when the sliding expiry is due, GET otherwise."""
+    global _getex_supported
+    key = _key(session_id)
+    if not refresh:
+        return client.get(key)
+    if _getex_supported:
+        try:
+            return client.getex(key, ex=SESSION_TTL)
+        except redis.exceptions.ResponseError:
+            # Redis < 6.2 has no GETEX; fall back to a pipelined GET + EXPIRE.
+            _getex_supported = False
+    pipe = client.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.expire(key, SESSION_TTL)
+    return pipe.execute()[0]
+
+
 def create_session(data: dict) -> str:
     """
     Creates a new session in Redis with the given data.
     Returns the generated session_id.
+
+    If Redis is unavailable the session is kept in this process only, so
+    logins keep working (single-process deployments, or sticky sessions).
     """
-    if not redis_client:
-        return None
-        
     session_id = str(uuid.uuid4())
-    key = f"session:{session_id}"
-    
-    # Store as JSON string
-    redis_client.setex(key, SESSION_TTL, json.dumps(data))
-    
+    client = _get_client()
+    if client is not None:
+        try:
+            # Store as JSON string
+            client.setex(_key(session_id), SESSION_TTL, json.dumps(data))
+            _cache_put(session_id, data)
+            return session_id
+        except Exception as e:
+            _mark_redis_down(e)
+
+    print(f"[SESSION] ! Redis down, session {session_id[:8]} stored in-process only")
+    _cache_put(session_id, data, local=True)
     return session_id
 
+
+def get_cached_session(session_id: str):
+    """
+    Session from the in-process cache, without any I/O. Returns None when the
+    caller has to go through get_session() (miss, stale, or expiry refresh due).
+    """
+    if not session_id:
+        return None
+    entry, fresh = _cache_lookup(session_id)
+    if entry is None or not fresh:
+        return None
+    if entry["local"]:
+        # Only exists during an outage; a logout elsewhere leaves a tombstone.
+        return None if _tombstoned(session_id) else dict(entry["data"])
+    if time.monotonic() - entry["refreshed_at"] > SESSION_REFRESH_INTERVAL:
+        return None
+    return dict(entry["data"])
+
+
+def _outage_fallback(session_id, entry):
+    # Redis is down: a session we confirmed recently is still good, unless a
+    # process on this host deleted it in the meantime.
+    if entry is None or time.monotonic() - entry["refreshed_at"] > SESSION_TTL:
+        return None
+    if _tombstoned(session_id):
+        return None
+    return dict(entry["data"])
+
+
 def get_session(session_id: str) -> dict:
     """
-    Retrieves session data from Redis.
+    Retrieves session data (L1 cache, then Redis).
     Returns None if not found or expired.
     """
-    if not redis_client or not session_id:
+    if not session_id:
+        return None
+
+    entry, fresh = _cache_lookup(session_id)
+    if entry is not None and entry["local"]:
+        return None if _tombstoned(session_id) else dict(entry["data"])
+
+    refresh_due = entry is None or time.monotonic() - entry["refreshed_at"] > SESSION_REFRESH_INTERVAL
+    if fresh and not refresh_due:
+        return dict(entry["data"])
+
+    client = _get_client()
+    if client is None:
+        return _outage_fallback(session_id, entry)
+
+    try:
+        data_str = _read_session(client, session_id, refresh_due)
+    except Exception as e:
+        _mark_redis_down(e)
+        return _outage_fallback(session_id, entry)
+
+    if not data_str:
+        _cache_drop(session_id)
+        return None
+    try:
+        data = json.loads(data_str)
+    except json.JSONDecodeError:
+        _cache_drop(session_id)
         return None
-        
-    key = f"session:{session_id}"
-    data_str = redis_client.get(key)
-    
-    if data_str:
-        # Extend TTL on access (sliding expiration) - optional but recommended
-        redis_client.expire(key, SESSION_TTL) 
-        try:
-            return json.loads(data_str)
-        except json.JSONDecodeError:
-            return None
-    return None
+
+    _cache_put(session_id, data, refreshed=refresh_due)
+    return dict(data)
+
+def refresh_sessions(session_ids) -> set:
+    """
+    Pushes the sliding expiry of many sessions forward in one pipelined round
+    trip. Returns the ids that still exist, or None if Redis can't tell.
+    """
+    live = set()
+    remote = []
+    for session_id in session_ids:
+        entry, _ = _cache_lookup(session_id)
+        if entry is not None and entry["local"]:
+            live.add(session_id)
+        else:
+            remote.append(session_id)
+    if not remote:
+        return live
+
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        pipe = client.pipeline(transaction=False)
+        for session_id in remote:
+            pipe.expire(_key(session_id), SESSION_TTL)
+        results = pipe.execute()
+    except Exception as e:
+        _mark_redis_down(e)
+        return None
+
+    now = time.monotonic()
+    for session_id, alive in zip(remote, results):
+        if alive:
+            live.add(session_id)
+            with _L1_LOCK:
+                entry = _L1.get(session_id)
+                if entry is not None:
+                    entry["refreshed_at"] = now
+        else:
+            _cache_drop(session_id)
+    return live
 
 def update_session(session_id: str, data: dict):
     """
     Updates existing session data.
     """
-    if not redis_client or not session_id:
+    if not session_id:
+        return
+
+    entry, _ = _cache_lookup(session_id)
+    if entry is not None and entry["local"]:
+        _cache_put(session_id, data, local=True)
+        return
+
+    client = _get_client()
+    if client is None:
         return
-        
-    key = f"session:{session_id}"
-    if redis_client.exists(key):
-        redis_client.setex(key, SESSION_TTL, json.dumps(data))
+    try:
+        # XX: only if it still exists (same as the old EXISTS + SETEX, one round trip).
+        if client.set(_key(session_id), json.dumps(data), ex=SESSION_TTL, xx=True):
+            _cache_put(session_id, data)
+        else:
+            _cache_drop(session_id)
+    except Exception as e:
+        _mark_redis_down(e)
+        _cache_drop(session_id)
+    _publish_invalidation(session_id)
 
 def delete_session(session_id: str):
     """
-    Deletes a session from Redis.
+    Deletes a session from Redis (and from every process's cache, also while
+    Redis is down: see SESSION_TOMBSTONE_DIR).
     """
-    if not redis_client or not session_id:
+    if not session_id:
         return
-        
-    key = f"session:{session_id}"
-    redis_client.delete(key)
+
+    _cache_drop(session_id)
+    client = _get_client()
+    deleted = False
+    if client is not None:
+        try:
+            client.delete(_key(session_id))
+            deleted = True
+        except Exception as e:
+            _mark_redis_down(e)
+    if not deleted:
+        # Pub/sub can't carry this right now: leave a tombstone for the other
+        # processes, and for the Redis delete once it is back.
+        _write_tombstone(session_id)
+    _publish_invalidation(session_id)
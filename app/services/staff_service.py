@@ -1,17 +1,75 @@
 from __future__ import annotations
 
+import threading
+import time
 from typing import Iterable, Optional
 
+from app.config import STAFF_ROLE_CACHE_TTL
 from app.db import create_db_connection
+from app.services import presence_service, pubsub_service, users_service
 
 
 EVENT_STAFF_ROLES = {"admin", "moderator", "speaker"}
 
+INVALIDATE_CHANNEL = "staff:invalidate"
+
+# (user_id, event_id) -> (role or None, fetched_at). None ("not staff") is
+# cached too: that is the answer for almost every viewer.
+_ROLE_CACHE: dict = {}
+_ROLE_LOCK = threading.Lock()
+
+
+def _role_key(user_id, event_id):
+    return int(user_id), int(event_id)
+
+
+def invalidate_event_role(user_id: int, event_id: int, publish: bool = True) -> None:
+    """Forget a cached role here (and, by default, in every other process)."""
+    with _ROLE_LOCK:
+        _ROLE_CACHE.pop(_role_key(user_id, event_id), None)
+    # Staff are not audience; let presence re-check this user.
+    presence_service.forget_audience(event_id, user_id)
+    if publish:
+        pubsub_service.publish(INVALIDATE_CHANNEL, {"user_id": user_id, "event_id": event_id})
+
+
+def invalidate_user_roles(user_id: int, publish: bool = True) -> None:
+    """A user's global role changed: re-check their audience status on every event."""
+    presence_service.forget_user(user_id)
+    if publish:
+        pubsub_service.publish(INVALIDATE_CHANNEL, {"user_id": user_id, "global": True})
+
+
+def _on_remote_invalidate(channel, data):
+    data = data or {}
+    if data.get("user_id") and data.get("event_id"):
+        invalidate_event_role(data["user_id"], data["event_id"], publish=False)
+    elif data.get("user_id") and data.get("global"):
+        invalidate_user_roles(data["user_id"], publish=False)
+
+
+pubsub_service.subscribe(INVALIDATE_CHANNEL, _on_remote_invalidate)
+
+
+def get_cached_event_role(user_id: int, event_id: int) -> tuple[bool, Optional[str]]:
+    """(True, role) if the role is known without a query, else (False, None)."""
+    if not user_id or not event_id:
+        return True, None
+    with _ROLE_LOCK:
+        cached = _ROLE_CACHE.get(_role_key(user_id, event_id))
+    if cached is None or time.monotonic() - cached[1] > STAFF_ROLE_CACHE_TTL:
+        return False, None
+    return True, cached[0]
+
 
 def get_event_role(user_id: int, event_id: int) -> Optional[str]:
     if not user_id or not event_id:
         return None
 
+    hit, role = get_cached_event_role(user_id, event_id)
+    if hit:
+        return role
+
     with create_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
@@ -19,7 +77,11 @@ def get_event_role(user_id: int, event_id: int) -> Optional[str]:
                 (user_id, event_id),
             )
             row = cursor.fetchone()
-            return (row or {}).get("role")
+            role = (row or {}).get("role")
+
+    with _ROLE_LOCK:
+        _ROLE_CACHE[_role_key(user_id, event_id)] = (role, time.monotonic())
+    return role
 
 
 def user_has_any_event_role(user_id: int, event_id: int, roles: Iterable[str]) -> bool:
@@ -111,8 +173,10 @@ def upsert_staff_by_email(event_id: int, email: str, role: str) -> dict:
                 "ON DUPLICATE KEY UPDATE role=VALUES(role)",
                 (user_id, event_id, role),
             )
+            users_service.bump_users_revision(cursor)
             conn.commit()
 
+    invalidate_event_role(user_id, event_id)
     return {"user_id": int(user_id), "event_id": int(event_id), "role": role}
 
 
@@ -126,8 +190,12 @@ def remove_staff(user_id: int, event_id: int) -> bool:
                 "DELETE FROM event_staff WHERE user_id=%s AND event_id=%s",
                 (user_id, event_id),
             )
+            if n:
+                users_service.bump_users_revision(cursor)
             conn.commit()
-            return n > 0
+
+    invalidate_event_role(user_id, event_id)
+    return n > 0
 
 
 def list_all_staff_global() -> list[dict]:
@@ -0,0 +1,44 @@
+"""Signed, short-lived WebSocket tickets.
+
+A page handler that already authorized the user for a role on an event issues
+a ticket; `LiveWebSocket.open` verifies it with the cookie secret alone (no
+Redis/MySQL). Tickets are bound to the session id so a leaked URL is useless
+without the matching session cookie.
+"""
+import json
+import time
+
+import tornado.web
+
+from app.config import COOKIE_SECRET, WS_TICKET_TTL
+
+_TICKET_NAME = "ws_ticket"
+
+
+def issue_ws_ticket(session_id, user_id, user_name, role, event_id, event_timezone=None) -> str:
+    payload = {
+        "sid": session_id,
+        "uid": user_id,
+        "name": user_name,
+        "role": role,
+        "eid": event_id,
+        "tz": event_timezone,
+        "exp": int(time.time()) + WS_TICKET_TTL,
+    }
+    return tornado.web.create_signed_value(COOKIE_SECRET, _TICKET_NAME, json.dumps(payload)).decode()
+
+
+def verify_ws_ticket(ticket: str):
+    """Return the ticket payload, or None if missing, tampered with or expired."""
+    if not ticket:
+        return None
+    raw = tornado.web.decode_signed_value(COOKIE_SECRET, _TICKET_NAME, ticket, max_age_days=1)
+    if raw is None:
+        return None
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or payload.get("exp", 0) < time.time():
+        return None
+    return payload
@@ -1,4 +1,59 @@
+import threading
+import time
+
+from app import schema
+from app.config import MODERATION_CACHE_TTL
 from app.db import create_db_connection
+from app.services import pubsub_service
+
+MODERATION_FIELDS = ("chat_blocked", "qa_blocked", "banned")
+STATUS_CHANNEL = "users:status"
+
+# Moderation flags per user: user_id -> (status dict, fetched_at).
+# Entries are trusted for MODERATION_CACHE_TTL seconds; update_user_status
+# patches them on every process right away.
+_STATUS_CACHE = {}
+_STATUS_LOCK = threading.Lock()
+
+
+def _user_key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+def _cache_status(user_id, status):
+    with _STATUS_LOCK:
+        _STATUS_CACHE[_user_key(user_id)] = (status, time.monotonic())
+
+
+def _apply_status_change(user_id, field, value):
+    with _STATUS_LOCK:
+        cached = _STATUS_CACHE.get(_user_key(user_id))
+        if cached is not None:
+            # Patch in place but keep the original fetch time, so the TTL still
+            # bounds how long the other flags are trusted.
+            status, fetched_at = cached
+            _STATUS_CACHE[_user_key(user_id)] = ({**status, field: 1 if value else 0}, fetched_at)
+
+
+def _on_remote_status(channel, data):
+    data = data or {}
+    if data.get("field") in MODERATION_FIELDS:
+        _apply_status_change(data.get("user_id"), data["field"], data.get("value"))
+
+
+pubsub_service.subscribe(STATUS_CHANNEL, _on_remote_status)
+
+
+def get_cached_flag(user_id, field):
+    """Moderation flag from memory, or None if it has to be (re)loaded."""
+    with _STATUS_LOCK:
+        cached = _STATUS_CACHE.get(_user_key(user_id))
+    if cached is None or time.monotonic() - cached[1] > MODERATION_CACHE_TTL:
+        return None
+    return bool(cached[0].get(field))
 
 def get_user_status(user_id):
     with create_db_connection() as conn:
@@ -7,12 +62,67 @@ def get_user_status(user_id):
                 "SELECT chat_blocked, qa_blocked, banned FROM users WHERE id=%s",
                 (user_id,)
             )
-            return cursor.fetchone()
+            status = cursor.fetchone()
+    # Unknown users are cached too (as "no flags") so they don't hit MySQL each time.
+    _cache_status(user_id, status or {})
+    return status
+
+def get_statuses(user_ids):
+    """Moderation flags for many users: cached ones first, one query for the rest."""
+    statuses, missing = {}, []
+    now = time.monotonic()
+    with _STATUS_LOCK:
+        for user_id in user_ids:
+            cached = _STATUS_CACHE.get(_user_key(user_id))
+            if cached is not None and now - cached[1] <= MODERATION_CACHE_TTL:
+                statuses[user_id] = cached[0]
+            else:
+                missing.append(user_id)
+    if not missing:
+        return statuses
+
+    placeholders = ", ".join(["%s"] * len(missing))
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, chat_blocked, qa_blocked, banned FROM users WHERE id IN ({placeholders})",
+                [_user_key(user_id) for user_id in missing],
+            )
+            rows = {row.pop("id"): row for row in cursor.fetchall()}
+    for user_id in missing:
+        status = rows.get(_user_key(user_id)) or {}
+        _cache_status(user_id, status)
+        statuses[user_id] = status
+    return statuses
+
+def get_account_roles(user_ids):
+    """Current global role and home event per user: {user_id: {"role", "event_id"}} (no cache)."""
+    user_ids = [_user_key(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT id, role, event_id FROM users WHERE id IN ({placeholders})", user_ids)
+            return {row.pop("id"): row for row in cursor.fetchall()}
+
+def bump_users_revision(cursor):
+    """Record that user data shown in exports changed (names, emails, staff).
+
+    Call it after the write, on the same cursor: export versions include this
+    counter, so cached exports of every event are rebuilt on next request.
+    """
+    if not schema.has_column("data_revisions", "revision"):
+        return
+    cursor.execute(
+        "INSERT INTO data_revisions (name, revision) VALUES ('users', 1) "
+        "ON DUPLICATE KEY UPDATE revision = revision + 1"
+    )
+
 
 def update_user_status(user_id, field, value):
     # field should be one of: chat_blocked, qa_blocked, banned
-    valid_fields = ["chat_blocked", "qa_blocked", "banned"]
-    if field not in valid_fields:
+    if field not in MODERATION_FIELDS:
         return False
         
     with create_db_connection() as conn:
@@ -22,16 +132,23 @@ def update_user_status(user_id, field, value):
                 (1 if value else 0, user_id)
             )
             conn.commit()
-            return True
 
-def is_user_banned(user_id):
+    _apply_status_change(user_id, field, value)
+    pubsub_service.publish(STATUS_CHANNEL, {"user_id": user_id, "field": field, "value": bool(value)})
+    return True
+
+def _flag(user_id, field):
+    cached = get_cached_flag(user_id, field)
+    if cached is not None:
+        return cached
     status = get_user_status(user_id)
-    return status.get("banned") if status else False
+    return status.get(field) if status else False
+
+def is_user_banned(user_id):
+    return _flag(user_id, "banned")
 
 def is_chat_blocked(user_id):
-    status = get_user_status(user_id)
-    return status.get("chat_blocked") if status else False
+    return _flag(user_id, "chat_blocked")
 
 def is_qa_blocked(user_id):
-    status = get_user_status(user_id)
-    return status.get("qa_blocked") if status else False
+    return _flag(user_id, "qa_blocked")
@@ -0,0 +1,246 @@
+"""Benchmark: wire bytes, CPU and memory of permessage-deflate per payload type.
+
+Connects clients to LiveWebSocket (auth bypassed) once as a plain role
+(viewer) and once as a compressed role (moderator, client offers deflate), and
+sends the same stream of messages to both. The streams evolve like a live
+event does, so context takeover can't just replay the previous message:
+
+  snapshot  successive active_sessions lists: viewers join and leave, minutes
+            and last ping move forward on every one.
+  delta     the sessions_delta messages between those snapshots.
+  chat      chat messages with varied users and text.
+
+Wire bytes are what the clients actually read off the socket.
+
+Memory per connection (the deflate contexts) is measured with tracemalloc
+on the server while --memory-clients sockets are held open by a separate
+process, once plain and once compressed, after each socket got one snapshot.
+
+    python bench/compression_bench.py
+    python bench/compression_bench.py --clients 50 --rows 2000 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import tornado.web  # noqa: E402
+import tornado.websocket  # noqa: E402
+
+from app.config import WS_COMPRESSION_LEVEL, WS_COMPRESSION_MEM_LEVEL  # noqa: E402
+from app.handlers import ws  # noqa: E402
+from ws_helpers import LiveServer, OpenSocket, connect, connected_sockets  # noqa: E402
+
+_FIRST = ("Ana", "Luis", "María", "José", "Carmen", "Jorge", "Lucía", "Pedro", "Sofía", "Diego", "Elena", "Raúl")
+_LAST = ("García", "Hernández", "López", "Martínez", "Pérez", "Sánchez", "Ramírez", "Torres", "Flores", "Rivera")
+_WORDS = (
+    "hola saludos desde excelente transmisión pregunta gracias audio video se escucha muy bien "
+    "cuándo empieza la siguiente sesión ponente tema interesante buenas tardes noches Monterrey "
+    "Guadalajara CDMX Puebla felicidades equipo presentación diapositivas link descarga"
+).split()
+
+
+class _Attendance:
+    """A live session list that changes between snapshots."""
+
+    def __init__(self, rows, rng):
+        self.rng = rng
+        self.next_id = 1000
+        self.rows = {}
+        for _ in range(rows):
+            self._join()
+
+    def _join(self):
+        uid = self.next_id
+        self.next_id += 1
+        self.rows[uid] = {
+            "user_id": uid,
+            "user_name": f"{self.rng.choice(_FIRST)} {self.rng.choice(_LAST)} {self.rng.randint(1, 99)}",
+            "start_time": f"2024-05-01 18:{self.rng.randint(0, 59):02d}:{self.rng.randint(0, 59):02d}",
+            "last_ping": "2024-05-01 19:00:00",
+            "session_minutes": self.rng.randint(0, 60),
+            "chat_blocked": 0,
+            "qa_blocked": 0,
+            "banned": 0,
+        }
+        return uid
+
+    def step(self, tick):
+        """Advance one snapshot interval; returns (joined ids, left ids)."""
+        left = self.rng.sample(sorted(self.rows), k=max(1, len(self.rows) // 50))
+        for uid in left:
+            del self.rows[uid]
+        joined = [self._join() for _ in range(len(left) + self.rng.randint(0, 3))]
+        for row in self.rows.values():
+            if self.rng.random() < 0.7:
+                row["session_minutes"] += 1
+                row["last_ping"] = f"2024-05-01 19:{tick % 60:02d}:{self.rng.randint(0, 59):02d}"
+        return joined, left
+
+    def snapshot(self, seq):
+        return {"type": "active_sessions", "seq": seq, "sessions": list(self.rows.values())}
+
+    def delta(self, seq, joined, left):
+        return {
+            "type": "sessions_delta",
+            "seq": seq,
+            "joined": [self.rows[uid] for uid in joined],
+            "changed": [],
+            "left": left,
+            "progress": [[uid, row["session_minutes"], row["last_ping"]] for uid, row in self.rows.items()],
+        }
+
+
+def _streams(rows, messages, seed=7):
+    rng = random.Random(seed)
+    attendance = _Attendance(rows, rng)
+    snapshots, deltas = [], []
+    for seq in range(1, messages + 1):
+        joined, left = attendance.step(seq)
+        snapshots.append(attendance.snapshot(seq))
+        deltas.append(attendance.delta(seq, joined, left))
+    chats = [
+        {
+            "type": "chat",
+            "user_id": rng.randint(1000, 5000),
+            "user": f"{rng.choice(_FIRST)} {rng.choice(_LAST)}",
+            "message": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 18))),
+            "timestamp": f"19:{n % 60:02d}",
+        }
+        for n in range(messages * 10)
+    ]
+    return [("snapshot", snapshots), ("delta", deltas), ("chat", chats)]
+
+
+async def _drain(conn, expected):
+    for _ in range(expected):
+        if await conn.read_message() is None:
+            break
+
+
+async def _measure(port, role, compression_options, event_id, clients, payloads):
+    conns = [
+        await connect(port, role=role, event_id=event_id, user_id=n, compression_options=compression_options)
+        for n in range(clients)
+    ]
+    texts = [json.dumps(p) for p in payloads]
+
+    readers = [asyncio.ensure_future(_drain(conn, len(texts))) for conn in conns]
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for text in texts:
+        ws._broadcast_local(text, event_id=event_id)
+        await asyncio.sleep(0)
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    wire = sum(conn.protocol._wire_bytes_in for conn in conns)
+    payload = sum(conn.protocol._message_bytes_in for conn in conns)
+    for conn in conns:
+        conn.close()
+    return wire, payload, cpu, elapsed
+
+
+# ---------------------------------------------------------------------------
+# Memory per connection. Clients live in another process so tracemalloc only
+# sees the server side of each socket.
+# ---------------------------------------------------------------------------
+
+async def run_clients(port, count, role, compressed):
+    url = f"ws://127.0.0.1:{port}/ws?role={role}&event_id=900&user_id="
+    options = {} if compressed else None
+    conns = []
+    for start in range(0, count, 50):
+        batch = range(start, min(start + 50, count))
+        conns.extend(
+            await asyncio.gather(
+                *(tornado.websocket.websocket_connect(url + str(n), compression_options=options) for n in batch)
+            )
+        )
+    await asyncio.gather(*(conn.read_message() for conn in conns))
+    print("GOT", flush=True)
+    # Hold the sockets until the server is done measuring.
+    await asyncio.gather(*(conn.read_message() for conn in conns))
+
+
+async def _memory_per_connection(port, count, role, compressed, text):
+    # Settle and trace from here: only what the new sockets allocate counts.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--client", str(port), str(count), role, str(int(compressed)),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        while len(connected_sockets(900)) < count:
+            await asyncio.sleep(0.05)
+        ws._broadcast_local(text, event_id=900)
+        while True:
+            line = (await clients.stdout.readline()).decode().strip()
+            if not line:
+                raise RuntimeError("client process exited")
+            if line == "GOT":
+                break
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+        clients.terminate()
+        await clients.wait()
+    while connected_sockets(900):
+        await asyncio.sleep(0.05)
+    return used / count
+
+
+async def run(args):
+    app = tornado.web.Application([(r"/ws", OpenSocket)])
+    scenarios = _streams(args.rows, args.messages)
+    print(f"clients={args.clients} rows/snapshot={args.rows} level={WS_COMPRESSION_LEVEL} mem_level={WS_COMPRESSION_MEM_LEVEL}")
+    print(f"{'payload':<10}{'mode':<9}{'messages':>9}{'payload MB':>12}{'wire MB':>10}{'ratio':>7}{'CPU s':>8}{'wall s':>8}")
+    async with LiveServer(app) as port:
+        event_id = 1
+        for name, payloads in scenarios:
+            for mode, role, options in (("plain", "viewer", None), ("deflate", "moderator", {})):
+                wire, payload, cpu, elapsed = await _measure(port, role, options, event_id, args.clients, payloads)
+                event_id += 1
+                print(
+                    f"{name:<10}{mode:<9}{len(payloads):>9}{payload / 1e6:>12.2f}{wire / 1e6:>10.2f}"
+                    f"{wire / payload:>7.2f}{cpu:>8.2f}{elapsed:>8.2f}"
+                )
+
+        if args.memory_clients:
+            text = json.dumps(scenarios[0][1][0])
+            plain = await _memory_per_connection(port, args.memory_clients, "viewer", False, text)
+            deflate = await _memory_per_connection(port, args.memory_clients, "moderator", True, text)
+            print(
+                f"server memory per connection ({args.memory_clients} sockets): plain {plain / 1024:.1f} KB, "
+                f"deflate {deflate / 1024:.1f} KB (+{(deflate - plain) / 1024:.1f} KB for the deflate contexts)"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=500, help="rows per active_sessions snapshot")
+    parser.add_argument("--messages", type=int, default=20, help="snapshots/deltas sent (chat sends 10x as many)")
+    parser.add_argument("--memory-clients", type=int, default=500, help="sockets for the memory measurement (0 skips it)")
+    parser.add_argument("--client", nargs=4, metavar=("PORT", "COUNT", "ROLE", "COMPRESSED"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.client:
+        port, count, role, compressed = args.client
+        asyncio.run(run_clients(int(port), int(count), role, compressed == "1"))
+        return
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Benchmark: export throughput (rows/s) and peak RSS per report size.
+
+Runs export_service.write_csv / write_xlsx for 10k, 100k and 500k rows, each
+in a fresh process so ru_maxrss is that run's peak. By default rows come from
+a synthetic unbuffered cursor (no MySQL needed) that produces them lazily,
+like SSDictCursor does; --event-id reads a real event from the configured
+database instead. XLSX is skipped when openpyxl is not installed.
+
+    python bench/export_bench.py
+    python bench/export_bench.py --rows 10000 100000 --formats csv --kind chat
+    python bench/export_bench.py --event-id 12 --kind active_sessions
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import export_service  # noqa: E402
+
+
+def _synthetic_row(n, base=datetime(2024, 5, 1, 18, 0, 0)):
+    at = base + timedelta(seconds=n)
+    return {
+        "user_id": 1000 + n,
+        "user_name": f"Asistente Número {n}",
+        "name": f"Asistente Número {n}",
+        "email": f"asistente{n}@example.com",
+        "phone": f"55{n:08d}",
+        "start_time": at,
+        "last_ping": at + timedelta(minutes=42),
+        "session_minutes": n % 180,
+        "session_seconds": None,
+        "created_at": at,
+        "question_id": n,
+        "status": "read",
+        "question_text": f"¿Pregunta número {n} sobre la transmisión?",
+        "message": f"Saludos desde la sala {n}!",
+    }
+
+
+class _SyntheticCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sent = 0
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchmany(self, size):
+        end = min(self.sent + size, self.rows)
+        batch = [_synthetic_row(n) for n in range(self.sent, end)]
+        self.sent = end
+        return batch
+
+
+class _SyntheticConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, cursorclass=None):
+        return _SyntheticCursor(self.rows)
+
+    def close(self):
+        pass
+
+
+def run_one(kind, export_format, rows, event_id):
+    """Child process: render one export and print its numbers as JSON."""
+    if event_id is None:
+        export_service._open_raw_connection = lambda: _SyntheticConnection(rows)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fd, path = tempfile.mkstemp(prefix="export_bench_", suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        export_service._WRITERS[export_format](path, kind, event_id or 1)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"elapsed": elapsed, "size": size, "baseline_kb": baseline, "peak_kb": peak}))
+
+
+def _has_openpyxl():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    parser.add_argument("--kind", default="active_sessions", choices=sorted(export_service.EXPORT_KINDS))
+    parser.add_argument("--event-id", type=int, default=None, help="read this event from MySQL instead")
+    parser.add_argument("--one", nargs=2, metavar=("FORMAT", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.one:
+        run_one(args.kind, args.one[0], int(args.one[1]), args.event_id)
+        return
+
+    formats = list(args.formats)
+    if "xlsx" in formats and not _has_openpyxl():
+        print("openpyxl not installed: skipping xlsx")
+        formats.remove("xlsx")
+
+    source = f"event {args.event_id}" if args.event_id else "synthetic rows"
+    print(f"kind={args.kind} source={source} chunk={export_service.EXPORT_CHUNK_ROWS} rows")
+    print(f"{'format':<6} {'rows':>8} {'seconds':>8} {'rows/s':>10} {'file MB':>8} {'peak RSS MB':>12} {'over base MB':>13}")
+    for export_format in formats:
+        # With a real event the row count is whatever the event has.
+        for rows in args.rows if args.event_id is None else [0]:
+            cmd = [sys.executable, os.path.abspath(__file__), "--kind", args.kind, "--one", export_format, str(rows)]
+            if args.event_id is not None:
+                cmd += ["--event-id", str(args.event_id)]
+            # app.config prints its banner first; the last stdout line is the result.
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            rate = f"{rows / result['elapsed']:,.0f}" if rows else "-"
+            print(
+                f"{export_format:<6} {rows or '-':>8} {result['elapsed']:>8.2f} {rate:>10} "
+                f"{result['size'] / 1e6:>8.1f} {result['peak_kb'] / 1024:>12.1f} "
+                f"{(result['peak_kb'] - result['baseline_kb']) / 1024:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Microbenchmark: WS fan-out with many concurrent events, index vs full scan.
+
+Opens real WebSocket clients against LiveWebSocket (auth bypassed, see
+tests/ws_helpers.OpenSocket) spread over N events on one process, then
+broadcasts to every event round-robin, twice over the same sockets:
+
+  index  ws._broadcast_local: only the target event's sockets are visited
+         (WEBSOCKET_CLIENTS is keyed by event, role and user).
+  scan   the old lookup: flat per-role pools holding every socket of every
+         event, filtered by event_id on each broadcast.
+
+Both deliver through the same write_framed path, so the difference is the
+target lookup alone. Reports the time spent in the fan-out calls, the
+end-to-end delivery rate for each, and the lookup timed without the writes.
+
+    python bench/fanout_bench.py                       # 20 events x 50 clients
+    python bench/fanout_bench.py --events 20 --clients 200 --messages 100
+    python bench/fanout_bench.py --debug-print         # con los prints de WS_DEBUG
+
+No MySQL/Redis needed (pub/sub publish is skipped by calling the local fan-out).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import tornado.web  # noqa: E402
+import tornado.websocket  # noqa: E402
+
+from app.handlers import ws  # noqa: E402
+from ws_helpers import LiveServer, OpenSocket, connect  # noqa: E402
+
+
+def _flat_pools():
+    """The pre-index layout: role -> set of every socket of every event."""
+    pools = {"viewer": set(), "moderator": set(), "speaker": set(), "reports": set()}
+    for role, client in ws._iter_clients():
+        pools.setdefault(role, set()).add(client)
+    return pools
+
+
+def _broadcast_scan(pools, text, event_id):
+    framed = ws.FramedPayload(text)
+    for role in pools:
+        for client in list(pools[role]):
+            if event_id is not None and getattr(client, "event_id", None) != event_id:
+                continue
+            try:
+                client.write_framed(framed)
+            except tornado.websocket.WebSocketClosedError:
+                pools[role].discard(client)
+
+
+async def _reader(conn, expected, done):
+    received = 0
+    while received < expected:
+        message = await conn.read_message()
+        if message is None:
+            break
+        received += 1
+    done.append(received)
+
+
+def _lookup_us(select, events, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for event_id in range(1, events + 1):
+            select(event_id)
+    return (time.perf_counter() - start) / (repeat * events) * 1e6
+
+
+def _scan_targets(pools, event_id):
+    return [
+        client
+        for role in pools
+        for client in list(pools[role])
+        if getattr(client, "event_id", None) == event_id
+    ]
+
+
+async def _phase(name, fanout, conns, args):
+    done = []
+    readers = [asyncio.ensure_future(_reader(conn, args.messages, done)) for conn in conns]
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    spent = 0.0
+    for _ in range(args.messages):
+        for event_id in range(1, args.events + 1):
+            t0 = time.perf_counter()
+            fanout(event_id)
+            spent += time.perf_counter() - t0
+        # Let the sockets drain between rounds, like between real chat messages.
+        await asyncio.sleep(0)
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    deliveries = sum(done)
+    per_broadcast = spent / (args.messages * args.events) * 1e6
+    print(
+        f"{name:<6} {per_broadcast:>10.1f} us/broadcast  fan-out total {spent * 1000:>8.1f} ms  "
+        f"end-to-end {elapsed:>6.2f} s  {deliveries / elapsed:>10,.0f} deliveries/s  CPU {cpu:.2f} s  "
+        f"({deliveries}/{len(conns) * args.messages} delivered)"
+    )
+    return per_broadcast
+
+
+async def run(args):
+    app = tornado.web.Application([(r"/ws", OpenSocket)])
+    async with LiveServer(app) as port:
+        conns = []
+        for event_id in range(1, args.events + 1):
+            for n in range(args.clients):
+                conns.append(await connect(port, event_id=event_id, user_id=event_id * 100000 + n))
+
+        text = json.dumps({"type": "chat", "user": "bench", "message": "x" * args.size, "time": "00:00"})
+        pools = _flat_pools()
+        print(f"events={args.events} clients/event={args.clients} messages/event={args.messages} size={args.size}B")
+        index = await _phase("index", lambda event_id: ws._broadcast_local(text, event_id=event_id), conns, args)
+        scan = await _phase("scan", lambda event_id: _broadcast_scan(pools, text, event_id), conns, args)
+        print(f"scan / index per broadcast: {scan / index:.2f}x")
+        # Target lookup alone, without the socket writes both paths share.
+        index_lookup = _lookup_us(lambda event_id: ws._iter_clients(event_id=event_id), args.events)
+        scan_lookup = _lookup_us(lambda event_id: _scan_targets(pools, event_id), args.events)
+        print(
+            f"target lookup only: index {index_lookup:.1f} us, scan {scan_lookup:.1f} us "
+            f"({scan_lookup / index_lookup:.1f}x)"
+        )
+        dropped = sum(stats["dropped"] for stats in ws.get_outbound_stats().values())
+        print(f"dropped by slow-consumer policy: {dropped}")
+        print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+        for conn in conns:
+            conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=50, help="clients per event")
+    parser.add_argument("--messages", type=int, default=100, help="broadcasts per event")
+    parser.add_argument("--size", type=int, default=120, help="chat text length in bytes")
+    parser.add_argument("--debug-print", action="store_true", help="enable the per-broadcast WS_DEBUG print")
+    args = parser.parse_args(argv)
+    ws.WS_DEBUG = args.debug_print
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
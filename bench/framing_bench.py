@@ -0,0 +1,156 @@
+"""Benchmark: CPU per fan-out, shared pre-built frames vs per-socket write_message.
+
+Opens --recipients plain (uncompressed) client sockets to LiveWebSocket from a
+separate process, so this process only does the server side. Then broadcasts
+the same payload over the same sockets two ways:
+
+  shared   ws._broadcast_local: encode and frame once (FramedPayload), every
+           socket writes the same bytes through its outbound queue.
+  per-socket  the old loop: client.write_message(text) on each socket, so
+           Tornado re-encodes and re-frames the text for every recipient.
+
+Only the synchronous fan-out call is timed (CPU via process_time); between
+rounds the clients confirm they got every message, so socket buffers never
+pile up.
+
+    python bench/framing_bench.py
+    python bench/framing_bench.py --recipients 2000 --rounds 50 --size 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import tornado.web  # noqa: E402
+import tornado.websocket  # noqa: E402
+
+from app.handlers import ws  # noqa: E402
+from ws_helpers import LiveServer, OpenSocket, connected_sockets  # noqa: E402
+
+EVENT_ID = 1
+
+
+# ---------------------------------------------------------------------------
+# Client process: holds the sockets and reports every completed round.
+# ---------------------------------------------------------------------------
+
+async def run_clients(port, count):
+    url = f"ws://127.0.0.1:{port}/ws?role=viewer&event_id={EVENT_ID}&user_id="
+    conns = []
+    # Small batches: the listening socket's backlog is short.
+    for start in range(0, count, 100):
+        batch = range(start, min(start + 100, count))
+        conns.extend(await asyncio.gather(*(tornado.websocket.websocket_connect(url + str(n)) for n in batch)))
+    state = {"received": 0}
+
+    async def reader(conn):
+        while await conn.read_message() is not None:
+            state["received"] += 1
+            if state["received"] % count == 0:
+                print(f"ROUND {state['received'] // count}", flush=True)
+
+    await asyncio.gather(*(reader(conn) for conn in conns))
+
+
+# ---------------------------------------------------------------------------
+# Server side (this process).
+# ---------------------------------------------------------------------------
+
+def _fanout_shared(text):
+    ws._broadcast_local(text, event_id=EVENT_ID)
+
+
+def _fanout_per_socket(text):
+    for _role, client in ws._iter_clients(event_id=EVENT_ID):
+        try:
+            client.write_message(text)
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+
+async def _measure(fanout, text, rounds, clients, done_rounds):
+    cpu_total = 0.0
+    wall_total = 0.0
+    for _ in range(rounds):
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        fanout(text)
+        wall_total += time.perf_counter() - wall_start
+        cpu_total += time.process_time() - cpu_start
+        done_rounds[0] += 1
+        # Wait for every recipient before the next round.
+        while True:
+            line = (await clients.stdout.readline()).decode().strip()
+            if not line:
+                raise RuntimeError("client process exited")
+            if line == f"ROUND {done_rounds[0]}":
+                break
+    return cpu_total / rounds, wall_total / rounds
+
+
+async def run(args):
+    text = json.dumps({"type": "chat", "user_id": 1, "user": "bench", "message": "x" * args.size, "timestamp": "00:00"})
+    app = tornado.web.Application([(r"/ws", OpenSocket)])
+    async with LiveServer(app) as port:
+        clients = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--client", str(port), str(args.recipients),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            while len(connected_sockets(EVENT_ID)) < args.recipients:
+                if clients.returncode is not None:
+                    raise RuntimeError("client process exited while connecting")
+                await asyncio.sleep(0.05)
+
+            done_rounds = [0]
+            results = {}
+            # One warm-up round per path first, so neither is measured cold.
+            for name, fanout in (("shared", _fanout_shared), ("per-socket", _fanout_per_socket)):
+                await _measure(fanout, text, 1, clients, done_rounds)
+            for name, fanout in (("shared", _fanout_shared), ("per-socket", _fanout_per_socket)):
+                results[name] = await _measure(fanout, text, args.rounds, clients, done_rounds)
+        finally:
+            clients.terminate()
+            await clients.wait()
+
+    scale = 10000 / args.recipients
+    print(f"recipients={args.recipients} rounds={args.rounds} payload={len(text.encode())}B (plain sockets)")
+    print(f"{'path':<11} {'CPU ms/fan-out':>15} {'CPU ms per 10k':>15} {'wall ms/fan-out':>16}")
+    for name, (cpu, wall) in results.items():
+        print(f"{name:<11} {cpu * 1000:>15.2f} {cpu * scale * 1000:>15.2f} {wall * 1000:>16.2f}")
+    shared, per_socket = results["shared"][0], results["per-socket"][0]
+    if shared:
+        print(f"per-socket / shared CPU: {per_socket / shared:.2f}x")
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20, help="fan-outs measured per path")
+    parser.add_argument("--size", type=int, default=200, help="chat text length in bytes")
+    parser.add_argument("--client", nargs=2, type=int, metavar=("PORT", "COUNT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # Each socket is one descriptor on each side; ask for the hard limit.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if args.client:
+        asyncio.run(run_clients(*args.client))
+        return
+    if args.recipients + 100 > hard:
+        parser.error(f"--recipients {args.recipients} needs more file descriptors than the limit ({hard})")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
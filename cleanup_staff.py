@@ -76,6 +76,15 @@ def cleanup_duplicates():
                     # Eliminar el usuario duplicado
                     cursor.execute("DELETE FROM users WHERE id=%s", (rid,))
                 
+            # Los reportes exportados en caché ya no reflejan estos usuarios.
+            try:
+                cursor.execute(
+                    "INSERT INTO data_revisions (name, revision) VALUES ('users', 1) "
+                    "ON DUPLICATE KEY UPDATE revision = revision + 1"
+                )
+            except pymysql.err.ProgrammingError:
+                print("Aviso: falta la tabla data_revisions (corre `python migrate.py`)")
+
             print("¡Limpieza completada!")
     except Exception as e:
         print(f"Error durante la limpieza: {e}")
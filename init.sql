@@ -15,7 +15,8 @@ CREATE TABLE IF NOT EXISTS users (
     qa_blocked TINYINT(1) DEFAULT 0,
     banned TINYINT(1) DEFAULT 0,
     event_id INT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_users_event_role (event_id, role)
 );
 
 -- Events table
@@ -57,6 +58,7 @@ CREATE TABLE IF NOT EXISTS questions (
     status ENUM('pending', 'approved', 'rejected', 'read') NOT NULL DEFAULT 'pending',
     event_id INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_questions_event_status_created (event_id, status, created_at),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -67,6 +69,7 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     message TEXT NOT NULL,
     event_id INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_chat_event_id (event_id, id),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -79,9 +82,29 @@ CREATE TABLE IF NOT EXISTS session_analytics (
     last_ping TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     total_minutes INT DEFAULT 0,
     UNIQUE KEY (user_id, event_id),
+    INDEX idx_analytics_event_ping (event_id, last_ping),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Revision counters bumped by user/staff edits (export versions, see migrate.py v4)
+CREATE TABLE IF NOT EXISTS data_revisions (
+    name VARCHAR(32) PRIMARY KEY,
+    revision BIGINT NOT NULL DEFAULT 0
+);
+
+-- Schema version (managed by migrate.py; this file already matches version 4)
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO schema_version (version, description) VALUES
+    (1, 'questions.status accepts ''read'''),
+    (2, 'events description/header colors/timezone columns'),
+    (3, 'per-event indexes for chat, questions, analytics and users'),
+    (4, 'data_revisions counters for export versions');
+
 -- Optional settings table (exists in current production DB; not required by app code today)
 CREATE TABLE IF NOT EXISTS settings (
     setting_key VARCHAR(255) PRIMARY KEY,
@@ -0,0 +1,55 @@
+"""Apply schema migrations (replaces fix_db.py).
+
+    python migrate.py            # aplica las migraciones pendientes
+    python migrate.py --status   # muestra versión actual y pendientes
+    python migrate.py --check    # EXPLAIN de las consultas calientes; exit 1 si alguna hace full scan
+"""
+import argparse
+import sys
+
+from app import schema
+from app.db import create_db_connection
+
+
+def show_status():
+    with create_db_connection() as conn:
+        with conn.cursor() as cursor:
+            done = schema.applied_versions(cursor)
+    for version, description, _ in schema.MIGRATIONS:
+        mark = "x" if version in done else " "
+        print(f"[{mark}] {version}: {description}")
+
+
+def check_hot_queries(event_id):
+    failures = schema.explain_hot_queries(event_id)
+    for failure in failures:
+        print(f"FAIL  {failure}")
+    if failures:
+        return 1
+    print("OK: ninguna consulta caliente hace full scan.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check", action="store_true", help="EXPLAIN the hot queries and fail on full scans")
+    parser.add_argument("--event-id", type=int, default=1, help="event id bound into the EXPLAINed queries")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        show_status()
+        return 0
+    if args.check:
+        return check_hot_queries(args.event_id)
+
+    applied = schema.apply_migrations()
+    if applied:
+        print(f"Esquema actualizado: {', '.join(str(v) for v in applied)} (versión {schema.LATEST_VERSION}).")
+    else:
+        print(f"El esquema ya está en la versión {schema.LATEST_VERSION}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
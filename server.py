@@ -2,9 +2,26 @@ import tornado.ioloop
 
 from tornado.ioloop import PeriodicCallback
 import os
+import signal
 
-from app import make_app
-from app.handlers.ws import push_reports_snapshot
+from app import make_app, schema
+from app.config import PING_FLUSH_INTERVAL_MS, REPORTS_SNAPSHOT_INTERVAL_MS, WS_LEASE_CHECK_MS
+from app.db import init_db_pool, run_blocking
+from app.handlers.ws import flush_heartbeats, revalidate_leases, schedule_reports_snapshot
+from app.services import chat_service, export_service, pubsub_service, questions_service
+
+
+async def shutdown(server):
+    # Stop taking new connections, write out what is still queued, then exit.
+    print("Shutting down: flushing pending writes...")
+    server.stop()
+    await chat_service.drain_chat_queue()
+    await flush_heartbeats()
+    await run_blocking(questions_service.drain_question_writes, 10)
+    # Invalidations/kicks queued for the other nodes.
+    await run_blocking(pubsub_service.drain)
+    export_service.shutdown_export_pool()
+    tornado.ioloop.IOLoop.current().stop()
 
 
 if __name__ == "__main__":
@@ -16,6 +33,35 @@ if __name__ == "__main__":
     server.listen(port)
     print(f"Tornado live platform running on http://localhost:{port}")
 
-    # Keep reports refreshed even if pings are sparse.
-    PeriodicCallback(push_reports_snapshot, 5000).start()
-    tornado.ioloop.IOLoop.current().start()
\ No newline at end of file
+    # Warm the MySQL pool so the first requests don't pay for connecting.
+    init_db_pool()
+
+    # Read which columns/indexes exist once, instead of probing on every query.
+    try:
+        schema.load_capabilities()
+    except Exception as e:
+        print(f"[SCHEMA] ! could not read schema: {e}")
+
+    # Cross-process fan-out (chat, Q&A, kicks) over Redis pub/sub.
+    pubsub_service.start()
+
+    # Keep reports refreshed even if pings are sparse. This goes through the same
+    # scheduler as joins/pings, so it merges with any rebuild already pending.
+    PeriodicCallback(schedule_reports_snapshot, REPORTS_SNAPSHOT_INTERVAL_MS).start()
+
+    # Revalidate the sessions behind every open socket in one Redis round trip.
+    PeriodicCallback(revalidate_leases, WS_LEASE_CHECK_MS).start()
+
+    # Viewer heartbeats are buffered and written in bulk.
+    PeriodicCallback(flush_heartbeats, PING_FLUSH_INTERVAL_MS).start()
+
+    # Chat messages are persisted in batches behind the broadcast.
+    chat_service.start_chat_writer()
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            io_loop.asyncio_loop.add_signal_handler(sig, lambda: io_loop.spawn_callback(shutdown, server))
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: no asyncio signal handlers; queued chats flush on the next tick only.
+    io_loop.start()
\ No newline at end of file
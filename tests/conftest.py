@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los tests importan `app.*` y los helpers de este directorio.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
@@ -0,0 +1,51 @@
+"""One node for test_pubsub_multiprocess: `python tests/pubsub_node.py`.
+
+Serves OpenSocket on /ws plus two hooks that act like the real handlers on
+this node: POST /chat (broadcast_chat) and POST /kick (kick_all_from_event).
+Prints `READY <port>` once listening.
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Replies go to the real stdout; the app's own prints (some from background
+# threads) go to stderr so they can't interleave with a reply line.
+REPLIES = sys.stdout
+sys.stdout = sys.stderr
+
+import tornado.httpserver  # noqa: E402
+import tornado.web  # noqa: E402
+from tornado.testing import bind_unused_port  # noqa: E402
+
+from app.handlers import ws  # noqa: E402
+from app.services import pubsub_service  # noqa: E402
+from ws_helpers import OpenSocket  # noqa: E402
+
+
+class ChatHook(tornado.web.RequestHandler):
+    def post(self):
+        body = json.loads(self.request.body)
+        ws.broadcast_chat({"type": "chat", "message": body["message"], "user": "node"}, event_id=body["event_id"])
+
+
+class KickHook(tornado.web.RequestHandler):
+    def post(self):
+        ws.kick_all_from_event(json.loads(self.request.body)["event_id"])
+
+
+async def main():
+    app = tornado.web.Application([(r"/ws", OpenSocket), (r"/chat", ChatHook), (r"/kick", KickHook)])
+    sock, port = bind_unused_port()
+    tornado.httpserver.HTTPServer(app).add_sockets([sock])
+    pubsub_service.start()
+    REPLIES.write(f"READY {port}\n")
+    REPLIES.flush()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
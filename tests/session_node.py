@@ -0,0 +1,48 @@
+"""A process that owns its own session L1 cache, driven over stdin/stdout.
+
+Commands (one per line, one JSON reply per line):
+    remember <sid>   cache <sid> as if it had just been read from Redis
+    create           create_session() (in-process only while Redis is down)
+    get <sid>        get_session(<sid>)
+    cached <sid>     get_cached_session(<sid>)
+    delete <sid>     delete_session(<sid>)
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Replies go to the real stdout; the app's own prints (some from background
+# threads) go to stderr so they can't interleave with a reply line.
+REPLIES = sys.stdout
+sys.stdout = sys.stderr
+
+from app.services import session_service  # noqa: E402
+
+
+def main():
+    REPLIES.write(json.dumps("ready") + "\n")
+    REPLIES.flush()
+    for line in sys.stdin:
+        command, _, sid = line.strip().partition(" ")
+        if command == "remember":
+            session_service._cache_put(sid, {"user_id": 1, "user_name": "Ana"})
+            reply = True
+        elif command == "create":
+            reply = session_service.create_session({"user_id": 2, "user_name": "Luis"})
+        elif command == "get":
+            reply = session_service.get_session(sid)
+        elif command == "cached":
+            reply = session_service.get_cached_session(sid)
+        elif command == "delete":
+            session_service.delete_session(sid)
+            reply = True
+        else:
+            reply = {"error": command}
+        REPLIES.write(json.dumps(reply) + "\n")
+        REPLIES.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""/api/admin/stats: superadmin only, one section per subsystem of this process."""
+import asyncio
+import json
+
+import tornado.httpclient
+import tornado.web
+
+from app.handlers import admin, ws
+from ws_helpers import LiveServer
+
+
+def _as(role):
+    class Handler(admin.APIStatsHandler):
+        async def prepare(self):
+            pass
+
+        def get_current_user(self):
+            return 1
+
+        def current_user_role(self):
+            return role
+
+    return Handler
+
+
+async def _get(role):
+    app = tornado.web.Application([(r"/api/admin/stats", _as(role))])
+    async with LiveServer(app) as port:
+        client = tornado.httpclient.AsyncHTTPClient()
+        return await client.fetch(f"http://127.0.0.1:{port}/api/admin/stats", raise_error=False)
+
+
+def test_stats_are_superadmin_only():
+    response = asyncio.run(_get("admin"))
+    assert response.code == 403
+
+
+def test_stats_sections(monkeypatch):
+    monkeypatch.setitem(ws.OUTBOUND_EVICTIONS, 7, {"dropped": 2, "disconnected": 1})
+    response = asyncio.run(_get("superadmin"))
+    assert response.code == 200
+    body = json.loads(response.body)
+    assert {"rebuilds", "skipped", "pending"} <= set(body["ws_snapshots"])
+    assert body["ws_outbound"]["7"] == {"dropped": 2, "disconnected": 1}
+    assert {"size", "in_use", "utilization", "avg_wait_ms", "timeouts"} <= set(body["db_pool"])
+    assert {"dropped_rows", "pending", "current_lag_ms"} <= set(body["chat_writes"])
@@ -0,0 +1,118 @@
+"""Chat write-behind: transient errors keep the batch, bad rows are dropped."""
+import asyncio
+import json
+
+import pymysql
+import pytest
+import tornado.web
+
+from app.handlers import ws
+from app.services import chat_service, users_service
+from ws_helpers import LiveServer, OpenSocket, connect
+
+
+class FakeDB:
+    def __init__(self):
+        self.rows = []
+        self.down = False
+        self.bad_messages = set()
+
+    def connect(self):
+        db = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def _check(self, params):
+                if db.down:
+                    raise pymysql.err.OperationalError(2003, "Can't connect")
+                if params[1] in db.bad_messages:
+                    raise pymysql.err.DataError(1406, "Data too long for column 'message'")
+
+            def execute(self, sql, params):
+                self._check(params)
+                db.rows.append(params[1])
+
+            def executemany(self, sql, seq):
+                seq = list(seq)
+                for params in seq:
+                    self._check(params)
+                db.rows.extend(params[1] for params in seq)
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return Cursor()
+
+        return Conn()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(chat_service, "create_db_connection", fake.connect)
+    chat_service._PENDING.clear()
+    chat_service._IN_FLIGHT.clear()
+    yield fake
+    chat_service._PENDING.clear()
+    chat_service._IN_FLIGHT.clear()
+
+
+def _queue(*messages):
+    for text in messages:
+        assert chat_service.add_chat_message(1, text, event_id=9, user_name="Ana")
+
+
+def test_unreachable_mysql_keeps_the_batch(db):
+    _queue("a", "b")
+    db.down = True
+    assert chat_service.flush_pending_chats() == 0
+    assert [row["message"] for row in chat_service._PENDING] == ["a", "b"]
+
+    db.down = False
+    assert chat_service.flush_pending_chats() == 2
+    assert db.rows == ["a", "b"]
+    assert not chat_service._PENDING
+
+
+def test_rejected_row_is_dropped_and_the_rest_written(db):
+    dropped = chat_service.CHAT_WRITE_STATS["dropped_rows"]
+    db.bad_messages.add("bad")
+    _queue("a", "bad", "c")
+
+    chat_service.flush_pending_chats()
+
+    assert db.rows == ["a", "c"]
+    assert not chat_service._PENDING and not chat_service._IN_FLIGHT
+    assert chat_service.CHAT_WRITE_STATS["dropped_rows"] == dropped + 1
+
+    _queue("d")
+    assert chat_service.flush_pending_chats() == 1
+    assert db.rows == ["a", "c", "d"]
+
+
+
+def test_overlong_message_is_refused_before_queueing(db, monkeypatch):
+    monkeypatch.setattr(users_service, "get_cached_flag", lambda user_id, field: False)
+
+    async def scenario():
+        app = tornado.web.Application([(r"/ws", OpenSocket)])
+        async with LiveServer(app) as port:
+            viewer = await connect(port, role="viewer", event_id=9, user_id=1)
+            viewer.write_message(json.dumps({"type": "chat", "message": "x" * (ws.CHAT_MESSAGE_MAX_CHARS + 1)}))
+            reply = json.loads(await viewer.read_message())
+            viewer.close()
+            return reply
+
+    reply = asyncio.run(scenario())
+    assert reply["type"] == "error"
+    assert not chat_service._PENDING
@@ -0,0 +1,78 @@
+"""Chat round trips stay flat while a slow reports query is running.
+
+The reports snapshot runs its MySQL queries through run_blocking; here they
+are replaced by a 1 s sleep. If any of that ran on the IOLoop, chat messages
+sent meanwhile would wait for it.
+"""
+import asyncio
+import json
+import time
+
+import tornado.web
+
+from app.handlers import ws
+from app.services import analytics_service, chat_service, users_service
+from ws_helpers import LiveServer, OpenSocket, connect
+
+SLOW_QUERY_SECONDS = 1.0
+EVENT_ID = 300
+
+
+def _slow_sessions(*args, **kwargs):
+    time.sleep(SLOW_QUERY_SECONDS)
+    return []
+
+
+def _slow_metrics(*args, **kwargs):
+    time.sleep(SLOW_QUERY_SECONDS)
+    return {"total_registered_users": 0, "live_watchers_count": 0, "total_minutes_consumed": 0}
+
+
+async def _chat_round_trips(conn, count, spacing):
+    latencies = []
+    for n in range(count):
+        text = f"latency {n} {time.monotonic()}"
+        start = time.perf_counter()
+        conn.write_message(json.dumps({"type": "chat", "message": text}))
+        while True:
+            message = json.loads(await conn.read_message())
+            if message.get("message") == text:
+                break
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(spacing)
+    return latencies
+
+
+def test_chat_latency_flat_during_slow_reports_query(monkeypatch):
+    monkeypatch.setattr(analytics_service, "list_active_sessions_for_report", _slow_sessions)
+    monkeypatch.setattr(analytics_service, "get_report_metrics", _slow_metrics)
+    monkeypatch.setattr(users_service, "get_cached_flag", lambda user_id, field: False)
+
+    async def scenario():
+        app = tornado.web.Application([(r"/ws", OpenSocket)])
+        async with LiveServer(app) as port:
+            viewer = await connect(port, role="viewer", event_id=EVENT_ID, user_id=1)
+            reports = await connect(port, role="reports", event_id=EVENT_ID, user_id=2)
+
+            baseline = await _chat_round_trips(viewer, 20, 0.01)
+
+            snapshot = asyncio.ensure_future(ws.push_reports_snapshot(event_id=EVENT_ID))
+            await asyncio.sleep(0.05)
+            during = await _chat_round_trips(viewer, 20, 0.025)
+            # The slow queries really overlapped the chat traffic.
+            assert not snapshot.done()
+            await snapshot
+
+            viewer.close()
+            reports.close()
+            return baseline, during
+
+    try:
+        baseline, during = asyncio.run(scenario())
+    finally:
+        ws._SESSION_SNAPSHOTS.pop(EVENT_ID, None)
+        chat_service._PENDING.clear()
+
+    rtts = f"chat RTT max: baseline {max(baseline) * 1000:.1f} ms, during slow query {max(during) * 1000:.1f} ms"
+    assert max(during) < SLOW_QUERY_SECONDS / 5, rtts
+    assert max(during) < max(baseline) + 0.1, rtts
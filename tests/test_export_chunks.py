@@ -0,0 +1,70 @@
+"""Export reads use their own connection and never touch the pool."""
+from app.services import export_service
+
+
+class FakeSSCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.sql = sql
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        # pymysql would read every remaining row here.
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_obj = FakeSSCursor(rows)
+        self.closed = False
+
+    def cursor(self, cursorclass=None):
+        return self.cursor_obj
+
+    def close(self):
+        self.closed = True
+
+
+def _rows(n):
+    return [{"created_at": None, "user_id": i, "user_name": f"u{i}", "message": "hola"} for i in range(n)]
+
+
+def test_chunks_read_from_a_dedicated_connection(monkeypatch):
+    conn = FakeConnection(_rows(5))
+    monkeypatch.setattr(export_service, "_open_raw_connection", lambda: conn)
+    monkeypatch.setattr(export_service, "create_db_connection", lambda: (_ for _ in ()).throw(AssertionError("pooled")))
+
+    chunks = list(export_service.iter_export_chunks("chat", 1, chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0][1] == [None, 1, "u1", "hola"]
+    assert conn.closed
+
+
+def test_abandoned_export_closes_connection_without_draining(monkeypatch):
+    conn = FakeConnection(_rows(10))
+    monkeypatch.setattr(export_service, "_open_raw_connection", lambda: conn)
+
+    chunks = export_service.iter_export_chunks("chat", 1, chunk_size=2)
+    next(chunks)
+    chunks.close()
+
+    assert conn.closed
+    assert not conn.cursor_obj.closed
+
+
+def test_write_csv_spools_every_row(monkeypatch, tmp_path):
+    monkeypatch.setattr(export_service, "_open_raw_connection", lambda: FakeConnection(_rows(3)))
+    path = tmp_path / "chat.csv"
+
+    export_service.write_csv(str(path), "chat", 1)
+
+    lines = path.read_text(encoding="utf-8-sig").splitlines()
+    assert lines[0] == "created_at,user_id,user_name,message"
+    assert len(lines) == 4
@@ -0,0 +1,130 @@
+"""Finishing an export job only prunes versions whose data is older."""
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from app.services import export_service
+
+OLD, DONE, NEWER, RUNNING = "0" * 12, "a" * 12, "b" * 12, "c" * 12
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(export_service, "EXPORT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(export_service, "_JOBS", {})
+    monkeypatch.setattr(export_service, "_RUNNING", {})
+    return tmp_path
+
+
+def _artifact(version, observed_at):
+    name = export_service.artifact_name(5, "chat", "csv", version)
+    path = export_service.artifact_path(name)
+    with open(path, "w") as f:
+        f.write(version)
+    os.utime(path, (observed_at, observed_at))
+    return name
+
+
+def _done():
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+def test_finish_keeps_newer_and_running_versions(cache_dir):
+    old = _artifact(OLD, 1000)
+    done = _artifact(DONE, 2000)
+    newer = _artifact(NEWER, 3000)
+    # Still being written by a job of this process (e.g. a re-render).
+    running = _artifact(RUNNING, 1500)
+    export_service._RUNNING[running] = object()
+
+    export_service._finish_job(done, _done())
+
+    assert sorted(os.listdir(cache_dir)) == sorted([done, newer, running])
+    assert old not in os.listdir(cache_dir)
+
+
+def test_late_finish_of_older_version_removes_nothing_newer(cache_dir):
+    newer = _artifact(NEWER, 3000)
+    late = _artifact(DONE, 2000)
+
+    export_service._finish_job(late, _done())
+
+    assert sorted(os.listdir(cache_dir)) == sorted([late, newer])
+
+
+def test_render_stamps_observation_time(cache_dir, monkeypatch):
+    def fake_writer(path, kind, event_id, event_tz=None):
+        with open(path, "w") as f:
+            f.write("x")
+
+    monkeypatch.setitem(export_service._WRITERS, "csv", fake_writer)
+    path = export_service.artifact_path(export_service.artifact_name(5, "chat", "csv", DONE))
+
+    export_service.render_export(path, "chat", "csv", 5, None, 1234.0)
+
+    assert os.path.getmtime(path) == 1234.0
+
+
+class _RevisionDB:
+    """Counts stay put; only the users revision moves (a rename, a staff change)."""
+
+    def __init__(self):
+        self.revision = 1
+
+    def connect(self):
+        db = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if sql.startswith("INSERT INTO data_revisions"):
+                    db.revision += 1
+                self.last = sql
+                return 1
+
+            def fetchone(self):
+                if "data_revisions" in self.last:
+                    return {"revision": db.revision}
+                return {"n": 10, "a": 99, "b": None}
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+        return Conn()
+
+
+def test_staff_change_moves_export_version(monkeypatch):
+    from app import schema
+    from app.services import staff_service
+
+    db = _RevisionDB()
+    monkeypatch.setattr(schema, "has_column", lambda table, column: True)
+    monkeypatch.setattr(export_service, "create_db_connection", db.connect)
+    monkeypatch.setattr(staff_service, "create_db_connection", db.connect)
+    monkeypatch.setattr(staff_service, "invalidate_event_role", lambda user_id, event_id: None)
+
+    before = {kind: export_service.export_version(kind, 5) for kind in export_service.EXPORT_KINDS}
+    assert before == {kind: export_service.export_version(kind, 5) for kind in export_service.EXPORT_KINDS}
+
+    staff_service.remove_staff(user_id=3, event_id=5)
+
+    after = {kind: export_service.export_version(kind, 5) for kind in export_service.EXPORT_KINDS}
+    assert all(before[kind] != after[kind] for kind in before)
@@ -0,0 +1,61 @@
+"""Moderation flags: eager cross-process updates, TTL-bounded staleness."""
+import pytest
+
+from app.services import users_service
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(users_service, "time", fake)
+    users_service._STATUS_CACHE.clear()
+    yield fake
+    users_service._STATUS_CACHE.clear()
+
+
+def test_remote_change_applies_immediately(clock):
+    users_service._cache_status(10, {"chat_blocked": 0, "qa_blocked": 0, "banned": 0})
+    assert users_service.get_cached_flag(10, "chat_blocked") is False
+
+    users_service._on_remote_status(users_service.STATUS_CHANNEL, {"user_id": 10, "field": "chat_blocked", "value": True})
+    assert users_service.get_cached_flag(10, "chat_blocked") is True
+    assert users_service.get_cached_flag(10, "banned") is False
+
+
+def test_lost_invalidation_is_bounded_by_ttl(clock):
+    users_service._cache_status(11, {"chat_blocked": 0, "qa_blocked": 0, "banned": 0})
+
+    # Banned on another node; the pub/sub message never arrives.
+    clock.now += users_service.MODERATION_CACHE_TTL - 1
+    assert users_service.get_cached_flag(11, "banned") is False
+
+    clock.now += 2
+    assert users_service.get_cached_flag(11, "banned") is None  # caller must reload
+
+
+def test_patch_keeps_original_fetch_time(clock):
+    users_service._cache_status(12, {"chat_blocked": 0, "qa_blocked": 0, "banned": 0})
+    clock.now += users_service.MODERATION_CACHE_TTL - 1
+    users_service._on_remote_status(users_service.STATUS_CHANNEL, {"user_id": 12, "field": "qa_blocked", "value": True})
+
+    # A patch doesn't make the other (possibly stale) flags trusted for longer.
+    clock.now += 2
+    assert users_service.get_cached_flag(12, "chat_blocked") is None
+
+
+def test_batch_lookup_serves_fresh_entries_from_cache(clock, monkeypatch):
+    users_service._cache_status(13, {"banned": 1})
+
+    def no_db():
+        raise AssertionError("cached statuses must not query MySQL")
+
+    monkeypatch.setattr(users_service, "create_db_connection", no_db)
+    assert users_service.get_statuses([13]) == {13: {"banned": 1}}
@@ -0,0 +1,69 @@
+"""A ping batch swapped out by a running flush can't land after the inactive mark,
+and closing a session doesn't wait for that flush's I/O."""
+import contextlib
+import threading
+
+from app.services import analytics_service, presence_service
+
+
+class RecordingDB:
+    """Stands in for MySQL: records statements in order; the first upsert blocks."""
+
+    def __init__(self):
+        self.log = []
+        self.upsert_started = threading.Event()
+        self.release_upsert = threading.Event()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    @contextlib.contextmanager
+    def cursor(self):
+        yield self
+
+    def executemany(self, sql, rows):
+        if sql.startswith("UPDATE"):
+            for row in rows:
+                self.execute(sql, row)
+            return
+        if not self.upsert_started.is_set():
+            self.upsert_started.set()
+            self.release_upsert.wait(5)
+        with self._lock:
+            self.log.append(("upsert", [(row[0], row[1]) for row in rows]))
+
+    def execute(self, sql, params):
+        with self._lock:
+            self.log.append(("inactive", params[0]))
+
+
+def test_in_flight_flush_cannot_revive_closed_session(monkeypatch):
+    db = RecordingDB()
+    presence = []
+    monkeypatch.setattr(analytics_service, "create_db_connection", db.connection)
+    monkeypatch.setattr(presence_service, "touch_many", lambda beats, **kw: presence.append(("touch", beats)))
+    monkeypatch.setattr(presence_service, "leave", lambda event_id, user_id: presence.append(("leave", user_id)))
+    analytics_service._PENDING_PINGS.clear()
+
+    analytics_service.record_ping(7, event_id=1)
+    analytics_service.record_ping(8, event_id=1)
+    flusher = threading.Thread(target=analytics_service.flush_pings)
+    flusher.start()
+    assert db.upsert_started.wait(5)  # the pings of 7 and 8 are swapped out and being written
+
+    # Doesn't wait for the blocked flush.
+    closer = threading.Thread(target=analytics_service.mark_session_inactive, args=(7,), kwargs={"event_id": 1})
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert db.log == [("inactive", 7)]
+
+    db.release_upsert.set()
+    flusher.join(5)
+
+    # The late upsert is followed by the mark again; 7 gets no heartbeat.
+    assert db.log == [("inactive", 7), ("upsert", [(7, 1), (8, 1)]), ("inactive", 7)]
+    assert [kind for kind, _ in presence] == ["leave", "touch"]
+    assert list(presence[1][1][1]) == [8]
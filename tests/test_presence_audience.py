@@ -0,0 +1,65 @@
+"""Audience cache invalidation on global role changes, and leave() without an event."""
+import pytest
+
+from app.services import presence_service, staff_service
+
+
+class FakePipeline:
+    def __init__(self, log):
+        self.log = log
+
+    def zrem(self, key, member):
+        self.log.append((key, member))
+
+    def execute(self):
+        return []
+
+
+class FakeRedis:
+    def __init__(self):
+        self.removed = []
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self.removed)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(presence_service, "_get_client", lambda: fake)
+    presence_service._AUDIENCE.clear()
+    yield fake
+    presence_service._AUDIENCE.clear()
+
+
+def test_global_role_change_forgets_every_event(redis, monkeypatch):
+    monkeypatch.setattr(staff_service.pubsub_service, "publish", lambda channel, data: True)
+    presence_service._AUDIENCE[(1, 50)] = (True, 0.0)
+    presence_service._AUDIENCE[(2, 50)] = (True, 0.0)
+    presence_service._AUDIENCE[(1, 51)] = (True, 0.0)
+
+    staff_service.invalidate_user_roles(50)
+
+    assert set(presence_service._AUDIENCE) == {(1, 51)}
+    assert sorted(redis.removed) == [("presence:event:1", "50"), ("presence:event:2", "50")]
+
+
+def test_remote_global_invalidation(redis):
+    presence_service._AUDIENCE[(3, 60)] = (True, 0.0)
+    staff_service._on_remote_invalidate(staff_service.INVALIDATE_CHANNEL, {"user_id": 60, "global": True})
+    assert (3, 60) not in presence_service._AUDIENCE
+
+
+def test_leave_without_event_resolves_the_users_events(redis, monkeypatch):
+    monkeypatch.setattr(presence_service, "_user_event_ids", lambda user_id: [4, 9])
+    assert presence_service.leave(None, 70)
+    assert redis.removed == [("presence:event:4", "70"), ("presence:event:9", "70")]
+
+
+def test_leave_with_event_only_touches_that_event(redis, monkeypatch):
+    def no_db(user_id):
+        raise AssertionError("event is known, no lookup needed")
+
+    monkeypatch.setattr(presence_service, "_user_event_ids", no_db)
+    assert presence_service.leave(5, 71)
+    assert redis.removed == [("presence:event:5", "71")]
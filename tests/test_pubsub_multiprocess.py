@@ -0,0 +1,104 @@
+"""Two server processes sharing Redis: node A's fan-out reaches node B's sockets.
+
+Skipped when Redis (REDIS_HOST/REDIS_PORT) is not reachable.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.config import REDIS_CONFIG
+
+redis = pytest.importorskip("redis")
+
+NODE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pubsub_node.py")
+
+
+def _redis_reachable():
+    try:
+        redis.Redis(host=REDIS_CONFIG["host"], port=REDIS_CONFIG["port"], socket_connect_timeout=0.5).ping()
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _redis_reachable(), reason="Redis not reachable")
+
+
+def _start_node():
+    proc = subprocess.Popen(
+        [sys.executable, NODE_SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        line = proc.stdout.readline()
+        if line.startswith("READY "):
+            return proc, int(line.split()[1])
+        if not line and proc.poll() is not None:
+            break
+    proc.kill()
+    raise RuntimeError("node did not start")
+
+
+@pytest.fixture
+def nodes():
+    started = [_start_node(), _start_node()]
+    yield [port for _proc, port in started]
+    for proc, _port in started:
+        proc.kill()
+        proc.wait()
+
+
+async def _post(port, path, body):
+    from tornado.httpclient import AsyncHTTPClient
+
+    await AsyncHTTPClient().fetch(f"http://127.0.0.1:{port}{path}", method="POST", body=json.dumps(body))
+
+
+async def _read_until(conn, predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            raw = await asyncio.wait_for(conn.read_message(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            return None
+        if raw is None:
+            return None
+        message = json.loads(raw)
+        if predicate(message):
+            return message
+    return None
+
+
+def test_chat_and_kick_reach_the_other_node(nodes):
+    import tornado.websocket
+
+    port_a, port_b = nodes
+
+    async def scenario():
+        conn = await tornado.websocket.websocket_connect(f"ws://127.0.0.1:{port_b}/ws?event_id=42&user_id=9")
+
+        # The listeners subscribe in the background: resend until the first one lands.
+        delivered = None
+        for attempt in range(20):
+            await _post(port_a, "/chat", {"event_id": 42, "message": f"hola {attempt}"})
+            delivered = await _read_until(conn, lambda m: m.get("type") == "chat", timeout=0.5)
+            if delivered:
+                break
+        assert delivered is not None, "chat published on node A never reached node B"
+
+        await _post(port_a, "/chat", {"event_id": 42, "message": "segundo"})
+        assert await _read_until(conn, lambda m: m.get("message") == "segundo", timeout=5)
+
+        # Other events on node B are not targeted.
+        other = await tornado.websocket.websocket_connect(f"ws://127.0.0.1:{port_b}/ws?event_id=43&user_id=10")
+        await _post(port_a, "/kick", {"event_id": 42})
+        assert await _read_until(conn, lambda m: m.get("type") == "event_closed", timeout=5)
+        assert await _read_until(other, lambda m: True, timeout=0.5) is None
+        other.close()
+
+    asyncio.run(scenario())
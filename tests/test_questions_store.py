@@ -0,0 +1,177 @@
+"""In-memory question store: changes that arrive while an event is loading,
+write-behind retries while MySQL is down, and the bounded read queue."""
+import threading
+
+import pymysql
+import pytest
+
+from app.services import questions_service
+
+EVENT_ID = 77
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.db.failures:
+            raise self.db.failures.pop(0)
+        self.db.executed.append((sql, params))
+
+
+class FakeDB:
+    def __init__(self):
+        self.failures = []
+        self.executed = []
+
+    def connect(self):
+        db = self
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return FakeCursor(db)
+
+        return Conn()
+
+
+def _question(qid):
+    return {"id": qid, "user_name": "Ana", "question_text": f"q{qid}", "created_at": None}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    published = []
+    monkeypatch.setattr(questions_service.pubsub_service, "publish", lambda ch, data: published.append((ch, data)))
+    monkeypatch.setattr(questions_service, "QUESTIONS_WRITE_RETRY_SECONDS", 0.01)
+    questions_service._STORES.pop(EVENT_ID, None)
+    questions_service._DIRTY.discard(EVENT_ID)
+    yield published
+    questions_service.drain_question_writes()
+    questions_service._STORES.pop(EVENT_ID, None)
+    questions_service._DIRTY.discard(EVENT_ID)
+
+
+def _install(rows_by_status):
+    store = {queue: {} for queue in questions_service.QUEUES}
+    for status, ids in rows_by_status.items():
+        for qid in ids:
+            store[status][qid] = _question(qid)
+    questions_service._STORES[EVENT_ID] = store
+    return store
+
+
+def test_changes_during_load_are_replayed(store, monkeypatch):
+    selecting = threading.Event()
+    release = threading.Event()
+
+    def slow_select(event_id):
+        selecting.set()
+        release.wait(5)
+        # Read before the add below and before the remote approve of 1.
+        return [{**_question(1), "status": "pending"}, {**_question(2), "status": "pending"}]
+
+    monkeypatch.setattr(questions_service, "_select_questions", slow_select)
+    loader = threading.Thread(target=questions_service.ensure_loaded, args=(EVENT_ID,))
+    loader.start()
+    assert selecting.wait(5)
+
+    questions_service._apply(EVENT_ID, 3, "pending", _question(3))
+    questions_service._on_remote_change(
+        questions_service._channel(EVENT_ID), {"op": "move", "id": 1, "to": "approved"}
+    )
+    questions_service._on_remote_change(
+        questions_service._channel(EVENT_ID), {"op": "move", "id": 2, "to": None}
+    )
+    release.set()
+    loader.join(5)
+
+    result = questions_service._STORES[EVENT_ID]
+    assert set(result["pending"]) == {3}
+    assert set(result["approved"]) == {1}
+    assert questions_service._LOADING == {}
+
+
+def test_failed_writes_stay_queued_in_order(store, monkeypatch):
+    db = FakeDB()
+    db.failures = [pymysql.err.OperationalError(2003, "down")] * 5
+    monkeypatch.setattr(questions_service, "create_db_connection", db.connect)
+
+    questions_service._write_behind(EVENT_ID, "UPDATE approve", (1,))
+    questions_service._write_behind(EVENT_ID, "DELETE", (1,))
+    questions_service.drain_question_writes()
+
+    assert db.executed == [("UPDATE approve", (1,)), ("DELETE", (1,))]
+
+
+def test_unrecoverable_write_reloads_the_event(store, monkeypatch):
+    db = FakeDB()
+    db.failures = [pymysql.err.ProgrammingError(1146, "bad")] * questions_service.WRITE_ATTEMPTS
+    monkeypatch.setattr(questions_service, "create_db_connection", db.connect)
+    _install({"approved": [1]})
+
+    questions_service._write_behind(EVENT_ID, "UPDATE approve", (1,))
+    questions_service.drain_question_writes()
+
+    assert not questions_service.is_loaded(EVENT_ID)
+    assert (questions_service._channel(EVENT_ID), {"op": "reload"}) in store
+
+    monkeypatch.setattr(
+        questions_service, "_select_questions", lambda event_id: [{**_question(1), "status": "pending"}]
+    )
+    questions_service.ensure_loaded(EVENT_ID)
+    assert set(questions_service._STORES[EVENT_ID]["pending"]) == {1}
+
+
+def test_read_queue_keeps_the_newest(store, monkeypatch):
+    monkeypatch.setattr(questions_service, "QUESTIONS_READ_KEEP", 3)
+    _install({"approved": range(1, 7)})
+
+    for qid in range(1, 7):
+        questions_service._apply(EVENT_ID, qid, "read")
+
+    assert list(questions_service._STORES[EVENT_ID]["read"]) == [4, 5, 6]
+    assert [q["id"] for q in questions_service.list_questions("read", limit=2, event_id=EVENT_ID)] == [6, 5]
+
+
+def test_listing_survives_a_reload_racing_the_load(store, monkeypatch):
+    real_ensure_loaded = questions_service.ensure_loaded
+    calls = []
+
+    def ensure_then_drop(event_id):
+        real_ensure_loaded(event_id)
+        calls.append(event_id)
+        if len(calls) == 1:
+            # A remote "reload" lands between the load and the read.
+            questions_service._mark_dirty(event_id, publish=False)
+
+    monkeypatch.setattr(questions_service, "ensure_loaded", ensure_then_drop)
+    monkeypatch.setattr(
+        questions_service,
+        "_select_questions",
+        lambda event_id: [
+            {**_question(1), "status": "pending"},
+            {**_question(2), "status": "approved"},
+            {**_question(3), "status": "read"},
+        ],
+    )
+
+    result = questions_service.list_pending_and_approved(limit=10, event_id=EVENT_ID)
+
+    assert {status: [q["id"] for q in rows] for status, rows in result.items()} == {
+        "pending": [1],
+        "approved": [2],
+        "read": [3],
+    }
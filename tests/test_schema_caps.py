@@ -0,0 +1,73 @@
+"""Schema capability reads back off while MySQL is down; --check fails on any hot scan."""
+import pytest
+
+from app import schema
+
+
+@pytest.fixture
+def caps(monkeypatch):
+    monkeypatch.setattr(schema, "_CAPS", {"loaded": False, "version": None, "failures": 0, "retry_at": 0.0})
+    monkeypatch.setattr(schema, "_COLUMNS", {})
+    return schema._CAPS
+
+
+def test_failed_schema_read_is_retried_after_backoff(caps, monkeypatch):
+    now = [1000.0]
+    attempts = []
+
+    def load():
+        attempts.append(now[0])
+        if len(attempts) < 3:
+            raise ConnectionError("down")
+        schema._COLUMNS["events"] = {"id"}
+        caps["loaded"] = True
+
+    monkeypatch.setattr(schema.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(schema, "load_capabilities", load)
+    monkeypatch.setattr(schema, "SCHEMA_RETRY_SECONDS", 5)
+
+    assert schema.has_column("events", "logo_url")
+    assert schema.has_column("events", "logo_url")
+    assert attempts == [1000.0]
+
+    now[0] += 5
+    assert schema.has_column("events", "logo_url")
+    now[0] += 5  # second failure doubled the wait
+    assert schema.has_column("events", "logo_url")
+    assert len(attempts) == 2
+
+    now[0] += 5
+    assert not schema.has_column("events", "logo_url")
+    assert len(attempts) == 3
+
+
+def test_scan_with_usable_key_fails_the_check(monkeypatch):
+    class Cursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql, params=None):
+            self.table = next(table for _name, query, table in schema.HOT_QUERIES if query in sql)
+
+        def fetchall(self):
+            return [{"table": self.table, "type": "ALL", "possible_keys": "idx_event"}]
+
+    class Conn:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def cursor(self):
+            return Cursor()
+
+    monkeypatch.setattr(schema, "create_db_connection", Conn)
+
+    failures = schema.explain_hot_queries(1)
+
+    assert len(failures) == len(schema.HOT_QUERIES)
+    assert all("idx_event is usable" in failure for failure in failures)
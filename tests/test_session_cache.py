@@ -0,0 +1,166 @@
+"""Session L1 cache: bounded staleness, and deletes that reach other processes
+even while Redis is down (tombstones in SESSION_TOMBSTONE_DIR)."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from app.services import session_service
+
+NODE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_node.py")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+
+    def get(self, key):
+        self.reads += 1
+        return self.data.get(key)
+
+    def getex(self, key, ex=None):
+        return self.get(key)
+
+    def delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(session_service, "time", fake)
+    session_service._L1.clear()
+    yield fake
+    session_service._L1.clear()
+
+
+def test_l1_entry_is_trusted_for_l1_ttl_only(clock, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(session_service, "_get_client", lambda: redis)
+    sid = str(uuid.uuid4())
+    redis.data[session_service._key(sid)] = json.dumps({"user_id": 1, "user_role": "viewer"})
+
+    assert session_service.get_session(sid)["user_role"] == "viewer"
+    reads = redis.reads
+
+    # Changed in Redis by another process whose invalidation we never got.
+    redis.data[session_service._key(sid)] = json.dumps({"user_id": 1, "user_role": "moderator"})
+    clock.now += session_service.SESSION_L1_TTL / 2
+    assert session_service.get_session(sid)["user_role"] == "viewer"
+    assert redis.reads == reads
+
+    clock.now += session_service.SESSION_L1_TTL
+    assert session_service.get_cached_session(sid) is None
+    assert session_service.get_session(sid)["user_role"] == "moderator"
+
+
+def test_remote_invalidation_drops_entry_immediately(clock):
+    sid = str(uuid.uuid4())
+    session_service._cache_put(sid, {"user_id": 1})
+    assert session_service.get_cached_session(sid) == {"user_id": 1}
+    session_service._on_remote_invalidate(session_service.INVALIDATE_CHANNEL, {"session_id": sid})
+    assert session_service.get_cached_session(sid) is None
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Node:
+    def __init__(self, env):
+        self.proc = subprocess.Popen(
+            [sys.executable, NODE_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=env,
+        )
+        self._read()
+
+    def _read(self):
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError("session node exited")
+        return json.loads(line)
+
+    def __call__(self, command, sid=""):
+        self.proc.stdin.write(f"{command} {sid}\n")
+        self.proc.stdin.flush()
+        return self._read()
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait(timeout=10)
+
+
+@pytest.fixture
+def redis_down_nodes(tmp_path):
+    env = dict(
+        os.environ,
+        REDIS_HOST="127.0.0.1",
+        REDIS_PORT=str(_closed_port()),
+        SESSION_L1_TTL="0",
+        SESSION_TOMBSTONE_DIR=str(tmp_path / "tombstones"),
+    )
+    nodes = [Node(env), Node(env)]
+    yield nodes
+    for node in nodes:
+        node.close()
+
+
+def test_delete_reaches_other_process_while_redis_is_down(redis_down_nodes):
+    a, b = redis_down_nodes
+    sid = str(uuid.uuid4())
+
+    # B read the session from Redis before the outage and keeps serving it.
+    assert b("remember", sid)
+    assert b("get", sid) == {"user_id": 1, "user_name": "Ana"}
+
+    # Logout handled by A while Redis is down.
+    assert a("delete", sid)
+    assert b("get", sid) is None
+    assert b("cached", sid) is None
+
+
+def test_delete_of_outage_session_reaches_other_process(redis_down_nodes):
+    a, b = redis_down_nodes
+    sid = b("create")
+    assert b("get", sid) == {"user_id": 2, "user_name": "Luis"}
+    assert b("cached", sid) == {"user_id": 2, "user_name": "Luis"}
+
+    a("delete", sid)
+    assert b("cached", sid) is None
+    assert b("get", sid) is None
+
+
+def test_tombstones_are_replayed_into_redis(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, "SESSION_TOMBSTONE_DIR", str(tmp_path))
+    sid = str(uuid.uuid4())
+    redis = FakeRedis()
+    redis.data[session_service._key(sid)] = "{}"
+
+    session_service._write_tombstone(sid)
+    assert session_service._tombstoned(sid)
+
+    session_service._replay_tombstones(redis)
+    assert session_service._key(sid) not in redis.data
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+"""sessions_delta only reports membership/identity changes; counters travel as progress."""
+import asyncio
+
+from app.handlers import ws
+
+
+def _row(uid, minutes=1, ping="2024-05-01 19:00:00", **extra):
+    row = {"user_id": uid, "user_name": f"u{uid}", "chat_blocked": 0, "qa_blocked": 0, "banned": 0,
+           "start_time": "2024-05-01 18:00:00", "last_ping": ping, "session_minutes": minutes, "timezone": None}
+    row.update(extra)
+    return row
+
+
+def test_heartbeats_alone_send_nothing_until_progress_is_due(monkeypatch):
+    monkeypatch.setattr(ws, "SESSIONS_PROGRESS_INTERVAL_MS", 60000)
+    ws._SESSION_SNAPSHOTS.pop(900, None)
+    first = ws._diff_active_sessions(900, [_row(1), _row(2)])
+    assert first["type"] == "active_sessions"
+
+    # Every row's ping/minutes moved: not a change.
+    assert ws._diff_active_sessions(900, [_row(1, 2, "19:01"), _row(2, 2, "19:01")]) is None
+
+    delta = ws._diff_active_sessions(900, [_row(1, 3, "19:02"), _row(2, 3, "19:02", banned=1), _row(3)])
+    assert [r["user_id"] for r in delta["joined"]] == [3]
+    assert [r["user_id"] for r in delta["changed"]] == [2]
+    assert delta["left"] == []
+    assert "progress" not in delta
+    ws._SESSION_SNAPSHOTS.pop(900, None)
+
+
+def test_progress_triples_on_their_own_cadence(monkeypatch):
+    monkeypatch.setattr(ws, "SESSIONS_PROGRESS_INTERVAL_MS", 0)
+    ws._SESSION_SNAPSHOTS.pop(901, None)
+    ws._diff_active_sessions(901, [_row(1), _row(2)])
+
+    delta = ws._diff_active_sessions(901, [_row(1, 5, "19:05"), _row(2)])
+    assert delta["seq"] == 1
+    assert delta["changed"] == [] and delta["joined"] == [] and delta["left"] == []
+    assert delta["progress"] == [[1, 5, "19:05"]]
+
+    # Nothing moved since the last progress: no message at all.
+    assert ws._diff_active_sessions(901, [_row(1, 5, "19:05"), _row(2)]) is None
+
+    delta = ws._diff_active_sessions(901, [_row(1, 5, "19:05")])
+    assert delta["seq"] == 2 and delta["left"] == [2]
+    ws._SESSION_SNAPSHOTS.pop(901, None)
+
+
+def test_full_snapshot_keeps_state_created_during_its_query(monkeypatch):
+    ws._SESSION_SNAPSHOTS.pop(902, None)
+
+    async def query_racing_a_delta(fn, *args, **kwargs):
+        # While the snapshot query runs, the periodic push creates the state
+        # and sends two deltas.
+        ws._diff_active_sessions(902, [_row(1)])
+        ws._diff_active_sessions(902, [_row(1), _row(2)])
+        ws._diff_active_sessions(902, [_row(2)])
+        return [_row(1)]
+
+    monkeypatch.setattr(ws, "run_blocking", query_racing_a_delta)
+    message = asyncio.run(ws._full_sessions_message(902))
+
+    assert message["seq"] == 2
+    assert [row["user_id"] for row in message["sessions"]] == [2]
+    assert ws._SESSION_SNAPSHOTS[902]["seq"] == 2
+    ws._SESSION_SNAPSHOTS.pop(902, None)
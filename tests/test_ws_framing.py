@@ -0,0 +1,88 @@
+"""Pre-framed broadcasts must round-trip through a real Tornado client."""
+import asyncio
+import json
+
+import tornado.web
+
+from app.handlers import ws
+from ws_helpers import LiveServer, OpenSocket, connect, connected_sockets
+
+# < 126, 16-bit and 64-bit payload lengths.
+SIZES = (10, 200, 70000)
+
+
+def _app():
+    return tornado.web.Application([(r"/ws", OpenSocket)])
+
+
+async def _round_trip(conn, event_id):
+    for size in SIZES:
+        text = json.dumps({"type": "chat", "message": "ñ" * size})
+        ws._broadcast_local(text, event_id=event_id)
+        assert await conn.read_message() == text
+
+
+def _extensions(conn):
+    return conn.headers.get("Sec-WebSocket-Extensions", "")
+
+
+def test_plain_socket_uses_shared_frame():
+    async def scenario():
+        async with LiveServer(_app()) as port:
+            conn = await connect(port, role="viewer", event_id=101)
+            [server_socket] = connected_sockets(101)
+            assert server_socket._shared_frames
+            await _round_trip(conn, 101)
+            conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_client_offers_deflate_to_plain_role():
+    # The server declines the extension, so the shared frame is still valid.
+    async def scenario():
+        async with LiveServer(_app()) as port:
+            conn = await connect(port, role="viewer", event_id=102, compression_options={})
+            assert "permessage-deflate" not in _extensions(conn)
+            await _round_trip(conn, 102)
+            conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_deflate_socket_goes_through_write_message():
+    async def scenario():
+        async with LiveServer(_app()) as port:
+            conn = await connect(port, role="moderator", event_id=103, compression_options={})
+            assert "permessage-deflate" in _extensions(conn)
+            [server_socket] = connected_sockets(103)
+            assert not server_socket._shared_frames
+            await _round_trip(conn, 103)
+            conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_compression_role_without_client_offer():
+    async def scenario():
+        async with LiveServer(_app()) as port:
+            conn = await connect(port, role="moderator", event_id=104)
+            assert "permessage-deflate" not in _extensions(conn)
+            await _round_trip(conn, 104)
+            conn.close()
+
+    asyncio.run(scenario())
+
+
+def test_kick_queues_event_closed_then_closes():
+    async def scenario():
+        async with LiveServer(_app()) as port:
+            conn = await connect(port, role="viewer", event_id=105)
+            ws._broadcast_local(json.dumps({"type": "chat", "message": "antes"}), event_id=105)
+            ws._kick_local(105)
+            assert json.loads(await conn.read_message())["message"] == "antes"
+            assert json.loads(await conn.read_message())["type"] == "event_closed"
+            assert await conn.read_message() is None
+            assert connected_sockets(105) == []
+
+    asyncio.run(scenario())
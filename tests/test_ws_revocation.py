@@ -0,0 +1,100 @@
+"""The lease sweep re-resolves bans and roles instead of renewing tickets blindly."""
+import asyncio
+import json
+
+import tornado.web
+
+from app.handlers import ws
+from app.services import events_service, session_service, staff_service, users_service
+from ws_helpers import LiveServer, OpenSocket, connect
+
+EVENT_ID = 400
+
+
+class Directory:
+    """What MySQL would answer for users, staff and events."""
+
+    def __init__(self):
+        self.banned = set()
+        self.accounts = {}
+        self.staff = {}
+        self.active = True
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(session_service, "refresh_sessions", lambda ids: set(ids))
+        monkeypatch.setattr(
+            users_service, "get_statuses", lambda ids: {uid: {"banned": int(uid in self.banned)} for uid in ids}
+        )
+        monkeypatch.setattr(
+            users_service, "get_account_roles", lambda ids: {uid: self.accounts[uid] for uid in ids if uid in self.accounts}
+        )
+        monkeypatch.setattr(staff_service, "get_event_role", lambda uid, eid: self.staff.get((uid, eid)))
+        monkeypatch.setattr(events_service, "get_event_by_id", lambda eid: {"id": eid, "is_active": int(self.active)})
+
+
+async def _next(conn, timeout=2.0):
+    raw = await asyncio.wait_for(conn.read_message(), timeout)
+    return json.loads(raw) if raw is not None else None
+
+
+def test_role_allowed_rules():
+    assert ws._role_allowed("viewer", "viewer", None, False)
+    assert ws._role_allowed("reports", "superadmin", None, False)
+    assert ws._role_allowed("moderator", "viewer", "moderator", False)
+    assert ws._role_allowed("moderator", "moderator", None, True)
+    assert not ws._role_allowed("moderator", "moderator", None, False)
+    assert not ws._role_allowed("moderator", "viewer", "speaker", True)
+    assert ws._role_allowed("speaker", "viewer", "admin", False)
+    assert not ws._role_allowed("reports", "admin", "moderator", True)
+    assert not ws._role_allowed("root", "superadmin", None, True)
+
+
+def test_sweep_closes_revoked_sockets_and_renews_the_rest(monkeypatch):
+    directory = Directory()
+    directory.install(monkeypatch)
+    directory.accounts[5] = {"role": "viewer", "event_id": None}
+    directory.staff[(5, EVENT_ID)] = "moderator"
+
+    async def scenario():
+        app = tornado.web.Application([(r"/ws", OpenSocket)])
+        async with LiveServer(app) as port:
+            moderator = await connect(port, role="moderator", event_id=EVENT_ID, user_id=5, sid="s5")
+            viewer = await connect(port, role="viewer", event_id=EVENT_ID, user_id=6, sid="s6")
+
+            # Everything still valid: both get a fresh ticket.
+            await ws.revalidate_leases()
+            assert (await _next(moderator))["type"] == "ws_ticket"
+            assert (await _next(viewer))["type"] == "ws_ticket"
+
+            # Staff assignment removed: the moderator socket is closed, not renewed.
+            del directory.staff[(5, EVENT_ID)]
+            for client in ws._iter_clients(event_id=EVENT_ID):
+                client[1]._ticket_exp = 0
+            await ws.revalidate_leases()
+            assert await _next(moderator) is None
+            assert moderator.close_code == 4003 and moderator.close_reason == "role_revoked"
+            assert (await _next(viewer))["type"] == "ws_ticket"
+
+            # Banned viewer.
+            directory.banned.add(6)
+            await ws.revalidate_leases()
+            assert await _next(viewer) is None
+            assert viewer.close_code == 4003 and viewer.close_reason == "banned"
+
+    asyncio.run(scenario())
+
+
+def test_sweep_closes_viewers_of_a_deactivated_event(monkeypatch):
+    directory = Directory()
+    directory.install(monkeypatch)
+
+    async def scenario():
+        app = tornado.web.Application([(r"/ws", OpenSocket)])
+        async with LiveServer(app) as port:
+            viewer = await connect(port, role="viewer", event_id=EVENT_ID + 1, user_id=7, sid="s7")
+            directory.active = False
+            await ws.revalidate_leases()
+            assert await _next(viewer) is None
+            assert viewer.close_reason == "event_closed"
+
+    asyncio.run(scenario())
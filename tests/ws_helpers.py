@@ -0,0 +1,69 @@
+"""Shared pieces for tests that talk to LiveWebSocket over a real socket."""
+import asyncio
+import time
+
+import tornado.httpserver
+import tornado.websocket
+from tornado.testing import bind_unused_port
+
+from app.handlers import ws
+
+
+class OpenSocket(ws.LiveWebSocket):
+    """LiveWebSocket with session/ticket auth and analytics skipped.
+
+    Role, event and user come straight from the query string; everything
+    after open() (outbound queue, framing, on_message) is the real code.
+    """
+
+    def check_origin(self, origin):
+        return True
+
+    async def open(self):
+        self.session_id = self.get_query_argument("sid", None)
+        self.role = self.get_query_argument("role", "viewer")
+        self.event_id = int(self.get_query_argument("event_id", "1"))
+        self.user_id = int(self.get_query_argument("user_id", "1"))
+        self.user_name = f"test-{self.user_id}"
+        self.event_timezone = None
+        self.lease_until = time.monotonic() + 3600
+        ws._register_client(self)
+
+    def on_close(self):
+        ws._unregister_client(self)
+        self._outbound.clear()
+        self._outbound_bytes = 0
+
+
+def connected_sockets(event_id):
+    return [client for _role, client in ws._iter_clients(event_id=event_id)]
+
+
+class LiveServer:
+    """`async with LiveServer(app) as port:` serves `app` on a free local port."""
+
+    def __init__(self, app):
+        self.app = app
+        self.server = None
+
+    async def __aenter__(self):
+        sock, port = bind_unused_port()
+        self.server = tornado.httpserver.HTTPServer(self.app)
+        self.server.add_sockets([sock])
+        return port
+
+    async def __aexit__(self, *exc):
+        self.server.stop()
+        await self.server.close_all_connections()
+
+
+async def connect(port, role="viewer", event_id=1, user_id=1, compression_options=None, sid=None):
+    """Open a client socket and wait until the server has registered it."""
+    before = len(connected_sockets(event_id))
+    url = f"ws://127.0.0.1:{port}/ws?role={role}&event_id={event_id}&user_id={user_id}"
+    if sid:
+        url += f"&sid={sid}"
+    conn = await tornado.websocket.websocket_connect(url, compression_options=compression_options)
+    while len(connected_sockets(event_id)) <= before:
+        await asyncio.sleep(0.005)
+    return conn